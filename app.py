@@ -1,11 +1,14 @@
 import sys
 from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QTimer
 from ui_main import MainUI
 
 def main():
     app = QApplication(sys.argv)
     window = MainUI()
     window.show()
+    # Models load once the event loop is running, the window never waits on them
+    QTimer.singleShot(0, window.start_warmup)
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
@@ -0,0 +1,52 @@
+import sys
+import argparse
+from config import ConfigManager
+from batch_engine import BatchEngine
+
+def print_progress(stats):
+    total = stats['total'] if stats['total'] is not None else '?'
+    done = stats['processed'] + stats['skipped']
+    sys.stdout.write(
+        f"\r{done}/{total} images, {stats['errors']} errors, "
+        f"{stats['images_per_second']:.1f} img/s")
+    sys.stdout.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless batch container code recognition")
+    parser.add_argument('folder', help="Folder of images, walked recursively")
+    parser.add_argument('--output', default='output/batch/results.jsonl',
+                        help="JSON lines results file, also used to resume")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--no-recursive', action='store_true')
+    parser.add_argument('--no-resume', action='store_true',
+                        help="Start over instead of skipping images already in the output")
+    args = parser.parse_args()
+
+    config = ConfigManager(args.config).config
+    engine = BatchEngine(
+        config['yolo_model_path'],
+        config['tesseract_path'],
+        workers=args.workers,
+        psm_modes=config.get('ocr', {}).get('psm_modes', [7, 6]),
+        detector_config=config.get('detector'),
+        ocr_config=config.get('ocr')
+    )
+    try:
+        stats = engine.run(
+            args.folder,
+            args.output,
+            recursive=not args.no_recursive,
+            resume=not args.no_resume,
+            progress=print_progress
+        )
+    except KeyboardInterrupt:
+        engine.stop()
+        print("\nInterrupted, rerun the same command to resume")
+        return 1
+    print(f"\nDone: {stats['processed']} processed, {stats['skipped']} skipped, "
+          f"{stats['errors']} errors in {stats['elapsed']:.1f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
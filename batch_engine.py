@@ -0,0 +1,195 @@
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import cv2
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Per-process detector and OCR, created once by init_worker
+_worker_state = {}
+
+
+def iter_image_paths(root, recursive=True, extensions=IMAGE_EXTENSIONS):
+    """Yield image paths under root in a stable order without listing everything up front"""
+    if not recursive:
+        for name in sorted(os.listdir(root)):
+            path = os.path.join(root, name)
+            if name.lower().endswith(extensions) and os.path.isfile(path):
+                yield path
+        return
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(extensions):
+                yield os.path.join(dirpath, name)
+
+
+def load_checkpoint(output_path):
+    """Paths processed successfully by an earlier run, failed images are retried"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'r') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+                if not result.get('error'):
+                    done.add(result['path'])
+            except (ValueError, KeyError):
+                # Partial last line from an interrupted run
+                continue
+    return done
+
+
+def init_worker(model_path, tesseract_path, psm_modes, detector_config, ocr_config):
+    # Several workers share the CPU, keep each one single threaded
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    from detection import DetectionThread
+    from ocr import OCRProcessor
+    _worker_state['detector'] = DetectionThread.from_config(
+        {'yolo_model_path': model_path, 'detector': detector_config or {}})
+    # One image at a time per process, no Tesseract thread pool
+    ocr_config = dict(ocr_config or {}, psm_modes=psm_modes, workers=0)
+    _worker_state['ocr'] = OCRProcessor.from_config(
+        {'tesseract_path': tesseract_path, 'ocr': ocr_config})
+
+
+def process_image(path):
+    """Decode, detect and OCR one image inside a worker process"""
+    from tracker import crop_box
+    start = time.monotonic()
+    result = {'path': path, 'detections': [], 'error': None}
+    try:
+        image = cv2.imread(path)
+        if image is None:
+            result['error'] = 'Failed to decode image'
+            return result
+        detector = _worker_state['detector']
+        ocr = _worker_state['ocr']
+        for detection in detector.detect_batch([image])[0]:
+            crop = crop_box(image, detection['box'])
+            entry = dict(detection, text='', valid=False)
+            if crop is not None:
+                if detection['class_id'] == 0:
+                    reading = ocr.read_container_code(crop)
+                    entry['text'] = reading['code'] or ''
+                    entry['valid'] = reading['valid']
+                else:
+                    entry['text'] = ocr.extract_text(crop).strip()
+                    entry['valid'] = bool(entry['text'])
+            result['detections'].append(entry)
+    except Exception as e:
+        result['error'] = str(e)
+    result['seconds'] = time.monotonic() - start
+    return result
+
+
+class BatchEngine:
+    """
+    Streaming headless batch pipeline.
+    Paths are walked lazily and at most max_pending images are in flight, so
+    memory stays flat regardless of archive size. Results are appended to a
+    JSON lines file which doubles as the checkpoint for resuming; images that
+    failed are tried again on resume and get a second line.
+    """
+
+    def __init__(self, model_path, tesseract_path, workers=None, max_pending=None,
+                 psm_modes=(7, 6), flush_every=50, detector_config=None, ocr_config=None):
+        self.model_path = model_path
+        self.tesseract_path = tesseract_path
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self.max_pending = max_pending or self.workers * 4
+        self.psm_modes = list(psm_modes)
+        self.flush_every = flush_every
+        self.detector_config = detector_config
+        self.ocr_config = ocr_config
+        self.running = False
+
+    def stop(self):
+        self.running = False
+
+    def run(self, root, output_path, recursive=True, resume=True, count_first=True,
+            progress=None, on_result=None):
+        """
+        Process every image under root.
+        Args:
+            progress: optional callable receiving a stats dict after each image
+            on_result: optional callable receiving each result dict
+        Returns the final stats dict
+        """
+        self.running = True
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        done = load_checkpoint(output_path) if resume else set()
+        stats = {
+            'total': None,
+            'processed': 0,
+            'skipped': 0,
+            'errors': 0,
+            'detections': 0,
+            'elapsed': 0.0,
+            'images_per_second': 0.0
+        }
+        if count_first:
+            stats['total'] = sum(1 for _ in iter_image_paths(root, recursive))
+
+        start = time.monotonic()
+        mode = 'a' if resume else 'w'
+        with open(output_path, mode) as out, ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=init_worker,
+                initargs=(self.model_path, self.tesseract_path, self.psm_modes,
+                          self.detector_config, self.ocr_config)) as pool:
+            pending = set()
+            written = 0
+            for path in iter_image_paths(root, recursive):
+                if not self.running:
+                    break
+                if path in done:
+                    stats['skipped'] += 1
+                    continue
+                pending.add(pool.submit(process_image, path))
+                if len(pending) >= self.max_pending:
+                    completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    written += self.write_results(completed, out, stats, start,
+                                                  progress, on_result)
+                    if written >= self.flush_every:
+                        out.flush()
+                        written = 0
+
+            if not self.running:
+                for future in pending:
+                    future.cancel()
+            while pending:
+                completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                self.write_results(completed, out, stats, start, progress, on_result)
+            out.flush()
+
+        self.running = False
+        return stats
+
+    def write_results(self, futures, out, stats, start, progress, on_result):
+        written = 0
+        for future in futures:
+            if future.cancelled():
+                continue
+            result = future.result()
+            out.write(json.dumps(result) + '\n')
+            written += 1
+            stats['processed'] += 1
+            stats['detections'] += len(result['detections'])
+            if result['error']:
+                stats['errors'] += 1
+            stats['elapsed'] = time.monotonic() - start
+            stats['images_per_second'] = stats['processed'] / stats['elapsed'] if stats['elapsed'] else 0.0
+            if on_result is not None:
+                on_result(result)
+            if progress is not None:
+                progress(dict(stats))
+        return written
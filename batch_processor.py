@@ -1,6 +1,7 @@
-import os
 import cv2
+from PyQt5.QtCore import QThread, pyqtSignal
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QPushButton, QFileDialog, QLabel
+from batch_engine import iter_image_paths
 
 class BatchProcessor(QWidget):
     def __init__(self):
@@ -25,9 +26,36 @@ class BatchProcessor(QWidget):
             self.status_label.setText(f'Selected {len(files)} files')
 
     def process_folder(self, folder_path):
-        results = []
-        for file in os.listdir(folder_path):
-            if file.endswith(('.jpg', '.png')):
-                image = cv2.imread(os.path.join(folder_path, file))
-                results.append(image)
-        return results
+        """Yield (path, image) one at a time instead of decoding the whole folder"""
+        for path in iter_image_paths(folder_path):
+            image = cv2.imread(path)
+            if image is not None:
+                yield path, image
+
+class BatchThread(QThread):
+    """Runs a BatchEngine off the GUI thread and reports progress through signals"""
+    progress_update = pyqtSignal(dict)
+    result_ready = pyqtSignal(dict)
+    finished_signal = pyqtSignal(dict)
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, engine, folder_path, output_path):
+        super().__init__()
+        self.engine = engine
+        self.folder_path = folder_path
+        self.output_path = output_path
+
+    def run(self):
+        try:
+            stats = self.engine.run(
+                self.folder_path,
+                self.output_path,
+                progress=self.progress_update.emit,
+                on_result=self.result_ready.emit
+            )
+            self.finished_signal.emit(stats)
+        except Exception as e:
+            self.error_signal.emit(f"Batch error: {str(e)}")
+
+    def stop(self):
+        self.engine.stop()
@@ -0,0 +1,543 @@
+import os
+import sys
+import json
+import time
+import queue
+import random
+import shutil
+import string
+import argparse
+import platform
+import resource
+import threading
+import subprocess
+import multiprocessing
+from datetime import datetime
+
+import cv2
+import numpy as np
+from iso6346 import check_digit
+
+CAMERA_COUNTS = (1, 4, 8, 16)
+BENCH_DIR = os.path.join("output", "bench")
+STAGES = ('frame', 'detection', 'inference_batch', 'ocr', 'logging')
+# Model loading and warm-up on top of the measured duration
+STARTUP_GRACE = 300.0
+
+
+def synthetic_code(rng):
+    """Random owner code and serial with a correct ISO 6346 check digit"""
+    prefix = ''.join(rng.choice(string.ascii_uppercase) for _ in range(3)) + 'U'
+    prefix += ''.join(rng.choice(string.digits) for _ in range(6))
+    return prefix + str(check_digit(prefix))
+
+
+def draw_container(frame, code, type_code, x, y, width, height):
+    cv2.rectangle(frame, (x, y), (x + width, y + height), (45, 60, 150), -1)
+    for rib in range(x + 20, x + width, 40):
+        cv2.line(frame, (rib, y), (rib, y + height), (35, 45, 120), 4)
+    scale = width / 520.0
+    cv2.putText(frame, code, (x + 30, y + int(80 * scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                1.6 * scale, (255, 255, 255), max(2, int(4 * scale)), cv2.LINE_AA)
+    cv2.putText(frame, type_code, (x + 30, y + int(150 * scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                1.2 * scale, (255, 255, 255), max(2, int(3 * scale)), cv2.LINE_AA)
+
+
+def write_synthetic_video(path, seed, seconds, fps=15, width=1280, height=720,
+                          pass_seconds=4.0, gap_seconds=1.0):
+    """
+    Render a clip of containers with known codes driving through the frame.
+    The same seed always gives the same clip. Returns the codes in order.
+    """
+    rng = random.Random(seed)
+    noise = np.random.RandomState(seed)
+    background = noise.randint(70, 110, (height, width, 3)).astype(np.uint8)
+    background = cv2.GaussianBlur(background, (0, 0), 3)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Cannot write {path}")
+
+    codes = []
+    box_w, box_h = int(width * 0.45), int(height * 0.5)
+    pass_frames = int(pass_seconds * fps)
+    cycle = pass_frames + int(gap_seconds * fps)
+    code, type_code = None, None
+    for index in range(int(seconds * fps)):
+        step = index % cycle
+        if step == 0:
+            code = synthetic_code(rng)
+            type_code = rng.choice(('22G1', '45G1', '42G1', '22R1'))
+            codes.append(code)
+        frame = background.copy()
+        if step < pass_frames:
+            # Slow down around the centre like a truck at the gate
+            progress = 0.5 - 0.5 * np.cos(np.pi * step / pass_frames)
+            x = int(-box_w + progress * (width + box_w))
+            draw_container(frame, code, type_code, x, (height - box_h) // 2, box_w, box_h)
+        writer.write(frame)
+    writer.release()
+    return codes
+
+
+def prepare_clips(work_dir, clips, seconds, fps, width, height, seed=0):
+    """Create (or reuse) the synthetic clips, returns [(path, codes)]"""
+    os.makedirs(work_dir, exist_ok=True)
+    prepared = []
+    for i in range(clips):
+        name = f"clip{i}_s{seed + i}_{width}x{height}_{fps}fps_{int(seconds)}s"
+        path = os.path.join(work_dir, name + '.avi')
+        codes_path = os.path.join(work_dir, name + '.json')
+        if os.path.exists(path) and os.path.exists(codes_path):
+            with open(codes_path, 'r') as f:
+                codes = json.load(f)
+        else:
+            codes = write_synthetic_video(path, seed + i, seconds, fps, width, height)
+            with open(codes_path, 'w') as f:
+                json.dump(codes, f)
+        prepared.append((path, codes))
+    return prepared
+
+
+class RTSPStandIn:
+    """
+    Serves the clips as live RTSP streams on localhost using a local
+    mediamtx server fed by ffmpeg, so the benchmark exercises the same
+    network decode path as the gate cameras.
+    """
+
+    def __init__(self, paths, port=8554):
+        self.paths = paths
+        self.port = port
+        self.processes = []
+
+    @staticmethod
+    def available():
+        return shutil.which('ffmpeg') is not None and shutil.which('mediamtx') is not None
+
+    def start(self):
+        env = dict(os.environ, MTX_RTSPADDRESS=f":{self.port}")
+        self.processes.append(subprocess.Popen(
+            ['mediamtx'], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        time.sleep(1.0)
+        urls = []
+        for i, path in enumerate(self.paths):
+            url = f"rtsp://127.0.0.1:{self.port}/cam{i}"
+            self.processes.append(subprocess.Popen(
+                ['ffmpeg', '-loglevel', 'error', '-re', '-stream_loop', '-1', '-i', path,
+                 '-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency',
+                 '-f', 'rtsp', url],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            urls.append(url)
+        time.sleep(2.0)
+        return urls
+
+    def stop(self):
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes = []
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = []
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def summary(self, elapsed):
+        with self.lock:
+            values = sorted(self.samples)
+        ms = [value * 1000.0 for value in values]
+        return {
+            'count': len(values),
+            'per_second': len(values) / elapsed if elapsed > 0 else 0.0,
+            'mean_ms': sum(ms) / len(ms) if ms else None,
+            'p50_ms': percentile(ms, 50),
+            'p95_ms': percentile(ms, 95),
+            'p99_ms': percentile(ms, 99),
+            'max_ms': ms[-1] if ms else None
+        }
+
+
+class TimedDetector:
+    """Wraps a DetectionThread so every batch forward pass is timed"""
+
+    def __init__(self, detector, timer):
+        self.detector = detector
+        self.timer = timer
+
+    def detect_batch(self, frames):
+        start = time.perf_counter()
+        try:
+            return self.detector.detect_batch(frames)
+        finally:
+            self.timer.add(time.perf_counter() - start)
+
+
+def make_stream_thread_class():
+    # Imported here so the parent process never loads Qt
+    from video_stream import StreamThread
+
+    class BenchStreamThread(StreamThread):
+        """StreamThread that times each stage and can pace file sources like a live camera"""
+
+        def __init__(self, rtsp_url, camera_name, capture_mode, motion_config, stages, pace_fps):
+            super().__init__(rtsp_url, camera_name, capture_mode, motion_config)
+            self.stages = stages
+            self.frame_interval = 1.0 / pace_fps if pace_fps else 0.0
+            self.next_due = None
+
+        def process_frame(self, frame):
+            if self.frame_interval:
+                now = time.perf_counter()
+                if self.next_due is None:
+                    self.next_due = now
+                if self.next_due > now:
+                    time.sleep(self.next_due - now)
+                self.next_due += self.frame_interval
+            start = time.perf_counter()
+            super().process_frame(frame)
+            self.stages['frame'].add(time.perf_counter() - start)
+
+        def submit_detection(self, frame, keepalive=False):
+            previous = self.pending_detection
+            start = time.perf_counter()
+            super().submit_detection(frame, keepalive)
+            if self.pending_detection is not None and self.pending_detection is not previous:
+                # Added after on_detection_done, so tracking is included
+                def done(future):
+                    if not future.cancelled():
+                        self.stages['detection'].add(time.perf_counter() - start)
+                self.pending_detection.add_done_callback(done)
+
+        def finalize_track(self, track):
+            start = time.perf_counter()
+            super().finalize_track(track)
+            self.stages['ocr'].add(time.perf_counter() - start)
+
+    return BenchStreamThread
+
+
+def cpu_times():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime, children.ru_utime + children.ru_stime
+
+
+def run_cameras(config, sources, cameras, duration, tesseract_path, work_dir,
+                capture_mode='sequential', motion_config=None, pace_fps=15):
+    """Run the live pipeline on `cameras` streams for `duration` seconds and measure it"""
+    from PyQt5.QtCore import QCoreApplication, Qt
+    from concurrent.futures import ThreadPoolExecutor
+    from detection import DetectionThread
+    from inference_service import InferenceService
+    from ocr import OCRProcessor
+    from detection_logger import DetectionLogger
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    stages = {name: StageTimer() for name in STAGES}
+    readings = {'valid': set(), 'invalid': 0, 'rows': 0}
+    readings_lock = threading.Lock()
+
+    inference_config = config.get('inference', {})
+    service = InferenceService(
+        TimedDetector(DetectionThread.from_config(config), stages['inference_batch']),
+        max_batch_size=inference_config.get('max_batch_size', 8),
+        max_wait=inference_config.get('max_wait_ms', 20) / 1000.0
+    )
+    service.start()
+
+    ocr_processor = OCRProcessor.from_config(dict(config, tesseract_path=tesseract_path))
+    ocr_executor = ThreadPoolExecutor(max_workers=2)
+
+    run_dir = os.path.join(work_dir, f"run_{cameras}")
+    shutil.rmtree(run_dir, ignore_errors=True)
+    logging_config = dict(config.get('logging', {}))
+    store = None
+    if logging_config.pop('store', False):
+        from detection_store import DetectionStore
+        store = DetectionStore(os.path.join(run_dir, 'detections.db'))
+    logger = DetectionLogger(log_dir=run_dir, store=store, **logging_config)
+
+    def handle_reading(result, camera_name):
+        if not result['valid']:
+            with readings_lock:
+                readings['invalid'] += 1
+            return
+        with readings_lock:
+            readings['valid'].add(result['text'])
+        start = time.perf_counter()
+        if logger.should_log(result['label'], result['text'], camera_name, result['track_id'],
+                             result.get('session')):
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            logger.log_detection(timestamp, result['label'], result['text'], True, [],
+                                 camera=camera_name)
+            with readings_lock:
+                readings['rows'] += 1
+        stages['logging'].add(time.perf_counter() - start)
+
+    thread_class = make_stream_thread_class()
+    threads = []
+    for i in range(cameras):
+        thread = thread_class(sources[i % len(sources)], f"bench{i}", capture_mode,
+                              motion_config, stages, pace_fps)
+        # No event loop runs here, so handle readings on the emitting thread
+        thread.track_reading.connect(handle_reading, Qt.DirectConnection)
+        thread.set_inference_service(service)
+        thread.set_ocr(ocr_processor, ocr_executor)
+        thread.toggle_detection(True)
+        thread.toggle_extraction(True)
+        threads.append(thread)
+
+    cpu_start, child_start = cpu_times()
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    deadline = start + duration
+    while time.monotonic() < deadline and any(thread.isRunning() for thread in threads):
+        app.processEvents()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.stop()
+        thread.toggle_detection(False)
+    elapsed = time.monotonic() - start
+    ocr_executor.shutdown(wait=True)
+    service.stop()
+    ocr_processor.close()
+    logger.close()
+    cpu_end, child_end = cpu_times()
+
+    return {
+        'cameras': cameras,
+        'elapsed': elapsed,
+        'stages': {name: timer.summary(elapsed) for name, timer in stages.items()},
+        'inference': service.get_stats(),
+        'ocr_cache': ocr_processor.cache.get_stats() if ocr_processor.cache is not None else None,
+        'motion': [thread.get_motion_stats() for thread in threads],
+        'capture': [thread.get_capture_stats() for thread in threads],
+        'cpu_percent': 100.0 * (cpu_end - cpu_start) / elapsed,
+        'child_cpu_percent': 100.0 * (child_end - child_start) / elapsed,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        'valid_codes': sorted(readings['valid']),
+        'invalid_readings': readings['invalid'],
+        'logged_rows': readings['rows']
+    }
+
+
+def run_isolated(kwargs, timeout=None):
+    """
+    Each camera count gets a fresh process so peak RSS is not carried over.
+    A child that crashes, is killed or hangs past the timeout gives a failed
+    run, {'cameras': n, 'error': reason}, instead of blocking the benchmark.
+    """
+    if timeout is None:
+        timeout = kwargs['duration'] + STARTUP_GRACE
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=child_main, args=(kwargs, results))
+    process.start()
+    deadline = time.monotonic() + timeout
+    result = None
+    while result is None:
+        alive = process.is_alive()
+        try:
+            # A child that already exited has flushed its result, if it sent one
+            result = results.get(timeout=1.0)
+        except queue.Empty:
+            if not alive:
+                result = {'error': f"benchmark process exited with code {process.exitcode}"}
+            elif time.monotonic() > deadline:
+                process.terminate()
+                result = {'error': f"benchmark process timed out after {timeout:.0f}s"}
+    process.join(10)
+    if process.exitcode is None:
+        process.kill()
+        process.join()
+    if 'error' not in result and process.exitcode != 0:
+        result = {'error': f"benchmark process exited with code {process.exitcode}"}
+    if 'error' in result:
+        return {'cameras': kwargs['cameras'], 'error': result['error']}
+    return result
+
+
+def child_main(kwargs, results):
+    try:
+        results.put(run_cameras(**kwargs))
+    except Exception as e:
+        results.put({'error': f"{type(e).__name__}: {str(e)}"})
+
+
+def score_run(run, expected_codes):
+    read = set(run.pop('valid_codes'))
+    run['codes_expected'] = len(expected_codes)
+    run['codes_read'] = len(read & expected_codes)
+    run['false_codes'] = sorted(read - expected_codes)
+    return run
+
+
+def compare_results(baseline, current, tolerance=0.1):
+    """Regressions of current against a baseline results file, as readable strings"""
+    regressions = []
+    baseline_runs = {run['cameras']: run for run in baseline['runs']}
+    for run in current['runs']:
+        before = baseline_runs.get(run['cameras'])
+        if before is None:
+            continue
+        prefix = f"{run['cameras']} cameras"
+        if 'error' in run or 'error' in before:
+            continue
+        for name, stage in run['stages'].items():
+            old = before['stages'].get(name)
+            if not old or not old['count'] or not stage['count']:
+                continue
+            if stage['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{prefix}: {name} p95 {old['p95_ms']:.1f} -> "
+                                   f"{stage['p95_ms']:.1f} ms")
+            if stage['per_second'] < old['per_second'] * (1 - tolerance):
+                regressions.append(f"{prefix}: {name} throughput {old['per_second']:.1f} -> "
+                                   f"{stage['per_second']:.1f}/s")
+        if run['peak_rss_mb'] > before['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{prefix}: peak RSS {before['peak_rss_mb']:.0f} -> "
+                               f"{run['peak_rss_mb']:.0f} MB")
+        if run['codes_read'] < before['codes_read']:
+            regressions.append(f"{prefix}: codes read {before['codes_read']} -> "
+                               f"{run['codes_read']}")
+    return regressions
+
+
+def environment_info(config):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'cpu_count': os.cpu_count(),
+        'config': {key: config.get(key) for key in ('yolo_model_path', 'detector', 'inference',
+                                                    'ocr', 'logging')}
+    }
+
+
+def print_run(run):
+    print(f"{run['cameras']:>3} cameras: cpu {run['cpu_percent']:.0f}% "
+          f"(+{run['child_cpu_percent']:.0f}% children), peak RSS {run['peak_rss_mb']:.0f} MB, "
+          f"{run['codes_read']}/{run['codes_expected']} codes")
+    for name, stage in run['stages'].items():
+        if stage['count']:
+            print(f"      {name:<16}{stage['per_second']:8.1f}/s  p50 {stage['p50_ms']:7.1f}  "
+                  f"p95 {stage['p95_ms']:7.1f}  p99 {stage['p99_ms']:7.1f} ms")
+
+
+def main():
+    from config import ConfigManager
+
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark on synthetic cameras")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--cameras', type=int, nargs='+', default=list(CAMERA_COUNTS))
+    parser.add_argument('--duration', type=float, default=60.0, help="Seconds per camera count")
+    parser.add_argument('--clips', type=int, default=4, help="Distinct synthetic clips")
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--capture-mode', choices=('sequential', 'latest'), default='sequential')
+    parser.add_argument('--no-motion', action='store_true', help="Disable the motion gate")
+    parser.add_argument('--rtsp', action='store_true',
+                        help="Serve the clips over local RTSP (needs ffmpeg and mediamtx)")
+    parser.add_argument('--unpaced', action='store_true',
+                        help="Read file sources as fast as possible instead of at --fps")
+    parser.add_argument('--tesseract', default=None)
+    parser.add_argument('--work-dir', default=BENCH_DIR)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', default=None, help="Baseline results file")
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+
+    config = ConfigManager(args.config).config
+    tesseract_path = args.tesseract or config['tesseract_path']
+    if not os.path.exists(tesseract_path):
+        tesseract_path = shutil.which('tesseract') or tesseract_path
+
+    # Long enough that no stream hits the end of its file during a run
+    clips = prepare_clips(os.path.join(args.work_dir, 'clips'), args.clips,
+                          args.duration + 10, args.fps, args.width, args.height, args.seed)
+    sources = [path for path, _ in clips]
+    expected_codes = {code for _, codes in clips for code in codes}
+
+    server = None
+    pace_fps = 0 if args.unpaced else args.fps
+    if args.rtsp:
+        if not RTSPStandIn.available():
+            print("--rtsp needs ffmpeg and mediamtx on PATH")
+            return 2
+        server = RTSPStandIn(sources)
+        sources = server.start()
+        # Live streams pace themselves
+        pace_fps = 0
+    elif args.capture_mode == 'latest' and pace_fps:
+        print("Note: file sources are not paced in latest mode, use --rtsp for live pacing")
+
+    motion_config = {'enabled': False} if args.no_motion else {'enabled': True}
+    results = {'environment': environment_info(config), 'args': vars(args), 'runs': []}
+    try:
+        for cameras in args.cameras:
+            run = run_isolated({
+                'config': config,
+                'sources': sources,
+                'cameras': cameras,
+                'duration': args.duration,
+                'tesseract_path': tesseract_path,
+                'work_dir': args.work_dir,
+                'capture_mode': args.capture_mode,
+                'motion_config': motion_config,
+                'pace_fps': pace_fps
+            })
+            if 'error' in run:
+                print(f"{cameras:>3} cameras: FAILED {run['error']}")
+            else:
+                run = score_run(run, expected_codes)
+                print_run(run)
+            results['runs'].append(run)
+    finally:
+        if server is not None:
+            server.stop()
+
+    output = args.output or os.path.join(
+        args.work_dir, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            regressions = compare_results(json.load(f), results, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions against baseline")
+    return 1 if any('error' in run for run in results['runs']) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,504 @@
+import os
+import sys
+import json
+import secrets
+import time
+import queue
+import signal
+import argparse
+import threading
+import multiprocessing
+from collections import deque
+from datetime import datetime
+from multiprocessing.connection import Listener, Client
+
+from shm_ring import FrameRing
+
+SERVER_DEFAULTS = {
+    'host': '127.0.0.1',
+    'port': 8765,
+    # Random key created by the first server start, readable by this user only.
+    # An 'authkey' in config.json overrides it.
+    'authkey_file': os.path.join(os.path.expanduser('~'), '.container-ocr', 'server.key'),
+    # Cameras per worker process, 1 gives every camera its own core and GIL
+    'group_size': 1,
+    'max_width': 1920,
+    'max_height': 1080,
+    'slots': 3,
+    # Start detection and extraction on every camera without a viewer
+    'autostart': True
+}
+
+
+def server_settings(config):
+    return {**SERVER_DEFAULTS, **config.get('server', {})}
+
+
+def load_authkey(settings, create=False):
+    """
+    Shared secret of the control connection. Clients are unpickled by the
+    server, so the key must never be a public default. Raises
+    FileNotFoundError when no server has created the key yet.
+    """
+    if settings.get('authkey'):
+        return settings['authkey'].encode()
+    path = settings['authkey_file']
+    if create and not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(fd, 'w') as f:
+                f.write(secrets.token_hex(32))
+    with open(path, 'r') as f:
+        return f.read().strip().encode()
+
+
+def ring_name(port, index):
+    return f"cocr{port}_cam{index}"
+
+
+def record_track_reading(result, camera_name, detection_logger, training_manager):
+    """Log a finished track reading, reads that fail validation never reach the log"""
+    label = result['label']
+    crop = result['crop']
+    if not result['valid']:
+        if detection_logger.can_save_invalid(label):
+            training_manager.save_invalid_sample(crop, label, result['class_id'])
+        return
+    if not detection_logger.should_log(label, result['text'], camera_name, result['track_id'],
+                                       result.get('session')):
+        return
+    image_paths = []
+    if detection_logger.can_save_valid(label):
+        h, w = crop.shape[:2]
+        image_path = training_manager.save_training_sample(
+            crop, [0, 0, w, h], result['class_id'], result['confidence'])
+        if image_path:
+            image_paths.append(image_path)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    detection_logger.log_detection(
+        timestamp, label, result['text'], True, image_paths, camera=camera_name)
+
+
+def ring_writer(ring):
+    """Frame sink for a StreamThread, shrinks frames that would not fit a slot"""
+    import cv2
+
+    def write(frame):
+        h, w = frame.shape[:2]
+        if h * w * 3 > ring.slot_bytes:
+            scale = (ring.slot_bytes / (h * w * 3)) ** 0.5
+            frame = cv2.resize(frame, (int(w * scale), int(h * scale)),
+                               interpolation=cv2.INTER_AREA)
+        ring.write(frame)
+    return write
+
+
+def camera_worker(cameras, ring_names, config, commands, events):
+    """
+    Worker process for a group of cameras: capture, motion gate, detection
+    and OCR run here, frames go to shared memory and readings go back to the
+    server over the events queue.
+    """
+    from PyQt5.QtCore import QCoreApplication, Qt
+    from concurrent.futures import ThreadPoolExecutor
+    from video_stream import StreamThread
+    from roi import RegionOfInterest
+
+    QCoreApplication([])
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    rings = {camera['name']: FrameRing.attach(name) for camera, name in zip(cameras, ring_names)}
+    state = {camera['name']: {'detection': False, 'extraction': False} for camera in cameras}
+    threads = {}
+    shared = {'service': None, 'ocr': None, 'executor': None, 'scheduler': None}
+
+    def get_service():
+        if shared['service'] is None:
+            from detection import DetectionThread
+            from inference_service import InferenceService
+            from rate_scheduler import InferenceScheduler
+            inference_config = config.get('inference', {})
+            shared['service'] = InferenceService(
+                DetectionThread.from_config(config),
+                max_batch_size=inference_config.get('max_batch_size', 8),
+                max_wait=inference_config.get('max_wait_ms', 20) / 1000.0
+            )
+            shared['service'].start()
+            # The budget applies per worker, every worker has its own detector
+            shared['scheduler'] = InferenceScheduler.from_config(config)
+            if shared['scheduler'] is not None:
+                shared['scheduler'].start()
+        return shared['service']
+
+    def get_ocr():
+        if shared['ocr'] is None:
+            from ocr import OCRProcessor
+            shared['ocr'] = OCRProcessor.from_config(config)
+            shared['executor'] = ThreadPoolExecutor(max_workers=2)
+        return shared['ocr']
+
+    def apply_state(name):
+        thread = threads[name]
+        if state[name]['detection']:
+            thread.set_inference_service(get_service())
+            thread.set_scheduler(shared['scheduler'])
+        if state[name]['extraction']:
+            thread.set_ocr(get_ocr(), shared['executor'])
+        thread.toggle_detection(state[name]['detection'])
+        thread.toggle_extraction(state[name]['extraction'])
+
+    def start_camera(camera):
+        name = camera['name']
+        thread = StreamThread(
+            camera['rtsp_url'], name,
+            capture_mode=camera.get('capture_mode', 'latest'),
+            motion_config=camera.get('motion'),
+            frame_sink=ring_writer(rings[name]),
+            display_url=camera.get('display_url'),
+            recognition_idle=camera.get('recognition_idle', 5.0),
+            roi=RegionOfInterest.from_config(camera))
+        # No event loop in this process, handle signals on the emitting thread
+        thread.track_reading.connect(
+            lambda result, cam: events.put(('reading', cam, result)), Qt.DirectConnection)
+        thread.extraction_update.connect(
+            lambda text, cam: events.put(('extraction', cam, text)), Qt.DirectConnection)
+        thread.error_signal.connect(
+            lambda cam, error: events.put(('error', cam, error)), Qt.DirectConnection)
+        thread.status_update.connect(
+            lambda cam, status: events.put(('status', cam, status)), Qt.DirectConnection)
+        threads[name] = thread
+        apply_state(name)
+        thread.start()
+
+    for camera in cameras:
+        start_camera(camera)
+
+    by_name = {camera['name']: camera for camera in cameras}
+    restart_at = {}
+    last_stats = 0.0
+    running = True
+    while running:
+        try:
+            command = commands.get(timeout=0.5)
+        except queue.Empty:
+            command = None
+        if command is not None:
+            kind = command[0]
+            if kind == 'stop':
+                running = False
+                continue
+            _, name, active = command
+            if name in state:
+                state[name][kind] = active
+                apply_state(name)
+
+        now = time.monotonic()
+        for name, thread in list(threads.items()):
+            if thread.isRunning():
+                continue
+            # Camera dropped out, reopen it with its detection state intact
+            if now >= restart_at.setdefault(name, now + 5.0):
+                del restart_at[name]
+                start_camera(by_name[name])
+        if now - last_stats >= 1.0:
+            last_stats = now
+            for name, thread in threads.items():
+                events.put(('stats', name, thread.get_stream_stats()))
+
+    for thread in threads.values():
+        thread.stop()
+        thread.toggle_detection(False)
+    if shared['executor'] is not None:
+        shared['executor'].shutdown(wait=True)
+        shared['ocr'].close()
+    if shared['service'] is not None:
+        shared['service'].stop()
+    if shared['scheduler'] is not None:
+        shared['scheduler'].stop()
+    for ring in rings.values():
+        ring.close()
+
+
+class CameraServer:
+    """
+    Headless camera server. Cameras are split into worker processes so
+    decoding, detection and OCR scale across cores. Frames are published in
+    shared memory rings that viewers read directly; readings come back to
+    this process, which owns the detection log and training samples.
+    Viewers control it over a local authenticated connection.
+    """
+
+    def __init__(self, config_path='config.json', camera_config_path='camera_config.json'):
+        from config import ConfigManager
+        from detection_logger import DetectionLogger
+        from training_manager import TrainingManager
+
+        self.config = ConfigManager(config_path).config
+        with open(camera_config_path, 'r') as f:
+            self.cameras = json.load(f)['cameras']
+        self.settings = server_settings(self.config)
+        logging_config = dict(self.config.get('logging', {}))
+        store = None
+        if logging_config.pop('store', False):
+            from detection_store import DetectionStore
+            store = DetectionStore()
+        self.detection_logger = DetectionLogger(store=store, **logging_config)
+        self.training_manager = TrainingManager(**self.config.get('training_samples', {}))
+
+        autostart = self.settings['autostart']
+        self.state = {
+            camera['name']: {'detection': autostart, 'extraction': autostart, 'stats': {}}
+            for camera in self.cameras
+        }
+        self.context = multiprocessing.get_context('spawn')
+        self.events = self.context.Queue(maxsize=10000)
+        self.rings = {}
+        self.workers = []
+        self.recent = deque(maxlen=1000)
+        self.event_id = 0
+        self.lock = threading.Lock()
+        self.running = False
+        self.listener = None
+        self.metrics_server = None
+
+    def start(self):
+        self.running = True
+        for index, camera in enumerate(self.cameras):
+            self.rings[camera['name']] = FrameRing.create(
+                ring_name(self.settings['port'], index),
+                self.settings['max_width'], self.settings['max_height'], self.settings['slots'])
+        size = max(1, self.settings['group_size'])
+        for start in range(0, len(self.cameras), size):
+            self.workers.append({'cameras': self.cameras[start:start + size], 'process': None,
+                                 'commands': None})
+        for worker in self.workers:
+            self.start_worker(worker)
+
+        threading.Thread(target=self.event_loop, daemon=True).start()
+        threading.Thread(target=self.monitor_loop, daemon=True).start()
+        self.listener = Listener((self.settings['host'], self.settings['port']),
+                                 authkey=load_authkey(self.settings, create=True))
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+        self.start_metrics()
+
+    def start_worker(self, worker):
+        commands = self.context.Queue()
+        process = self.context.Process(
+            target=camera_worker,
+            args=(worker['cameras'], [self.rings[camera['name']].name for camera in worker['cameras']],
+                  self.config, commands, self.events),
+            daemon=True)
+        process.start()
+        worker['process'], worker['commands'] = process, commands
+        for camera in worker['cameras']:
+            name = camera['name']
+            for kind in ('detection', 'extraction'):
+                if self.state[name][kind]:
+                    commands.put((kind, name, True))
+
+    def start_metrics(self):
+        from metrics import METRICS, MetricsServer
+        metrics_config = self.config.get('metrics', {})
+        METRICS.register_collector('camera_server', self.collect_metrics)
+        if metrics_config.get('enabled') and metrics_config.get('port'):
+            try:
+                self.metrics_server = MetricsServer(
+                    metrics_config.get('host', '127.0.0.1'), metrics_config['port']).start()
+            except OSError as e:
+                print(f"Metrics endpoint unavailable: {str(e)}")
+
+    def collect_metrics(self):
+        gauges = []
+        with self.lock:
+            stats = {name: dict(state['stats']) for name, state in self.state.items()}
+        for name, camera_stats in stats.items():
+            for key, value in camera_stats.items():
+                gauges.append((f"camera_{key}", {'camera': name}, value))
+        log_stats = self.detection_logger.get_stats()
+        gauges.append(('queue_depth', {'queue': 'log'}, log_stats['queued']))
+        gauges.append(('log_dropped_rows', {}, log_stats['dropped']))
+        gauges.append(('log_failed_rows', {}, log_stats['failed']))
+        return gauges
+
+    def worker_for(self, name):
+        for worker in self.workers:
+            if any(camera['name'] == name for camera in worker['cameras']):
+                return worker
+        return None
+
+    def publish(self, kind, camera, text):
+        with self.lock:
+            self.event_id += 1
+            self.recent.append({'id': self.event_id, 'kind': kind, 'camera': camera,
+                                'text': text, 'time': time.time()})
+
+    def event_loop(self):
+        while self.running:
+            try:
+                kind, camera, payload = self.events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            if kind == 'stats':
+                with self.lock:
+                    self.state[camera]['stats'] = payload
+            elif kind == 'reading':
+                try:
+                    record_track_reading(payload, camera, self.detection_logger,
+                                         self.training_manager)
+                except Exception as e:
+                    print(f"Failed to record reading from {camera}: {str(e)}")
+            else:
+                self.publish(kind, camera, payload)
+
+    def monitor_loop(self):
+        """Restart worker processes that died, their rings stay in place"""
+        while self.running:
+            time.sleep(2.0)
+            for worker in self.workers:
+                process = worker['process']
+                if self.running and process is not None and not process.is_alive():
+                    names = ', '.join(camera['name'] for camera in worker['cameras'])
+                    self.publish('error', names, f"Worker exited ({process.exitcode}), restarting")
+                    self.start_worker(worker)
+
+    def accept_loop(self):
+        while self.running:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError):
+                break
+            except Exception as e:
+                # Wrong authkey and the like, keep serving everyone else
+                print(f"Rejected viewer connection: {str(e)}")
+                continue
+            threading.Thread(target=self.serve_viewer, args=(conn,), daemon=True).start()
+
+    def serve_viewer(self, conn):
+        with conn:
+            while self.running:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    break
+                try:
+                    response = self.handle_request(request)
+                    response['ok'] = True
+                except Exception as e:
+                    response = {'ok': False, 'error': str(e)}
+                try:
+                    conn.send(response)
+                except (OSError, ValueError):
+                    break
+
+    def handle_request(self, request):
+        command = request.get('command')
+        if command == 'cameras':
+            with self.lock:
+                return {'cameras': [{
+                    'name': camera['name'],
+                    'ring': self.rings[camera['name']].name,
+                    'detection': self.state[camera['name']]['detection'],
+                    'extraction': self.state[camera['name']]['extraction']
+                } for camera in self.cameras]}
+        if command in ('detection', 'extraction'):
+            name = request['camera']
+            worker = self.worker_for(name)
+            if worker is None:
+                raise KeyError(f"Unknown camera {name}")
+            with self.lock:
+                self.state[name][command] = bool(request['active'])
+            worker['commands'].put((command, name, bool(request['active'])))
+            return {}
+        if command == 'events':
+            after = request.get('after', 0)
+            with self.lock:
+                return {'events': [event for event in self.recent if event['id'] > after]}
+        if command == 'stats':
+            with self.lock:
+                if 'camera' not in request:
+                    return {'stats': {name: dict(state['stats']) for name, state in self.state.items()}}
+                return {'stats': dict(self.state[request['camera']]['stats'])}
+        raise ValueError(f"Unknown command {command}")
+
+    def stop(self):
+        self.running = False
+        if self.listener is not None:
+            self.listener.close()
+        for worker in self.workers:
+            if worker['commands'] is not None:
+                worker['commands'].put(('stop',))
+        for worker in self.workers:
+            process = worker['process']
+            if process is not None:
+                process.join(10)
+                if process.is_alive():
+                    process.terminate()
+        for ring in self.rings.values():
+            ring.close()
+        self.detection_logger.close()
+        self.training_manager.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+
+
+class ServerClient:
+    """Viewer side of the control connection, safe to share between threads"""
+
+    def __init__(self, host, port, authkey):
+        self.conn = Client((host, port), authkey=authkey)
+        self.lock = threading.Lock()
+        # Per-camera stats, refreshed off the GUI thread by refresh_stats()
+        self.stats = {}
+
+    @classmethod
+    def from_config(cls, config):
+        settings = server_settings(config)
+        return cls(settings['host'], settings['port'], load_authkey(settings))
+
+    def request(self, command, **kwargs):
+        with self.lock:
+            self.conn.send(dict(kwargs, command=command))
+            response = self.conn.recv()
+        if not response.pop('ok'):
+            raise RuntimeError(response['error'])
+        return response
+
+    def refresh_stats(self):
+        self.stats = self.request('stats')['stats']
+
+    def cached_stats(self, camera_name):
+        """Last fetched stats of a camera, never waits on the server"""
+        return self.stats.get(camera_name, {})
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless multi-process camera server")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--cameras', default='camera_config.json')
+    args = parser.parse_args()
+
+    server = CameraServer(args.config, args.cameras)
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    server.start()
+    print(f"Serving {len(server.cameras)} cameras in {len(server.workers)} worker processes "
+          f"on {server.settings['host']}:{server.settings['port']}")
+    try:
+        while not stopping.is_set():
+            stopping.wait(1.0)
+    except KeyboardInterrupt:
+        pass
+    server.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
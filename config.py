@@ -11,4 +11,4 @@ class ConfigManager:
 
     def save_config(self):
         with open(self.config_file, 'w') as f:
-            json.dump(self.config, f)
+            json.dump(self.config, f, indent=4)
@@ -0,0 +1,159 @@
+import os
+import json
+import hashlib
+from collections import Counter
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+CLASS_NAMES = {0: 'cn-11', 1: 'iso-type'}
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def read_classes(annotation_path):
+    classes = []
+    if not os.path.exists(annotation_path):
+        return classes
+    with open(annotation_path, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if parts:
+                classes.append(int(float(parts[0])))
+    return classes
+
+
+class DatasetManifest:
+    """
+    Incrementally maintained index of the saved training samples.
+    Only files that are new or changed since the last update are hashed.
+    Samples with identical content are counted once, and the train/val
+    split is derived from the content hash so a sample never moves
+    between splits.
+    """
+
+    def __init__(self, samples_dir=os.path.join("output", "valid_samples"),
+                 dataset_dir=os.path.join("output", "dataset"), val_ratio=0.1):
+        self.samples_dir = samples_dir
+        self.dataset_dir = dataset_dir
+        self.manifest_path = os.path.join(dataset_dir, "manifest.json")
+        self.val_ratio = val_ratio
+        os.makedirs(dataset_dir, exist_ok=True)
+        self.load()
+
+    def load(self):
+        self.samples = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                self.samples = json.load(f).get('samples', {})
+
+    def split_for(self, content_hash):
+        return 'val' if int(content_hash[:8], 16) % 1000 < self.val_ratio * 1000 else 'train'
+
+    def update(self):
+        """
+        Add new samples and drop deleted ones.
+        Returns the number of samples added or changed.
+        """
+        changed = 0
+        present = set()
+        with os.scandir(self.samples_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                present.add(entry.name)
+                stat = entry.stat()
+                annotation = os.path.splitext(entry.path)[0] + '.txt'
+                # Annotations are written after their image, re-read them when they appear or change
+                annotation_mtime = file_mtime(annotation)
+                known = self.samples.get(entry.name)
+                if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+                    if known.get('annotation_mtime') == annotation_mtime:
+                        continue
+                    known['classes'] = read_classes(annotation)
+                    known['annotation_mtime'] = annotation_mtime
+                    changed += 1
+                    continue
+                content_hash = file_hash(entry.path)
+                self.samples[entry.name] = {
+                    'hash': content_hash,
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime,
+                    'annotation_mtime': annotation_mtime,
+                    'classes': read_classes(annotation),
+                    'split': self.split_for(content_hash)
+                }
+                changed += 1
+
+        for name in list(self.samples):
+            if name not in present:
+                del self.samples[name]
+                changed += 1
+        if changed:
+            self.save()
+        return changed
+
+    def unique_samples(self):
+        """One sample name per content hash, annotated samples only"""
+        seen = set()
+        for name in sorted(self.samples):
+            sample = self.samples[name]
+            if sample['hash'] in seen or not sample['classes']:
+                continue
+            seen.add(sample['hash'])
+            yield name, sample
+
+    def summary(self):
+        class_counts = Counter()
+        splits = Counter()
+        for _, sample in self.unique_samples():
+            splits[sample['split']] += 1
+            for class_id in sample['classes']:
+                class_counts[CLASS_NAMES.get(class_id, str(class_id))] += 1
+        return {
+            'samples': len(self.samples),
+            'unique': sum(splits.values()),
+            'train': splits['train'],
+            'val': splits['val'],
+            'classes': dict(class_counts)
+        }
+
+    def save(self):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'samples': self.samples, 'summary': self.summary()}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def write_dataset_yaml(self):
+        """Write train/val image lists and an ultralytics data.yaml, returns the yaml path"""
+        lists = {'train': [], 'val': []}
+        for name, sample in self.unique_samples():
+            lists[sample['split']].append(os.path.abspath(os.path.join(self.samples_dir, name)))
+        # Tiny datasets can end up with an empty val split
+        if not lists['val'] and lists['train']:
+            lists['val'] = lists['train'][-1:]
+        for split, paths in lists.items():
+            with open(os.path.join(self.dataset_dir, f"{split}.txt"), 'w') as f:
+                f.write('\n'.join(paths) + '\n')
+        yaml_path = os.path.join(self.dataset_dir, "data.yaml")
+        lines = [
+            f"path: {os.path.abspath(self.dataset_dir)}",
+            "train: train.txt",
+            "val: val.txt",
+            "names:"
+        ]
+        lines.extend(f"  {class_id}: {name}" for class_id, name in CLASS_NAMES.items())
+        with open(yaml_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return yaml_path
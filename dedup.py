@@ -0,0 +1,127 @@
+import re
+import time
+import threading
+from collections import OrderedDict, defaultdict
+
+from detection_store import deletion_variants, edit_distance
+
+
+def normalize_code(value):
+    return re.sub(r'[^A-Z0-9]', '', str(value).upper())
+
+
+class DuplicateSuppressor:
+    """
+    Sliding-window duplicate filter for container reads across all cameras.
+    A read is a duplicate if the same camera track was already logged, or,
+    for labels in code_labels, if the same code or one within max_distance
+    edits was seen during the last window seconds. Only container codes are
+    unique per container; size/type codes like 22G1 are shared by thousands
+    of them and are deduplicated per track only. Tracks are keyed by camera,
+    stream session and track id, as track ids restart with every stream.
+    Entries expire after window seconds without a sighting and the total is
+    capped at max_entries, so memory stays flat over long uptimes.
+    """
+
+    def __init__(self, window=300.0, max_distance=1, max_entries=5000, code_labels=('cn-11',)):
+        self.window = window
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.code_labels = tuple(code_labels)
+        # (label, code) -> entry, least recently seen first
+        self.entries = OrderedDict()
+        # (label, deletion variant) -> codes, for near-duplicate lookups
+        self.variants = defaultdict(set)
+        # (camera, session, track_id) -> last seen
+        self.tracks = OrderedDict()
+        self.lock = threading.Lock()
+        self.accepted_count = 0
+        self.suppressed_count = 0
+
+    def check(self, label, value, camera=None, track_id=None, now=None, session=None):
+        """Return True if the read should be kept, False if it is a duplicate"""
+        if now is None:
+            now = time.monotonic()
+        code = normalize_code(value)
+        with self.lock:
+            self.expire(now)
+
+            track_key = (camera, session, track_id) if track_id is not None else None
+            track_seen = track_key in self.tracks
+            if track_key is not None:
+                self.tracks[track_key] = now
+                self.tracks.move_to_end(track_key)
+                while len(self.tracks) > self.max_entries:
+                    self.tracks.popitem(last=False)
+
+            by_code = label in self.code_labels
+            key = self.find(label, code) if by_code else None
+            if key is not None or track_seen:
+                if key is not None:
+                    entry = self.entries[key]
+                    entry['last_seen'] = now
+                    entry['count'] += 1
+                    entry['cameras'].add(camera)
+                    self.entries.move_to_end(key)
+                self.suppressed_count += 1
+                return False
+            self.accepted_count += 1
+            if not by_code:
+                return True
+
+            self.entries[(label, code)] = {
+                'first_seen': now,
+                'last_seen': now,
+                'count': 1,
+                'cameras': {camera}
+            }
+            for variant in deletion_variants(code):
+                self.variants[(label, variant)].add(code)
+            while len(self.entries) > self.max_entries:
+                self.evict(next(iter(self.entries)))
+            return True
+
+    def find(self, label, code):
+        if (label, code) in self.entries:
+            return (label, code)
+        if not self.max_distance:
+            return None
+        best_key, best_distance = None, self.max_distance + 1
+        for variant in deletion_variants(code):
+            for candidate in self.variants.get((label, variant), ()):
+                distance = edit_distance(code, candidate)
+                if distance < best_distance:
+                    best_key, best_distance = (label, candidate), distance
+        return best_key
+
+    def expire(self, now):
+        while self.entries:
+            key = next(iter(self.entries))
+            if now - self.entries[key]['last_seen'] <= self.window:
+                break
+            self.evict(key)
+        while self.tracks:
+            track_key = next(iter(self.tracks))
+            if now - self.tracks[track_key] <= self.window:
+                break
+            del self.tracks[track_key]
+
+    def evict(self, key):
+        label, code = key
+        del self.entries[key]
+        for variant in deletion_variants(code):
+            codes = self.variants.get((label, variant))
+            if codes is None:
+                continue
+            codes.discard(code)
+            if not codes:
+                del self.variants[(label, variant)]
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'tracks': len(self.tracks),
+                'accepted': self.accepted_count,
+                'suppressed': self.suppressed_count
+            }
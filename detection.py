@@ -1,8 +1,234 @@
-from ultralytics import YOLO
+import random
+import threading
+import time
+from collections import deque
+from detector_export import ensure_exported
+from tracker import box_iou
+from metrics import METRICS
+
+def load_model(model_path, backend='pytorch', int8=False, imgsz=640):
+    # ultralytics pulls in torch, only pay for it when a model is loaded
+    from ultralytics import YOLO
+    if backend != 'pytorch':
+        model_path = ensure_exported(model_path, backend, int8, imgsz)
+    return YOLO(model_path, task='detect'), model_path
+
+def compare_detections(expected, actual, iou_threshold=0.5):
+    """Greedy same-class matching of two detection lists, returns (matched, missing, extra, ious)"""
+    remaining = list(actual)
+    ious = []
+    missing = 0
+    for box in expected:
+        best, best_iou = None, iou_threshold
+        for other in remaining:
+            if other['class_id'] != box['class_id']:
+                continue
+            iou = box_iou(box['box'], other['box'])
+            if iou >= best_iou:
+                best, best_iou = other, iou
+        if best is None:
+            missing += 1
+            continue
+        remaining.remove(best)
+        ious.append(best_iou)
+    return len(ious), missing, len(remaining), ious
 
 class DetectionThread:
-    def __init__(self, model_path):
-        self.model = YOLO(model_path)
-    
+    def __init__(self, model_path, backend='pytorch', int8=False, imgsz=640):
+        """
+        Args:
+            model_path: PyTorch .pt weights
+            backend: 'pytorch', 'onnx' or 'openvino', exported on first use
+            int8: use the INT8 quantized export
+        """
+        self.backend = backend
+        self.int8 = int8
+        self.imgsz = imgsz
+        self.model, self.model_path = load_model(model_path, backend, int8, imgsz)
+        self.previous = None
+        self.swap_lock = threading.Lock()
+        # A few recent frames, used to warm up candidate models
+        self.recent_frames = deque(maxlen=8)
+        self.shadow = None
+        self.shadow_busy = False
+        self.shadow_stats = None
+
+    @classmethod
+    def from_config(cls, config):
+        detector_config = config.get('detector', {})
+        return cls(
+            config['yolo_model_path'],
+            backend=detector_config.get('backend', 'pytorch'),
+            int8=detector_config.get('int8', False),
+            imgsz=detector_config.get('imgsz', 640)
+        )
+
     def detect(self, frame):
         return self.model(frame)
+
+    def detect_batch(self, frames):
+        """
+        Run one forward pass over frames from several cameras
+        Returns one list of detections per frame, see parse_result
+        """
+        frames = list(frames)
+        # Read the model once so a concurrent swap never splits a batch
+        model = self.model
+        start = METRICS.start()
+        results = model(frames, imgsz=self.imgsz, verbose=False)
+        detections = [self.parse_result(result) for result in results]
+        METRICS.observe_since('inference', start)
+        METRICS.inc('inference_frames', amount=len(frames))
+        if frames:
+            self.recent_frames.append(frames[0])
+        if self.shadow is not None:
+            self.run_shadow(frames, detections)
+        return detections
+
+    def parse_result(self, result):
+        detections = []
+        names = result.names
+        for box in result.boxes:
+            class_id = int(box.cls[0])
+            x1, y1, x2, y2 = box.xyxy[0].tolist()
+            detections.append({
+                'class_id': class_id,
+                'label': names.get(class_id, str(class_id)),
+                'confidence': float(box.conf[0]),
+                'box': [x1, y1, x2, y2]
+            })
+        return detections
+
+    def warmup(self, model=None, frames=None):
+        """
+        Run the model on representative frames, or a blank one, so the
+        first real call doesn't pay for lazy initialization
+        """
+        model = model or self.model
+        frames = list(frames) if frames else list(self.recent_frames)
+        if not frames:
+            import numpy as np
+            frames = [np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)]
+        for frame in frames:
+            model([frame], imgsz=self.imgsz, verbose=False)
+
+    def prepare_candidate(self, model_path, warmup_frames=None, backend=None, int8=None):
+        """Load a model and warm it up so the first real call is fast"""
+        model, resolved_path = load_model(
+            model_path,
+            self.backend if backend is None else backend,
+            self.int8 if int8 is None else int8,
+            self.imgsz
+        )
+        self.warmup(model, warmup_frames)
+        return model, resolved_path
+
+    def swap_model(self, model_path, warmup_frames=None, backend=None, int8=None):
+        """
+        Load and warm up a new model, then switch inference over to it.
+        Meant to run on a background thread, streams keep using the current
+        model until the switch.
+        """
+        model, resolved_path = self.prepare_candidate(model_path, warmup_frames, backend, int8)
+        with self.swap_lock:
+            self.previous = (self.model, self.model_path)
+            self.model, self.model_path = model, resolved_path
+        return resolved_path
+
+    def swap_model_async(self, model_path, callback=None, **kwargs):
+        """Run swap_model on a background thread; callback gets (model_path, error)"""
+        def worker():
+            try:
+                path = self.swap_model(model_path, **kwargs)
+            except Exception as e:
+                if callback is not None:
+                    callback(None, e)
+                return
+            if callback is not None:
+                callback(path, None)
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        return thread
+
+    def rollback(self):
+        """Switch back to the model that was active before the last swap"""
+        with self.swap_lock:
+            if self.previous is None:
+                return None
+            current = (self.model, self.model_path)
+            self.model, self.model_path = self.previous
+            self.previous = current
+            return self.model_path
+
+    def start_shadow(self, model_path, sample_rate=0.1, warmup_frames=None, **kwargs):
+        """
+        Run a candidate model on a sampled fraction of frames next to
+        production and collect agreement statistics, without affecting results.
+        """
+        model, resolved_path = self.prepare_candidate(model_path, warmup_frames, **kwargs)
+        self.shadow_stats = {
+            'model_path': resolved_path,
+            'frames': 0,
+            'matched': 0,
+            'missing': 0,
+            'extra': 0,
+            'iou_sum': 0.0,
+            'shadow_seconds': 0.0
+        }
+        self.shadow = {'model': model, 'model_path': resolved_path, 'sample_rate': sample_rate}
+        return resolved_path
+
+    def run_shadow(self, frames, production):
+        shadow = self.shadow
+        if shadow is None or self.shadow_busy or random.random() >= shadow['sample_rate']:
+            return
+        self.shadow_busy = True
+        # Off the inference thread so production latency is unaffected
+        threading.Thread(target=self.compare_shadow, args=(shadow, frames, production),
+                         daemon=True).start()
+
+    def compare_shadow(self, shadow, frames, production):
+        try:
+            start = time.monotonic()
+            results = shadow['model'](frames, imgsz=self.imgsz, verbose=False)
+            elapsed = time.monotonic() - start
+            stats = self.shadow_stats
+            if self.shadow is not shadow or stats is None:
+                return
+            stats['shadow_seconds'] += elapsed
+            for expected, result in zip(production, results):
+                matched, missing, extra, ious = compare_detections(
+                    expected, self.parse_result(result))
+                stats['frames'] += 1
+                stats['matched'] += matched
+                stats['missing'] += missing
+                stats['extra'] += extra
+                stats['iou_sum'] += sum(ious)
+        finally:
+            self.shadow_busy = False
+
+    def get_shadow_report(self):
+        stats = self.shadow_stats
+        if stats is None:
+            return None
+        report = dict(stats)
+        boxes = stats['matched'] + stats['missing']
+        report['agreement'] = stats['matched'] / boxes if boxes else 1.0
+        report['mean_iou'] = stats['iou_sum'] / stats['matched'] if stats['matched'] else 0.0
+        return report
+
+    def stop_shadow(self):
+        report = self.get_shadow_report()
+        self.shadow = None
+        return report
+
+    def promote_shadow(self):
+        """Make the warmed-up shadow model the production model"""
+        shadow = self.shadow
+        if shadow is None:
+            return None
+        with self.swap_lock:
+            self.previous = (self.model, self.model_path)
+            self.model, self.model_path = shadow['model'], shadow['model_path']
+        self.shadow = None
+        return self.model_path
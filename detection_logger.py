@@ -1,23 +1,70 @@
 import os
 import csv
+import gzip
+import queue
+import shutil
+import atexit
+import threading
+import time
 from datetime import datetime, timedelta
 from collections import defaultdict
+from dedup import DuplicateSuppressor
+from metrics import METRICS
+
+HEADER = ['date', 'time', 'label', 'value', 'valid', 'image_paths']
 
 class DetectionLogger:
-    def __init__(self, log_dir="output/logs"):
+    def __init__(self, log_dir="output/logs", async_write=False, rotation=None,
+                 max_bytes=50 * 1024 * 1024, compress=False, batch_size=100,
+                 flush_interval=1.0, max_queue=10000, store=None, dedup=None):
+        """
+        Args:
+            async_write: queue rows for a background writer instead of writing
+                on the calling thread
+            rotation: None, 'daily' or 'size'
+            max_bytes: segment size for 'size' rotation
+            compress: gzip closed segments
+            batch_size, flush_interval: writer flushes after this many rows or seconds
+            max_queue: rows beyond this are dropped rather than blocking the caller
+            store: optional DetectionStore that receives every row as well
+            dedup: DuplicateSuppressor options (window, max_distance, max_entries, code_labels)
+        """
         self.log_dir = log_dir
         self.log_file = os.path.join(log_dir, "detections.csv")
         self.last_invalid_save = defaultdict(lambda: datetime.min)
+        self.valid_window_start = defaultdict(lambda: datetime.min)
         self.valid_count = defaultdict(int)
         self.invalid_count = defaultdict(int)
+        self.rotation = rotation
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.store = store
+        self.dedup = DuplicateSuppressor(**(dedup or {}))
+        self.file = None
+        self.writer = None
+        self.segment_date = None
+        self.file_lock = threading.Lock()
+        self.dropped_rows = 0
+        self.failed_rows = 0
         self.initialize_log()
 
+        self.queue = None
+        self.writer_thread = None
+        if async_write:
+            self.queue = queue.Queue(maxsize=max_queue)
+            self.writer_thread = threading.Thread(target=self.writer_loop, daemon=True)
+            self.writer_thread.start()
+            atexit.register(self.close)
+
     def initialize_log(self):
         os.makedirs(self.log_dir, exist_ok=True)
         if not os.path.exists(self.log_file):
             with open(self.log_file, 'w', newline='') as f:
                 writer = csv.writer(f)
-                writer.writerow(['date', 'time', 'label', 'value', 'valid', 'image_paths'])
+                writer.writerow(HEADER)
+        self.segment_date = datetime.fromtimestamp(os.path.getmtime(self.log_file)).date()
 
     def can_save_invalid(self, label):
         now = datetime.now()
@@ -30,24 +77,149 @@ class DetectionLogger:
         return False
 
     def can_save_valid(self, label):
+        now = datetime.now()
+        if (now - self.valid_window_start[label]) > timedelta(minutes=1):
+            self.valid_window_start[label] = now
+            self.valid_count[label] = 0
         if self.valid_count[label] < 3:
             self.valid_count[label] += 1
             return True
         return False
 
-    def log_detection(self, timestamp, label, value, is_valid, image_paths):
-        # Convert timestamp to date and time
-        dt = datetime.strptime(timestamp, "%Y%m%d_%H%M%S")
-        date = dt.strftime("%Y-%m-%d")
-        time = dt.strftime("%H:%M:%S")
-        
-        with open(self.log_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                date,
-                time,
-                label,
-                value,
-                'valid' if is_valid else 'invalid',
-                '|'.join(image_paths)
-            ])
+    def should_log(self, label, value, camera=None, track_id=None, session=None):
+        """False for reads already logged recently by any camera"""
+        return self.dedup.check(label, value, camera, track_id, session=session)
+
+    def log_detection(self, timestamp, label, value, is_valid, image_paths, camera=None):
+        # timestamp is "%Y%m%d_%H%M%S", slicing avoids a strptime per row
+        start = METRICS.start()
+        date = f"{timestamp[0:4]}-{timestamp[4:6]}-{timestamp[6:8]}"
+        time_of_day = f"{timestamp[9:11]}:{timestamp[11:13]}:{timestamp[13:15]}"
+        row = [
+            date,
+            time_of_day,
+            label,
+            value,
+            'valid' if is_valid else 'invalid',
+            '|'.join(image_paths)
+        ]
+
+        if self.queue is None:
+            self.write_rows([(row, camera)])
+            self.file.flush()
+        else:
+            try:
+                self.queue.put_nowait((row, camera))
+            except queue.Full:
+                # Never stall a capture or detection thread on log I/O
+                self.dropped_rows += 1
+        METRICS.observe_since('logging', start, camera or "")
+
+    def queue_depth(self):
+        return self.queue.qsize() if self.queue is not None else 0
+
+    def get_stats(self):
+        return {
+            'queued': self.queue_depth(),
+            'dropped': self.dropped_rows,
+            'failed': self.failed_rows
+        }
+
+    def open_segment(self):
+        self.file = open(self.log_file, 'a', newline='')
+        self.writer = csv.writer(self.file)
+
+    def write_rows(self, items):
+        """Write (row, camera) items to the CSV and, if configured, the store"""
+        with self.file_lock:
+            for row, _ in items:
+                self.rotate_if_needed()
+                if self.file is None:
+                    self.open_segment()
+                self.writer.writerow(row)
+        if self.store is not None:
+            self.store.insert_many({
+                'ts': f"{row[0]} {row[1]}",
+                'camera': camera,
+                'label': row[2],
+                'value': row[3],
+                'valid': row[4] == 'valid',
+                'image_paths': row[5]
+            } for row, camera in items)
+
+    def rotate_if_needed(self):
+        if self.rotation == 'daily':
+            today = datetime.now().date()
+            if today != self.segment_date:
+                self.rotate(self.segment_date.strftime("%Y-%m-%d"))
+                self.segment_date = today
+        elif self.rotation == 'size':
+            if self.file is not None:
+                self.file.flush()
+            if os.path.exists(self.log_file) and os.path.getsize(self.log_file) >= self.max_bytes:
+                self.rotate(datetime.now().strftime("%Y-%m-%d_%H%M%S"))
+
+    def rotate(self, suffix):
+        """Close the current segment, rename it and start a fresh detections.csv"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        base = os.path.join(self.log_dir, f"detections-{suffix}")
+        target = base + ".csv"
+        counter = 1
+        while os.path.exists(target) or os.path.exists(target + ".gz"):
+            target = f"{base}-{counter}.csv"
+            counter += 1
+        os.replace(self.log_file, target)
+        self.initialize_log()
+        if self.compress:
+            self.compress_segment(target)
+
+    def compress_segment(self, path):
+        with open(path, 'rb') as src, gzip.open(path + ".gz", 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+
+    def writer_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            items = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(items) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                items.append(item)
+            start = METRICS.start()
+            try:
+                self.write_rows(items)
+                self.file.flush()
+                METRICS.observe_since('log_write', start)
+            except Exception as e:
+                # Whatever went wrong, the thread must survive or every later row is lost
+                self.failed_rows += len(items)
+                print(f"Detection log write failed, {len(items)} rows lost: {type(e).__name__}: {str(e)}")
+            if stop:
+                break
+
+    def close(self):
+        """Flush queued rows and close the log file"""
+        if self.writer_thread is not None and self.writer_thread.is_alive():
+            self.queue.put(None)
+            self.writer_thread.join()
+        with self.file_lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        if self.store is not None:
+            self.store.close()
@@ -0,0 +1,256 @@
+import os
+import sys
+import csv
+import gzip
+import sqlite3
+import argparse
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    camera TEXT,
+    label TEXT NOT NULL,
+    value TEXT NOT NULL,
+    valid INTEGER NOT NULL,
+    image_paths TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_detections_value ON detections(value, ts);
+CREATE INDEX IF NOT EXISTS idx_detections_label ON detections(label, ts);
+CREATE INDEX IF NOT EXISTS idx_detections_camera ON detections(camera, ts);
+CREATE INDEX IF NOT EXISTS idx_detections_ts ON detections(ts);
+
+CREATE TABLE IF NOT EXISTS code_variants (
+    variant TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (variant, value)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS hourly_counts (
+    hour TEXT NOT NULL,
+    camera TEXT NOT NULL,
+    label TEXT NOT NULL,
+    valid INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (hour, camera, label, valid)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS detections_hourly AFTER INSERT ON detections BEGIN
+    INSERT INTO hourly_counts (hour, camera, label, valid, count)
+    VALUES (substr(NEW.ts, 1, 13), COALESCE(NEW.camera, ''), NEW.label, NEW.valid, 1)
+    ON CONFLICT (hour, camera, label, valid) DO UPDATE SET count = count + 1;
+END;
+"""
+
+def deletion_variants(code):
+    """The code itself plus every single-character deletion (symmetric delete index)"""
+    variants = {code}
+    for i in range(len(code)):
+        variants.add(code[:i] + code[i + 1:])
+    return variants
+
+
+def edit_distance(a, b):
+    """Damerau (optimal string alignment) distance, swapping neighbours costs one edit"""
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            distance = min(previous[j] + 1,
+                           current[j - 1] + 1,
+                           previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                distance = min(distance, before[j - 2] + 1)
+            current.append(distance)
+        before, previous = previous, current
+    return previous[-1]
+
+
+class DetectionStore:
+    """
+    SQLite (WAL) history of container reads, indexed by container number,
+    label, camera and time. Hourly counts are kept up to date by a trigger.
+    Each thread gets its own connection, close() closes all of them.
+    """
+
+    def __init__(self, db_path=os.path.join("output", "logs", "detections.db")):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            # Only ever used by this thread, but close() may run on another one
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            with self.connections_lock:
+                self.connections.append(conn)
+        return conn
+
+    def insert_many(self, records):
+        """
+        Insert detection records in one transaction
+        Args:
+            records: iterable of dicts with ts ('YYYY-MM-DD HH:MM:SS'), camera,
+                label, value, valid and image_paths
+        """
+        rows = []
+        variants = set()
+        for record in records:
+            value = record['value']
+            rows.append((record['ts'], record.get('camera'), record['label'], value,
+                         1 if record['valid'] else 0, record.get('image_paths', '')))
+            for variant in deletion_variants(value):
+                variants.add((variant, value))
+        if not rows:
+            return 0
+        with self.connection() as conn:
+            conn.executemany(
+                "INSERT INTO detections (ts, camera, label, value, valid, image_paths) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.executemany(
+                "INSERT OR IGNORE INTO code_variants (variant, value) VALUES (?, ?)",
+                variants)
+        return len(rows)
+
+    def query(self, sql, params=()):
+        return [dict(row) for row in self.connection().execute(sql, params)]
+
+    def find(self, code, limit=100):
+        """All reads of an exact container number, newest first"""
+        return self.query(
+            "SELECT * FROM detections WHERE value = ? ORDER BY ts DESC LIMIT ?",
+            (code.upper(), limit))
+
+    def search_prefix(self, prefix, limit=100):
+        # Range scan on the value index, LIKE would not use it
+        prefix = prefix.upper()
+        return self.query(
+            "SELECT * FROM detections WHERE value >= ? AND value < ? "
+            "ORDER BY value, ts DESC LIMIT ?",
+            (prefix, prefix + '\uffff', limit))
+
+    def search_pattern(self, pattern, limit=100):
+        """Partial reads with '?' for unknown characters, e.g. MSCU12?4565"""
+        pattern = pattern.upper()
+        fixed = pattern.split('?', 1)[0]
+        return self.query(
+            "SELECT * FROM detections WHERE value >= ? AND value < ? AND value LIKE ? "
+            "ORDER BY ts DESC LIMIT ?",
+            (fixed, fixed + '\uffff', pattern.replace('?', '_'), limit))
+
+    def search_fuzzy(self, code, max_distance=1, limit=100):
+        """
+        Reads within max_distance edits of code, closest first.
+        Candidates come from the single-deletion index, which covers one
+        substitution, insertion, deletion or swap of neighbouring characters,
+        so max_distance can't be more than 1.
+        """
+        if max_distance > 1:
+            raise ValueError("Fuzzy search covers at most one edit")
+        code = code.upper()
+        variants = list(deletion_variants(code))
+        placeholders = ','.join('?' * len(variants))
+        candidates = [row['value'] for row in self.query(
+            f"SELECT DISTINCT value FROM code_variants WHERE variant IN ({placeholders})",
+            variants)]
+        matches = sorted((edit_distance(code, value), value) for value in candidates)
+        matches = [value for distance, value in matches if distance <= max_distance]
+        results = []
+        for value in matches:
+            results.extend(self.find(value, limit - len(results)))
+            if len(results) >= limit:
+                break
+        return results
+
+    def hourly(self, start=None, end=None, camera=None, label=None):
+        """Hourly read counts, start and end as 'YYYY-MM-DD HH'"""
+        clauses, params = [], []
+        if start:
+            clauses.append("hour >= ?")
+            params.append(start)
+        if end:
+            clauses.append("hour <= ?")
+            params.append(end)
+        if camera is not None:
+            clauses.append("camera = ?")
+            params.append(camera)
+        if label is not None:
+            clauses.append("label = ?")
+            params.append(label)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self.query(f"SELECT * FROM hourly_counts {where} ORDER BY hour", params)
+
+    def import_csv(self, path, batch_size=5000):
+        """One-shot import of a DetectionLogger CSV (plain or gzipped segment)"""
+        opener = gzip.open if path.endswith('.gz') else open
+        imported = 0
+        batch = []
+        with opener(path, 'rt', newline='') as f:
+            for row in csv.DictReader(f):
+                batch.append({
+                    'ts': f"{row['date']} {row['time']}",
+                    'camera': row.get('camera') or None,
+                    'label': row['label'],
+                    'value': row['value'],
+                    'valid': row['valid'] == 'valid',
+                    'image_paths': row.get('image_paths', '')
+                })
+                if len(batch) >= batch_size:
+                    imported += self.insert_many(batch)
+                    batch = []
+        imported += self.insert_many(batch)
+        return imported
+
+    def close(self):
+        """Close every thread's connection, e.g. the logger's writer thread"""
+        with self.connections_lock:
+            connections, self.connections = self.connections, []
+        for conn in connections:
+            conn.close()
+        self.local = threading.local()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection history store")
+    parser.add_argument('--db', default=os.path.join("output", "logs", "detections.db"))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help="Import DetectionLogger CSV files")
+    import_parser.add_argument('paths', nargs='+')
+    find_parser = subparsers.add_parser('find', help="Look up a container number")
+    find_parser.add_argument('code')
+    find_parser.add_argument('--fuzzy', type=int, default=0, choices=(0, 1),
+                             help="1 to also match reads one edit away")
+    args = parser.parse_args()
+
+    store = DetectionStore(args.db)
+    if args.command == 'import':
+        for path in args.paths:
+            print(f"{path}: {store.import_csv(path)} rows")
+        return 0
+
+    code = args.code
+    if '?' in code:
+        rows = store.search_pattern(code)
+    elif args.fuzzy:
+        rows = store.search_fuzzy(code, args.fuzzy)
+    elif len(code) < 11:
+        rows = store.search_prefix(code)
+    else:
+        rows = store.find(code)
+    for row in rows:
+        print(f"{row['ts']}  {row['camera'] or '-':<12} {row['label']:<9} "
+              f"{row['value']:<12} {'valid' if row['valid'] else 'invalid'}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
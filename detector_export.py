@@ -0,0 +1,206 @@
+import os
+import sys
+import glob
+import argparse
+
+import cv2
+from dataset_manifest import CLASS_NAMES
+
+BACKENDS = ('pytorch', 'onnx', 'openvino')
+CALIBRATION_DIR = os.path.join("output", "valid_samples")
+
+
+def exported_model_path(model_path, backend, int8=False):
+    """Where the exported model for a backend lives next to the .pt file"""
+    if backend == 'pytorch':
+        return model_path
+    stem = os.path.splitext(model_path)[0]
+    suffix = '_int8' if int8 else ''
+    if backend == 'onnx':
+        return f"{stem}{suffix}.onnx"
+    if backend == 'openvino':
+        return f"{stem}{suffix}_openvino_model"
+    raise ValueError(f"Unknown detector backend: {backend}")
+
+
+def calibration_images(calibration_dir=CALIBRATION_DIR, limit=300):
+    paths = []
+    for pattern in ('*.jpg', '*.jpeg', '*.png'):
+        paths.extend(glob.glob(os.path.join(calibration_dir, pattern)))
+    return sorted(paths)[:limit]
+
+
+def write_calibration_yaml(calibration_dir, yaml_path):
+    """Minimal dataset file so ultralytics can calibrate on the saved samples"""
+    lines = [
+        f"path: {os.path.abspath(calibration_dir)}",
+        "train: .",
+        "val: .",
+        "names:"
+    ]
+    lines.extend(f"  {class_id}: {name}" for class_id, name in CLASS_NAMES.items())
+    with open(yaml_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return yaml_path
+
+
+def letterbox(image, imgsz):
+    import numpy as np
+    h, w = image.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    resized = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - nh) // 2, (imgsz - nw) // 2
+    canvas[top:top + nh, left:left + nw] = resized
+    rgb = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB)
+    return (rgb.transpose(2, 0, 1)[None].astype(np.float32) / 255.0)
+
+
+def quantize_onnx(fp32_path, int8_path, calibration_dir=CALIBRATION_DIR, imgsz=640):
+    """Static INT8 post-training quantization calibrated on saved gate samples"""
+    import onnxruntime
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_static)
+
+    images = calibration_images(calibration_dir)
+    if not images:
+        raise RuntimeError(f"No calibration images found in {calibration_dir}")
+    session = onnxruntime.InferenceSession(fp32_path, providers=['CPUExecutionProvider'])
+    input_name = session.get_inputs()[0].name
+
+    class SampleReader(CalibrationDataReader):
+        def __init__(self):
+            self.paths = iter(images)
+
+        def get_next(self):
+            for path in self.paths:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {input_name: letterbox(image, imgsz)}
+            return None
+
+    quantize_static(
+        fp32_path,
+        int8_path,
+        SampleReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True
+    )
+    return int8_path
+
+
+def export_model(model_path, backend, int8=False, imgsz=640, calibration_dir=CALIBRATION_DIR):
+    """Export the PyTorch model for a CPU backend and return the exported path"""
+    from ultralytics import YOLO
+    target = exported_model_path(model_path, backend, int8)
+    if backend == 'pytorch':
+        return target
+
+    model = YOLO(model_path)
+    if backend == 'onnx':
+        fp32_path = exported_model_path(model_path, 'onnx')
+        if not os.path.exists(fp32_path):
+            # dynamic axes so the inference service can batch frames
+            fp32_path = model.export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+        if not int8:
+            return fp32_path
+        return quantize_onnx(fp32_path, target, calibration_dir, imgsz)
+
+    kwargs = {'format': 'openvino', 'imgsz': imgsz, 'dynamic': True}
+    if int8:
+        yaml_path = os.path.join(os.path.dirname(model_path) or '.', 'calibration.yaml')
+        kwargs.update(int8=True, data=write_calibration_yaml(calibration_dir, yaml_path))
+    return model.export(**kwargs)
+
+
+def ensure_exported(model_path, backend, int8=False, imgsz=640):
+    target = exported_model_path(model_path, backend, int8)
+    if os.path.exists(target):
+        return target
+    return export_model(model_path, backend, int8, imgsz)
+
+
+def check_parity(reference, candidate, images, iou_threshold=0.9, conf_tolerance=0.05):
+    """
+    Compare two DetectionThreads on the same images.
+    Every reference box needs a same-class candidate box with IoU at least
+    iou_threshold and confidence within conf_tolerance.
+    Both must run at the same imgsz, otherwise boxes differ by resolution alone.
+    """
+    from tracker import box_iou
+    if reference.imgsz != candidate.imgsz:
+        raise ValueError(f"Parity check needs the same imgsz, got {reference.imgsz} and {candidate.imgsz}")
+    report = {'images': 0, 'matched': 0, 'missing': 0, 'extra': 0,
+              'min_iou': 1.0, 'max_conf_delta': 0.0}
+    for path in images:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        report['images'] += 1
+        expected = reference.detect_batch([image])[0]
+        actual = list(candidate.detect_batch([image])[0])
+        for box in expected:
+            best, best_iou = None, 0.0
+            for other in actual:
+                if other['class_id'] != box['class_id']:
+                    continue
+                iou = box_iou(box['box'], other['box'])
+                if iou > best_iou:
+                    best, best_iou = other, iou
+            delta = abs(best['confidence'] - box['confidence']) if best else 1.0
+            if best is None or best_iou < iou_threshold or delta > conf_tolerance:
+                report['missing'] += 1
+                continue
+            actual.remove(best)
+            report['matched'] += 1
+            report['min_iou'] = min(report['min_iou'], best_iou)
+            report['max_conf_delta'] = max(report['max_conf_delta'], delta)
+        report['extra'] += len(actual)
+    report['passed'] = report['missing'] == 0 and report['extra'] == 0
+    return report
+
+
+def main():
+    from config import ConfigManager
+    from detection import DetectionThread
+
+    parser = argparse.ArgumentParser(description="Export the detector for CPU inference")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--backend', choices=BACKENDS[1:], default=None)
+    parser.add_argument('--int8', action='store_true')
+    parser.add_argument('--check', action='store_true',
+                        help="Compare the exported model against the PyTorch one")
+    parser.add_argument('--images', default=CALIBRATION_DIR,
+                        help="Images used for the parity check")
+    parser.add_argument('--conf-tolerance', type=float, default=None)
+    args = parser.parse_args()
+
+    config = ConfigManager(args.config).config
+    detector_config = config.get('detector', {})
+    model_path = config['yolo_model_path']
+    backend = args.backend or detector_config.get('backend', 'onnx')
+    int8 = args.int8 or detector_config.get('int8', False)
+    imgsz = detector_config.get('imgsz', 640)
+
+    path = export_model(model_path, backend, int8, imgsz)
+    print(f"Exported {backend}{' int8' if int8 else ''} model to {path}")
+
+    if args.check:
+        tolerance = args.conf_tolerance
+        if tolerance is None:
+            tolerance = 0.1 if int8 else 0.02
+        report = check_parity(
+            DetectionThread(model_path, imgsz=imgsz),
+            DetectionThread(model_path, backend=backend, int8=int8, imgsz=imgsz),
+            calibration_images(args.images, limit=50),
+            conf_tolerance=tolerance
+        )
+        print(report)
+        return 0 if report['passed'] else 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
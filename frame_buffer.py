@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import deque
+
+
+class LatestFrameBuffer:
+    """Small bounded buffer that always hands consumers the newest frame.
+
+    Frames that are pushed out before any consumer took them are counted as
+    dropped; frames that are already older than ``max_age`` seconds when a
+    consumer asks for them are counted as stale and skipped.
+    """
+
+    def __init__(self, capacity=2, max_age=0.5):
+        self.capacity = max(1, capacity)
+        self.max_age = max_age
+        self.frames = deque()
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.grabbed_count = 0
+        self.dropped_count = 0
+        self.stale_count = 0
+        self.closed = False
+
+    def put(self, frame):
+        with self.condition:
+            self.sequence += 1
+            if len(self.frames) >= self.capacity:
+                evicted = self.frames.popleft()
+                if not evicted['taken']:
+                    self.dropped_count += 1
+            self.frames.append({
+                'sequence': self.sequence,
+                'timestamp': time.monotonic(),
+                'frame': frame,
+                'taken': False
+            })
+            self.grabbed_count += 1
+            self.condition.notify_all()
+
+    def get_latest(self, after_sequence=0, timeout=1.0):
+        """
+        Wait for a frame newer than after_sequence.
+        Returns (sequence, frame) or None on timeout or when the buffer is closed.
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                if self.frames and self.frames[-1]['sequence'] > after_sequence:
+                    entry = self.frames[-1]
+                    if time.monotonic() - entry['timestamp'] > self.max_age:
+                        # Grabber has stalled; don't show the operator old video
+                        self.stale_count += 1
+                        entry['taken'] = True
+                        after_sequence = entry['sequence']
+                    else:
+                        entry['taken'] = True
+                        return entry['sequence'], entry['frame']
+                if self.closed:
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                'grabbed': self.grabbed_count,
+                'dropped': self.dropped_count,
+                'stale': self.stale_count,
+                'buffered': len(self.frames)
+            }
+
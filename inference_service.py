@@ -0,0 +1,123 @@
+import threading
+import time
+from concurrent.futures import Future
+
+
+class InferenceService(threading.Thread):
+    """
+    Shared detector for all cameras.
+    StreamThreads submit frames, the service groups whatever is pending from
+    all cameras into one batch (up to max_batch_size, waiting at most
+    max_wait seconds for the batch to fill) and resolves each camera's future
+    with its own detections. Frames submitted with a RegionOfInterest are
+    cropped and tiled first, each tile counts against max_batch_size, and
+    their boxes are merged back into full-frame coordinates.
+    """
+
+    def __init__(self, detector, max_batch_size=8, max_wait=0.02):
+        super().__init__(daemon=True)
+        self.detector = detector
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.condition = threading.Condition()
+        # Only the newest frame per camera is kept, older ones are superseded
+        self.pending = {}
+        self.running = True
+        self.batch_count = 0
+        self.frame_count = 0
+        self.superseded_count = 0
+
+    def submit(self, camera_name, frame, roi=None):
+        """Queue a frame for detection. Returns a Future with the detections list."""
+        future = Future()
+        with self.condition:
+            if not self.running:
+                future.set_exception(RuntimeError("Inference service stopped"))
+                return future
+            previous = self.pending.pop(camera_name, None)
+            if previous is not None:
+                previous[2].cancel()
+                self.superseded_count += 1
+            self.pending[camera_name] = (frame, roi, future)
+            self.condition.notify_all()
+        return future
+
+    def run(self):
+        while True:
+            batch = self.collect_batch()
+            if batch is None:
+                break
+            self.run_batch(batch)
+
+    def collect_batch(self):
+        with self.condition:
+            while self.running and not self.pending:
+                self.condition.wait()
+            if not self.running:
+                return None
+
+            deadline = time.monotonic() + self.max_wait
+            while self.running and len(self.pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            batch = []
+            images = 0
+            for camera_name in list(self.pending):
+                frame, roi, future = self.pending[camera_name]
+                count = roi.tile_count(frame.shape) if roi is not None else 1
+                # Always take one camera, even if its tiles alone fill the batch
+                if batch and images + count > self.max_batch_size:
+                    break
+                del self.pending[camera_name]
+                if future.set_running_or_notify_cancel():
+                    batch.append((camera_name, frame, roi, future))
+                    images += count
+            return batch
+
+    def run_batch(self, batch):
+        if not batch:
+            return
+        # Cropping and masking happen here, outside the lock cameras submit under
+        batch = [(roi, roi.split(frame) if roi is not None else [(frame, (0, 0))], future)
+                 for _, frame, roi, future in batch]
+        frames = [image for _, tiles, _ in batch for image, _ in tiles]
+        try:
+            results = self.detector.detect_batch(frames)
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        self.batch_count += 1
+        self.frame_count += len(frames)
+        index = 0
+        for roi, tiles, future in batch:
+            tile_results = results[index:index + len(tiles)]
+            index += len(tiles)
+            if roi is None:
+                future.set_result(tile_results[0])
+            else:
+                future.set_result(roi.merge(tile_results, [offset for _, offset in tiles]))
+
+    def get_stats(self):
+        with self.condition:
+            pending = len(self.pending)
+        return {
+            'batches': self.batch_count,
+            'frames': self.frame_count,
+            'superseded': self.superseded_count,
+            'pending': pending,
+            'avg_batch_size': self.frame_count / self.batch_count if self.batch_count else 0.0
+        }
+
+    def stop(self, timeout=5.0):
+        with self.condition:
+            self.running = False
+            for _, _, future in self.pending.values():
+                future.cancel()
+            self.pending.clear()
+            self.condition.notify_all()
+        if self.is_alive():
+            self.join(timeout)
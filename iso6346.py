@@ -0,0 +1,58 @@
+import re
+
+# ISO 6346 letter values skip multiples of 11
+LETTER_VALUES = {}
+_value = 10
+for _letter in "ABCDEFGHIJKLMNOPQRSTUVWXYZ":
+    if _value % 11 == 0:
+        _value += 1
+    LETTER_VALUES[_letter] = _value
+    _value += 1
+
+# Common OCR confusions, applied only where the position requires it
+TO_LETTER = {'0': 'O', '1': 'I', '2': 'Z', '5': 'S', '6': 'G', '8': 'B'}
+TO_DIGIT = {'O': '0', 'Q': '0', 'D': '0', 'I': '1', 'L': '1', 'Z': '2',
+            'S': '5', 'G': '6', 'T': '7', 'B': '8'}
+
+CATEGORY_IDENTIFIERS = "UJZ"
+
+CODE_PATTERN = re.compile(r'^[A-Z]{3}[UJZ][0-9]{7}$')
+
+
+def check_digit(code):
+    """Compute the check digit for the first 10 characters of a container code"""
+    total = 0
+    for i, char in enumerate(code[:10]):
+        value = LETTER_VALUES[char] if char.isalpha() else int(char)
+        total += value * (2 ** i)
+    return total % 11 % 10
+
+
+def is_valid_container_code(code):
+    if not code or not CODE_PATTERN.match(code):
+        return False
+    return check_digit(code) == int(code[10])
+
+
+def repair_code(candidate):
+    """Fix letter/digit confusions by position: 4 letters then 7 digits"""
+    chars = list(candidate)
+    for i, char in enumerate(chars):
+        if i < 4:
+            chars[i] = TO_LETTER.get(char, char)
+        else:
+            chars[i] = TO_DIGIT.get(char, char)
+    return ''.join(chars)
+
+
+def find_container_code(text):
+    """
+    Look for a valid ISO 6346 code in raw OCR output.
+    Returns the code or None if nothing in the text checks out.
+    """
+    cleaned = re.sub(r'[^A-Z0-9]', '', text.upper())
+    for start in range(len(cleaned) - 10):
+        candidate = repair_code(cleaned[start:start + 11])
+        if is_valid_container_code(candidate):
+            return candidate
+    return None
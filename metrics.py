@@ -0,0 +1,200 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, covers a fast color conversion up to a slow OCR pass
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PREFIX = "container_ocr"
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    """Empty values are left out, e.g. stages that are not per camera"""
+    labels = [(key, value) for key, value in labels if value != ""]
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels) + "}"
+
+
+class StageHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+
+    def quantile(self, q):
+        """Bucket upper bound containing the q quantile, good enough for a stats panel"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class MetricsRegistry:
+    """
+    Process wide timings, counters and gauges.
+    Disabled by default: start() then returns 0 and observe_since() returns
+    right away, so instrumented code pays one attribute check per call.
+    Gauges that are cheap to read on demand (queue depths, FPS) come from
+    collectors called at scrape time instead of being pushed.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.collectors = {}
+
+    def start(self):
+        return time.perf_counter() if self.enabled else 0
+
+    def observe_since(self, stage, start, camera=""):
+        if not start or not self.enabled:
+            return
+        self.observe(stage, time.perf_counter() - start, camera)
+
+    def observe(self, stage, seconds, camera=""):
+        key = (stage, camera)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = StageHistogram()
+            histogram.observe(seconds)
+
+    def inc(self, name, camera="", amount=1):
+        if not self.enabled:
+            return
+        key = (name, camera)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def register_collector(self, name, collector):
+        """collector() returns a list of (metric, labels dict, value) gauges"""
+        with self.lock:
+            self.collectors[name] = collector
+
+    def unregister_collector(self, name):
+        with self.lock:
+            self.collectors.pop(name, None)
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def collect_gauges(self):
+        with self.lock:
+            collectors = list(self.collectors.values())
+        gauges = []
+        for collector in collectors:
+            try:
+                gauges.extend(collector())
+            except Exception as e:
+                print(f"Metrics collector failed: {str(e)}")
+        return gauges
+
+    def snapshot(self):
+        """Plain dict view for the stats panel"""
+        with self.lock:
+            stages = {
+                key: {
+                    'count': histogram.count,
+                    'mean_ms': histogram.total / histogram.count * 1000.0 if histogram.count else 0.0,
+                    'last_ms': histogram.last * 1000.0,
+                    'p95_ms': (histogram.quantile(0.95) or 0.0) * 1000.0
+                }
+                for key, histogram in self.histograms.items()
+            }
+            counters = dict(self.counters)
+        return {'stages': stages, 'counters': counters, 'gauges': self.collect_gauges()}
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = [
+            f"# HELP {PREFIX}_stage_seconds Time spent per pipeline stage",
+            f"# TYPE {PREFIX}_stage_seconds histogram"
+        ]
+        with self.lock:
+            histograms = [(key, list(h.counts), h.count, h.total)
+                          for key, h in sorted(self.histograms.items())]
+            counters = sorted(self.counters.items())
+        for (stage, camera), counts, count, total in histograms:
+            base = [('stage', stage), ('camera', camera)]
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f"{PREFIX}_stage_seconds_bucket"
+                             f"{format_labels(base + [('le', repr(bound))])} {cumulative}")
+            lines.append(f"{PREFIX}_stage_seconds_bucket"
+                         f"{format_labels(base + [('le', '+Inf')])} {count}")
+            lines.append(f"{PREFIX}_stage_seconds_sum{format_labels(base)} {total}")
+            lines.append(f"{PREFIX}_stage_seconds_count{format_labels(base)} {count}")
+
+        typed = set()
+        for (name, camera), value in counters:
+            metric = f"{PREFIX}_{name}_total"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{format_labels([('camera', camera)])} {value}")
+
+        for name, labels, value in self.collect_gauges():
+            metric = f"{PREFIX}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} gauge")
+                typed.add(metric)
+            lines.append(f"{metric}{format_labels(sorted(labels.items()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = METRICS.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """Serves METRICS on http://host:port/metrics from a daemon thread"""
+
+    def __init__(self, host='127.0.0.1', port=9108):
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,91 @@
+import time
+import cv2
+
+class MotionGate:
+    """
+    Cheap change detector that decides whether a frame is worth sending to
+    the detector. Works on a small blurred grayscale copy of the frame and
+    compares it against a running-average background.
+    """
+
+    def __init__(self, sensitivity=0.5, width=160, pixel_threshold=25,
+                 learning_rate=0.05, hold_time=1.0, keepalive=5.0):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.learning_rate = learning_rate
+        # Keep forwarding for a while after motion so a container that has
+        # just stopped still gets detected
+        self.hold_time = hold_time
+        # Forward one frame every keepalive seconds even on a static scene
+        self.keepalive = keepalive
+        self.set_sensitivity(sensitivity)
+        self.reset()
+
+    def set_sensitivity(self, sensitivity):
+        """0.0 only reacts to large changes, 1.0 reacts to almost anything"""
+        self.sensitivity = min(max(float(sensitivity), 0.0), 1.0)
+        self.min_changed_ratio = max(0.0005, 0.02 * (1.0 - self.sensitivity))
+
+    def reset(self):
+        self.background = None
+        self.last_motion = None
+        self.last_forward = 0.0
+        # True when the last forwarded frame was only a keepalive, not motion
+        self.keepalive_forward = False
+        self.change_ratio = 0.0
+        self.checked_count = 0
+        self.forwarded_count = 0
+
+    def prepare(self, frame):
+        h, w = frame.shape[:2]
+        scale = self.width / float(w)
+        small = cv2.resize(frame, (self.width, max(1, int(h * scale))),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def check(self, frame):
+        """
+        Return True if the frame shows meaningful change and should be detected.
+        Keepalive forwards also return True, keepalive_forward tells them apart.
+        """
+        now = time.monotonic()
+        self.checked_count += 1
+        self.keepalive_forward = False
+        gray = self.prepare(frame)
+
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype('float32')
+            self.change_ratio = 1.0
+            self.last_motion = now
+            return self.forward(now)
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        self.change_ratio = cv2.countNonZero(mask) / float(mask.size)
+        cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+
+        if self.change_ratio >= self.min_changed_ratio:
+            self.last_motion = now
+        if self.last_motion is not None and now - self.last_motion <= self.hold_time:
+            return self.forward(now)
+        if self.keepalive and now - self.last_forward >= self.keepalive:
+            self.keepalive_forward = True
+            return self.forward(now)
+        return False
+
+    def forward(self, now):
+        self.forwarded_count += 1
+        self.last_forward = now
+        return True
+
+    def get_stats(self):
+        skipped = self.checked_count - self.forwarded_count
+        return {
+            'sensitivity': self.sensitivity,
+            'checked': self.checked_count,
+            'forwarded': self.forwarded_count,
+            'skipped': skipped,
+            'skip_rate': skipped / self.checked_count if self.checked_count else 0.0,
+            'change_ratio': self.change_ratio
+        }
@@ -1,8 +1,491 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, as_completed
+
+import cv2
+import numpy as np
 import pytesseract
+from iso6346 import find_container_code
+from metrics import METRICS
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# PSM 0 only does orientation/script detection and never returns text
+TEXT_PSM_MODES = (1, 3, 6, 7)
+
+# Characters of container codes and ISO size/type codes
+CONTAINER_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
 
 class OCRProcessor:
-    def __init__(self, tesseract_path):
+    def __init__(self, tesseract_path, pool_workers=0, max_queue=32, psm_modes=(7, 6),
+                 cache=None, engine='tesseract', engine_options=None):
+        """
+        Args:
+            engine: 'tesseract', or 'onnx' for OnnxCrnnEngine built from engine_options
+            pool_workers: Tesseract worker threads, batched engines don't use a pool
+        """
         pytesseract.pytesseract.tesseract_cmd = tesseract_path
+        self.set_psm_modes(psm_modes)
+        # Optional OCRResultCache shared by all reads of this processor
+        self.cache = cache
+        self.pool = None
+        if engine == 'onnx':
+            self.engine = OnnxCrnnEngine(**(engine_options or {}))
+        elif engine == 'tesseract':
+            self.engine = PytesseractEngine()
+            if pool_workers > 0:
+                self.pool = OCRWorkerPool(tesseract_path, workers=pool_workers, max_queue=max_queue)
+        else:
+            raise ValueError(f"Unknown OCR engine: {engine}")
+        # Batched engines read a list of crops in one call, Tesseract one at a time
+        self.batched = self.engine.batched
+
+    @classmethod
+    def from_config(cls, config):
+        """Processor, result cache included, for the 'ocr' block of config.json"""
+        from ocr_cache import OCRResultCache
+        ocr_config = config.get('ocr', {})
+        cache = OCRResultCache(**ocr_config['cache']) if 'cache' in ocr_config else None
+        engine = ocr_config.get('engine', 'tesseract')
+        return cls(
+            config['tesseract_path'],
+            pool_workers=ocr_config.get('workers', 2),
+            max_queue=ocr_config.get('max_queue', 32),
+            psm_modes=ocr_config.get('psm_modes', [7, 6]),
+            cache=cache,
+            engine=engine,
+            engine_options=ocr_config.get(engine)
+        )
 
     def extract_text(self, image):
-        return pytesseract.image_to_string(image)
+        image_hash = None
+        if self.cache is not None:
+            image_hash = self.cache.hash(image)
+            cached = self.cache.get(image_hash)
+            if cached is not None:
+                return cached
+        if self.pool is not None:
+            text = self.pool.submit(image).result()
+        else:
+            text = self.engine.recognize(image)
+        if self.cache is not None:
+            self.cache.put(image_hash, text)
+        return text
+
+    def submit(self, image, psm=None, timeout=None):
+        """Queue an image for OCR and return a Future with its text"""
+        if self.pool is not None:
+            return self.pool.submit(image, psm, timeout)
+        future = Future()
+        start = METRICS.start()
+        try:
+            future.set_result(self.engine.recognize(image, psm))
+            METRICS.observe_since('ocr_recognize', start)
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def recognize_batch(self, images, psm=None):
+        """(text, per-character confidences) for every image, see OCREngine"""
+        if self.pool is not None:
+            futures = [self.pool.submit(image, psm, detailed=True) for image in images]
+            return [future.result() for future in futures]
+        start = METRICS.start()
+        results = self.engine.recognize_batch(images, psm)
+        METRICS.observe_since('ocr_recognize', start)
+        return results
+
+    def extract_batch(self, images, psm=None):
+        kind = 'text' if psm is None else f'text:{psm}'
+        hashes = [None] * len(images)
+        texts = [None] * len(images)
+        if self.cache is not None:
+            for i, image in enumerate(images):
+                hashes[i] = self.cache.hash(image)
+                texts[i] = self.cache.get(hashes[i], kind)
+        missing = [i for i, text in enumerate(texts) if text is None]
+        if self.batched:
+            # One forward pass for every crop the cache couldn't answer
+            recognized = [text for text, _ in self.recognize_batch([images[i] for i in missing], psm)]
+        else:
+            futures = [self.submit(images[i], psm) for i in missing]
+            recognized = [future.result() for future in futures]
+        for i, text in zip(missing, recognized):
+            texts[i] = text
+            if self.cache is not None:
+                self.cache.put(hashes[i], text, kind)
+        return texts
+
+    def warmup(self, timeout=60.0):
+        """Recognize a blank image on every worker so the first real crop isn't slow"""
+        import numpy as np
+        blank = np.full((32, 128), 255, dtype=np.uint8)
+        workers = len(self.pool.workers) if self.pool is not None else 1
+        deadline = time.monotonic() + timeout
+        for future in [self.submit(blank) for _ in range(workers)]:
+            future.result(timeout=max(0.0, deadline - time.monotonic()))
+
+    def set_psm_modes(self, psm_modes):
+        modes = [int(psm) for psm in psm_modes if int(psm) in TEXT_PSM_MODES]
+        self.psm_modes = modes or [7]
+
+    def preprocess_variants(self, image):
+        """Preprocessed versions of a code crop, cheapest and most likely first"""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        h = gray.shape[0]
+        if h < 40:
+            gray = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        # Light text on dark containers
+        inverted = cv2.bitwise_not(binary)
+        return [('gray', gray), ('otsu', binary), ('otsu_inv', inverted)]
+
+    def read_container_code(self, image):
+        """
+        Try the selected PSM modes on several preprocessed variants of a cn-11
+        crop and stop at the first ISO 6346 valid code.
+        Returns dict with code, valid, psm, variant and attempts
+        """
+        if self.batched:
+            return self.read_container_codes([image])[0]
+        if self.cache is None:
+            return self.run_container_attempts(image)
+        image_hash = self.cache.hash(image)
+        cached = self.cache.get(image_hash, 'container')
+        if cached is not None:
+            return dict(cached, attempts=0)
+        result = self.run_container_attempts(image)
+        self.cache.put(image_hash, result, 'container')
+        return result
+
+    def read_container_codes(self, images):
+        """
+        read_container_code for several crops. A batched engine reads every
+        preprocessed variant of every crop in one pass, so there is no early
+        stop; results also carry the per-character confidences of the code.
+        """
+        if not self.batched:
+            return [self.read_container_code(image) for image in images]
+        hashes = [None] * len(images)
+        results = [None] * len(images)
+        if self.cache is not None:
+            for i, image in enumerate(images):
+                hashes[i] = self.cache.hash(image)
+                cached = self.cache.get(hashes[i], 'container')
+                if cached is not None:
+                    results[i] = dict(cached, attempts=0)
+        missing = [i for i, result in enumerate(results) if result is None]
+        variants = [self.preprocess_variants(images[i]) for i in missing]
+        readings = iter(self.recognize_batch(
+            [variant for image_variants in variants for _, variant in image_variants]))
+        for i, image_variants in zip(missing, variants):
+            result = {'code': None, 'valid': False, 'psm': None, 'variant': None,
+                      'attempts': 0, 'raw': [], 'confidences': []}
+            for name, _ in image_variants:
+                text, confidences = next(readings)
+                result['attempts'] += 1
+                result['raw'].append(text)
+                code = find_container_code(text) if not result['valid'] else None
+                if code:
+                    result.update({'code': code, 'valid': True, 'variant': name,
+                                   'confidences': confidences})
+            results[i] = result
+            if self.cache is not None:
+                self.cache.put(hashes[i], result, 'container')
+        return results
+
+    def run_container_attempts(self, image):
+        attempts = [(psm, name, variant)
+                    for psm in self.psm_modes
+                    for name, variant in self.preprocess_variants(image)]
+        raw_texts = []
+
+        if self.pool is None:
+            for i, (psm, name, variant) in enumerate(attempts):
+                text = self.engine.recognize(variant, psm)
+                raw_texts.append(text)
+                code = find_container_code(text)
+                if code:
+                    return {'code': code, 'valid': True, 'psm': psm,
+                            'variant': name, 'attempts': i + 1, 'raw': raw_texts}
+            return {'code': None, 'valid': False, 'psm': None,
+                    'variant': None, 'attempts': len(attempts), 'raw': raw_texts}
+
+        futures = {}
+        for psm, name, variant in attempts:
+            futures[self.pool.submit(variant, psm)] = (psm, name)
+        result = {'code': None, 'valid': False, 'psm': None,
+                  'variant': None, 'attempts': 0, 'raw': raw_texts}
+        for future in as_completed(futures):
+            if future.cancelled() or future.exception() is not None:
+                continue
+            result['attempts'] += 1
+            text = future.result()
+            raw_texts.append(text)
+            code = find_container_code(text)
+            if code:
+                psm, name = futures[future]
+                result.update({'code': code, 'valid': True, 'psm': psm, 'variant': name})
+                break
+        # Drop attempts that haven't started yet
+        for future in futures:
+            future.cancel()
+        return result
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+        self.engine.close()
+
+
+def spread_word_confidences(text, word_confidences):
+    """Per-character confidences from Tesseract's 0-100 word ones, whitespace counts as certain"""
+    if len(text.split()) != len(word_confidences):
+        return []
+    confidences = []
+    word = -1
+    in_word = False
+    for char in text:
+        if char.isspace():
+            confidences.append(1.0)
+            in_word = False
+            continue
+        if not in_word:
+            word += 1
+            in_word = True
+        confidences.append(word_confidences[word] / 100.0)
+    return confidences
+
+
+class OCREngine:
+    """
+    Interface of the OCR backends. recognize_batch() takes a list of crops
+    and returns one (text, confidences) pair per crop, with one 0-1
+    confidence per character of text, or an empty list if the backend has
+    none. recognize() returns just the text of one crop. Subclasses
+    implement at least one of the two; batched engines implement
+    recognize_batch and read the whole list in one call.
+    """
+    batched = False
+
+    def recognize(self, image, psm=None):
+        return self.recognize_batch([image], psm)[0][0]
+
+    def recognize_batch(self, images, psm=None):
+        return [(self.recognize(image, psm), []) for image in images]
+
+    def close(self):
+        pass
+
+
+class TesserocrEngine(OCREngine):
+    """In-process Tesseract API, language data is loaded once per worker"""
+
+    def __init__(self, tesseract_path, lang='eng'):
+        tessdata = os.path.join(os.path.dirname(tesseract_path), 'tessdata')
+        if os.path.isdir(tessdata):
+            self.api = tesserocr.PyTessBaseAPI(path=tessdata, lang=lang)
+        else:
+            self.api = tesserocr.PyTessBaseAPI(lang=lang)
+        self.default_psm = self.api.GetPageSegMode()
+
+    def recognize(self, image, psm=None):
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        h, w = image.shape[:2]
+        self.api.SetPageSegMode(self.default_psm if psm is None else int(psm))
+        self.api.SetImageBytes(image.tobytes(), w, h, 1, w)
+        return self.api.GetUTF8Text()
+
+    def recognize_batch(self, images, psm=None):
+        results = []
+        for image in images:
+            text = self.recognize(image, psm)
+            results.append((text, spread_word_confidences(text, self.api.AllWordConfidences())))
+        return results
+
+    def close(self):
+        self.api.End()
+
+
+class PytesseractEngine(OCREngine):
+    """Fallback when tesserocr isn't installed, still one tesseract process per call"""
+
+    def recognize(self, image, psm=None):
+        config = f'--psm {psm}' if psm is not None else ''
+        return pytesseract.image_to_string(image, config=config)
+
+
+class OnnxCrnnEngine(OCREngine):
+    """
+    CRNN-style single line recognizer on onnxruntime's CPU provider.
+    Crops are converted to grayscale, scaled to the model's input height,
+    padded to the widest crop and recognized in one forward pass per
+    batch_size crops. The model takes (N, 1, height, width) floats in -1..1
+    and returns logits or log-probabilities over blank + alphabet, (N, T, C)
+    or with layout 'TNC' time first; the output is greedy CTC decoded.
+    PSM modes don't apply and are ignored.
+    """
+    batched = True
+
+    def __init__(self, model_path, alphabet=CONTAINER_ALPHABET, height=32, max_width=320,
+                 batch_size=32, threads=0, layout='NTC'):
+        # Only pay for onnxruntime when this engine is selected
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.alphabet = alphabet
+        self.height = height
+        self.max_width = max_width
+        self.batch_size = max(1, batch_size)
+        self.layout = layout
+
+    def prepare(self, image):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        h, w = gray.shape[:2]
+        width = min(self.max_width, max(self.height // 2, int(round(w * self.height / float(h)))))
+        return cv2.resize(gray, (width, self.height), interpolation=cv2.INTER_AREA)
+
+    def recognize_batch(self, images, psm=None):
+        results = []
+        for start in range(0, len(images), self.batch_size):
+            results.extend(self.run(images[start:start + self.batch_size]))
+        return results
+
+    def run(self, images):
+        if not images:
+            return []
+        lines = [self.prepare(image) for image in images]
+        width = max(line.shape[1] for line in lines)
+        batch = np.empty((len(lines), 1, self.height, width), dtype=np.float32)
+        for i, line in enumerate(lines):
+            # Repeat the last column rather than adding an artificial edge
+            line = cv2.copyMakeBorder(line, 0, 0, 0, width - line.shape[1], cv2.BORDER_REPLICATE)
+            batch[i, 0] = line.astype(np.float32) / 127.5 - 1.0
+        logits = self.session.run(None, {self.input_name: batch})[0]
+        if self.layout == 'TNC':
+            logits = logits.transpose(1, 0, 2)
+        # Softmax also turns log-probabilities back into probabilities
+        logits = logits - logits.max(axis=2, keepdims=True)
+        probabilities = np.exp(logits)
+        probabilities /= probabilities.sum(axis=2, keepdims=True)
+        return [self.decode(line) for line in probabilities]
+
+    def decode(self, probabilities):
+        """Greedy CTC: best class per step, repeats collapsed, blanks (index 0) dropped"""
+        text = []
+        confidences = []
+        previous = 0
+        for index, score in zip(probabilities.argmax(axis=1), probabilities.max(axis=1)):
+            index = int(index)
+            if 0 < index <= len(self.alphabet):
+                if index != previous:
+                    text.append(self.alphabet[index - 1])
+                    confidences.append(float(score))
+                else:
+                    confidences[-1] = max(confidences[-1], float(score))
+            previous = index
+        return ''.join(text), confidences
+
+
+class OCRWorkerPool:
+    """
+    Persistent OCR workers fed from a bounded queue.
+    submit() blocks when the queue is full so producers slow down instead of
+    piling up crops in memory. If an engine fails to start (e.g. missing
+    tessdata) the pool fails every task with that error instead of hanging.
+    """
+
+    def __init__(self, tesseract_path, workers=2, max_queue=32, lang='eng'):
+        self.tesseract_path = tesseract_path
+        self.lang = lang
+        self.tasks = queue.Queue(maxsize=max_queue)
+        self.closed = False
+        self.error = None
+        self.workers = []
+        for _ in range(max(1, workers)):
+            worker = threading.Thread(target=self.worker_loop, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def create_engine(self):
+        if tesserocr is not None:
+            return TesserocrEngine(self.tesseract_path, self.lang)
+        return PytesseractEngine()
+
+    def worker_loop(self):
+        try:
+            engine = self.create_engine()
+        except Exception as e:
+            print(f"OCR engine failed to start: {str(e)}")
+            self.error = e
+            self.fail_tasks(e)
+            return
+        try:
+            while True:
+                task = self.tasks.get()
+                if task is None:
+                    break
+                image, psm, detailed, future = task
+                if not future.set_running_or_notify_cancel():
+                    continue
+                start = METRICS.start()
+                try:
+                    if detailed:
+                        future.set_result(engine.recognize_batch([image], psm)[0])
+                    else:
+                        future.set_result(engine.recognize(image, psm))
+                    METRICS.observe_since('ocr_recognize', start)
+                except Exception as e:
+                    future.set_exception(e)
+        finally:
+            engine.close()
+
+    def fail_tasks(self, error):
+        """Fail everything queued now or later with error, until close()"""
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            future = task[3]
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def submit(self, image, psm=None, timeout=None, detailed=False):
+        """
+        Queue an image for OCR. The future holds the text, or with detailed
+        the (text, confidences) pair of OCREngine.recognize_batch.
+        Raises queue.Full if no slot frees up within timeout seconds.
+        """
+        if self.closed:
+            raise RuntimeError("OCR pool is closed")
+        if self.error is not None:
+            raise RuntimeError(f"OCR engine failed to start: {str(self.error)}") from self.error
+        future = Future()
+        self.tasks.put((image, psm, detailed, future), timeout=timeout)
+        return future
+
+    def map(self, images, psm=None):
+        futures = [self.submit(image, psm) for image in images]
+        return [future.result() for future in futures]
+
+    def queue_depth(self):
+        return self.tasks.qsize()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            worker.join()
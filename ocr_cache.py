@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+
+def dhash(image, hash_size=16):
+    """Difference hash of an ROI, robust to small shifts and lighting changes"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    value = 0
+    for row in small.tolist():
+        for left, right in zip(row, row[1:]):
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class OCRResultCache:
+    """
+    Bounded LRU cache of OCR results keyed by the perceptual hash of the crop.
+    A lookup also matches cached crops within max_distance bits, so nearly
+    identical crops of a parked container reuse the earlier reading.
+    Kinds in exact_kinds only match the identical hash: codes of one owner
+    differ in a few digits and hash close together, and handing a check
+    digit valid code to the next container would be worse than a miss.
+    """
+
+    def __init__(self, max_entries=256, ttl=30.0, max_distance=4, hash_size=16,
+                 exact_kinds=('container',)):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.exact_kinds = tuple(exact_kinds)
+        # (kind, hash) -> (value, stored_at), oldest first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def hash(self, image):
+        return dhash(image, self.hash_size)
+
+    def get(self, image_hash, kind='text'):
+        """Return the cached value or None"""
+        now = time.monotonic()
+        with self.lock:
+            self.expire(now)
+            key = (kind, image_hash)
+            if key not in self.entries:
+                key = None if kind in self.exact_kinds else self.find_near(image_hash, kind)
+            if key is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key][0]
+
+    def put(self, image_hash, value, kind='text'):
+        with self.lock:
+            key = (kind, image_hash)
+            self.entries[key] = (value, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def find_near(self, image_hash, kind):
+        best_key = None
+        best_distance = self.max_distance + 1
+        for key in self.entries:
+            if key[0] != kind:
+                continue
+            distance = hamming_distance(key[1], image_hash)
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+        return best_key
+
+    def expire(self, now):
+        if not self.ttl:
+            return
+        # Entries are kept in access order, not insertion order, so scan all
+        expired = [key for key, (_, stored_at) in self.entries.items()
+                   if now - stored_at > self.ttl]
+        for key in expired:
+            del self.entries[key]
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+
+from metrics import METRICS
+
+
+def allocate_rates(budget, weights, min_rate, max_rate):
+    """
+    Split a detections-per-second budget between cameras.
+    Every camera is guaranteed the same floor (min_rate, less if the budget
+    can't cover it). What is left goes to cameras with a weight above 1 in
+    proportion to their weight, never more than max_rate each, and the
+    share of capped cameras is handed on to the others. Idle cameras
+    (weight 1) stay at the floor.
+    """
+    if not weights:
+        return {}
+    floor = min(min_rate, budget / len(weights))
+    rates = {name: floor for name in weights}
+    remaining = budget - floor * len(weights)
+    boosted = {name for name, weight in weights.items() if weight > 1.0}
+    while remaining > 1e-6 and boosted:
+        total = sum(weights[name] for name in boosted)
+        spent = 0.0
+        for name in list(boosted):
+            share = remaining * weights[name] / total
+            room = max_rate - rates[name]
+            given = min(share, room)
+            rates[name] += given
+            spent += given
+            if room <= share:
+                boosted.discard(name)
+        remaining -= spent
+        if spent <= 1e-9:
+            break
+    return rates
+
+
+class CameraActivity:
+    def __init__(self, rate):
+        self.rate = rate
+        self.weight = 1.0
+        self.last_motion = 0.0
+        self.tracks = 0
+        self.last_allowed = None
+
+
+class InferenceScheduler(threading.Thread):
+    """
+    Decides how often each camera may send a frame to the detector.
+    Stream threads report motion and open tracks on every frame and ask
+    allow() before submitting. Once per interval the scheduler turns recent
+    activity into weights (tracking > motion > idle) and splits the budget
+    with allocate_rates, so busy lanes are boosted, idle lanes drop to a
+    heartbeat and no lane can take more than max_rate.
+    With cpu_target set, the budget itself follows process CPU usage.
+    """
+
+    def __init__(self, budget_fps=20.0, min_rate=0.5, max_rate=8.0, motion_weight=4.0,
+                 tracking_weight=8.0, activity_hold=3.0, cpu_target=None, interval=1.0):
+        """
+        Args:
+            budget_fps: detections per second shared by all cameras
+            min_rate: heartbeat rate every camera keeps, even when idle
+            max_rate: no single camera gets more than this
+            activity_hold: seconds a lane counts as active after its last motion
+            cpu_target: fraction of all cores (0-1) to aim for, None for a fixed budget
+        """
+        super().__init__(daemon=True)
+        self.max_budget = budget_fps
+        self.budget = budget_fps
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.motion_weight = motion_weight
+        self.tracking_weight = tracking_weight
+        self.activity_hold = activity_hold
+        self.cpu_target = cpu_target
+        self.interval = interval
+        self.cpu_usage = None
+        self.lock = threading.Lock()
+        self.cameras = {}
+        self.stopped = threading.Event()
+        METRICS.register_collector('scheduler', self.collect_metrics)
+
+    @classmethod
+    def from_config(cls, config):
+        """Scheduler for the 'scheduler' block of config.json, None if disabled"""
+        scheduler_config = dict(config.get('scheduler', {}))
+        if not scheduler_config.pop('enabled', False):
+            return None
+        return cls(**scheduler_config)
+
+    def register(self, camera_name):
+        with self.lock:
+            if camera_name not in self.cameras:
+                self.cameras[camera_name] = CameraActivity(self.min_rate)
+        self.rebalance()
+
+    def unregister(self, camera_name):
+        with self.lock:
+            self.cameras.pop(camera_name, None)
+        self.rebalance()
+
+    def report(self, camera_name, motion, tracks):
+        """Called by the stream thread for every frame while detection is on"""
+        state = self.cameras.get(camera_name)
+        if state is None:
+            return
+        if motion:
+            state.last_motion = time.monotonic()
+        state.tracks = tracks
+        if state.weight == 1.0 and (motion or tracks > 0):
+            # Boost a lane the moment it wakes up, not at the next interval
+            self.rebalance()
+
+    def allow(self, camera_name):
+        """True if the camera may submit a frame now"""
+        state = self.cameras.get(camera_name)
+        if state is None:
+            return True
+        now = time.monotonic()
+        # Spaced by the current rate, so a boost applies to a lane right away;
+        # measured from the last frame, so unused slots can't be banked for a burst
+        if state.last_allowed is not None and now - state.last_allowed < 1.0 / state.rate:
+            return False
+        state.last_allowed = now
+        return True
+
+    def rate(self, camera_name):
+        state = self.cameras.get(camera_name)
+        return state.rate if state is not None else None
+
+    def run(self):
+        last_time, last_cpu = time.monotonic(), time.process_time()
+        while not self.stopped.wait(self.interval):
+            now, cpu = time.monotonic(), time.process_time()
+            self.adapt_budget((cpu - last_cpu) / max(now - last_time, 1e-6) / (os.cpu_count() or 1))
+            last_time, last_cpu = now, cpu
+            self.rebalance()
+
+    def adapt_budget(self, usage):
+        self.cpu_usage = usage
+        if self.cpu_target is None:
+            return
+        # Back off quickly when over target, creep back up when well under it
+        if usage > self.cpu_target:
+            self.budget = max(self.max_budget * 0.1, self.budget * 0.8)
+        elif usage < self.cpu_target * 0.8:
+            self.budget = min(self.max_budget, self.budget * 1.1)
+
+    def rebalance(self):
+        now = time.monotonic()
+        with self.lock:
+            states = dict(self.cameras)
+        for state in states.values():
+            if state.tracks > 0:
+                state.weight = self.tracking_weight
+            elif now - state.last_motion < self.activity_hold:
+                state.weight = self.motion_weight
+            else:
+                state.weight = 1.0
+        rates = allocate_rates(self.budget, {name: state.weight for name, state in states.items()},
+                               self.min_rate, self.max_rate)
+        for name, rate in rates.items():
+            states[name].rate = max(rate, 1e-3)
+
+    def get_stats(self):
+        with self.lock:
+            cameras = {name: {'rate': state.rate, 'weight': state.weight, 'tracks': state.tracks}
+                       for name, state in self.cameras.items()}
+        return {'budget': self.budget, 'cpu_usage': self.cpu_usage, 'cameras': cameras}
+
+    def collect_metrics(self):
+        # Per-camera rates are reported with the other camera stats
+        gauges = [('scheduler_budget', {}, self.budget)]
+        if self.cpu_usage is not None:
+            gauges.append(('scheduler_cpu_usage', {}, self.cpu_usage))
+        return gauges
+
+    def stop(self):
+        self.stopped.set()
+        METRICS.unregister_collector('scheduler')
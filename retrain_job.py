@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+from datetime import datetime
+
+VERSIONS_DIR = os.path.join("models", "versions")
+# Exit code when too few new samples arrived and no model was trained
+SKIPPED_EXIT_CODE = 3
+
+
+def limit_resources(nice=10, threads=2, cpus=None):
+    """
+    Keep training out of the way of the live cameras. Must run before torch
+    is imported so the thread caps take effect.
+    """
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                 'NUMEXPR_NUM_THREADS'):
+        os.environ[name] = str(threads)
+    if hasattr(os, 'nice'):
+        os.nice(nice)
+    else:
+        try:
+            import psutil
+            psutil.Process().nice(psutil.BELOW_NORMAL_PRIORITY_CLASS)
+        except ImportError:
+            pass
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        available = sorted(os.sched_getaffinity(0))
+        # Take the last cores, capture threads tend to start on the first ones
+        os.sched_setaffinity(0, set(available[-cpus:]))
+
+
+def in_window(window, now=None):
+    """True if now falls inside a 'HH:MM-HH:MM' window, which may cross midnight"""
+    if not window:
+        return True
+    now = (now or datetime.now()).strftime("%H:%M")
+    start, end = window.split('-')
+    if start <= end:
+        return start <= now < end
+    return now >= start or now < end
+
+
+def wait_for_window(window, poll=60):
+    while not in_window(window):
+        time.sleep(poll)
+
+
+def next_version_dir(versions_dir=VERSIONS_DIR):
+    os.makedirs(versions_dir, exist_ok=True)
+    existing = [name for name in os.listdir(versions_dir) if name.startswith('v')]
+    numbers = [int(name[1:4]) for name in existing if name[1:4].isdigit()]
+    version = max(numbers, default=0) + 1
+    name = f"v{version:03d}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    return os.path.join(versions_dir, name)
+
+
+def samples_since_last_training(summary):
+    latest_path = os.path.join(VERSIONS_DIR, 'latest.json')
+    if not os.path.exists(latest_path):
+        return summary['unique']
+    with open(latest_path, 'r') as f:
+        latest = json.load(f)
+    with open(latest['report_path'], 'r') as f:
+        trained_on = json.load(f)['dataset']['unique']
+    return summary['unique'] - trained_on
+
+
+def box_metrics(results):
+    return {
+        'precision': float(results.box.mp),
+        'recall': float(results.box.mr),
+        'map50': float(results.box.map50),
+        'map50_95': float(results.box.map)
+    }
+
+
+def run_training(base_model, data_yaml, epochs, imgsz, threads, dataset_summary):
+    from ultralytics import YOLO
+    import torch
+    torch.set_num_threads(threads)
+
+    version_dir = next_version_dir()
+    start = time.monotonic()
+    model = YOLO(base_model)
+    model.train(
+        data=data_yaml,
+        epochs=epochs,
+        imgsz=imgsz,
+        device='cpu',
+        workers=0,
+        batch=8,
+        project=version_dir,
+        name='train',
+        exist_ok=True,
+        verbose=False
+    )
+    trained_path = os.path.join(version_dir, 'train', 'weights', 'best.pt')
+    model_path = os.path.join(version_dir, 'model.pt')
+    shutil.copy2(trained_path, model_path)
+
+    report = {
+        'version': os.path.basename(version_dir),
+        'base_model': base_model,
+        'model_path': model_path,
+        'epochs': epochs,
+        'imgsz': imgsz,
+        'train_seconds': time.monotonic() - start,
+        'dataset': dataset_summary,
+        'candidate': box_metrics(YOLO(model_path).val(data=data_yaml, imgsz=imgsz,
+                                                      device='cpu', workers=0, verbose=False)),
+        'baseline': box_metrics(YOLO(base_model).val(data=data_yaml, imgsz=imgsz,
+                                                     device='cpu', workers=0, verbose=False))
+    }
+    report_path = os.path.join(version_dir, 'report.json')
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=4)
+    with open(os.path.join(VERSIONS_DIR, 'latest.json'), 'w') as f:
+        json.dump({'model_path': model_path, 'report_path': report_path}, f, indent=4)
+    return model_path, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Low-priority background retraining job")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--nice', type=int, default=15)
+    parser.add_argument('--threads', type=int, default=2)
+    parser.add_argument('--cpus', type=int, default=None, help="Pin to this many cores")
+    parser.add_argument('--window', default=None,
+                        help="Only start inside this off-peak window, e.g. 01:00-05:00")
+    parser.add_argument('--min-new-samples', type=int, default=50)
+    args = parser.parse_args()
+
+    limit_resources(args.nice, args.threads, args.cpus)
+    wait_for_window(args.window)
+
+    from config import ConfigManager
+    from dataset_manifest import DatasetManifest
+    config = ConfigManager(args.config).config
+    manifest = DatasetManifest()
+    manifest.update()
+    summary = manifest.summary()
+    new_samples = samples_since_last_training(summary)
+    if new_samples < args.min_new_samples:
+        print(f"Only {new_samples} new samples, skipping retraining")
+        return SKIPPED_EXIT_CODE
+
+    model_path, report = run_training(
+        config['yolo_model_path'], manifest.write_dataset_yaml(),
+        args.epochs, args.imgsz, args.threads, summary)
+    print(f"Trained {model_path}: {report['candidate']} (baseline {report['baseline']})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+import cv2
+import numpy as np
+
+# Ultralytics letterbox grey, masked pixels look like padding to the model
+MASK_VALUE = 114
+# Smaller tiles would turn one frame into thousands of detector inputs
+MIN_TILE_SIZE = 64
+
+
+def tile_starts(length, tile_size, overlap):
+    """Start offsets of tiles covering length, the last one flush with the end"""
+    if not tile_size or length <= tile_size:
+        return [0]
+    step = max(1, int(tile_size * (1.0 - overlap)))
+    starts = list(range(0, length - tile_size, step))
+    starts.append(length - tile_size)
+    return starts
+
+
+def box_overlap(a, b):
+    """Intersection over the smaller box, a box cut off at a tile edge scores high against the whole one"""
+    inter = max(0.0, min(a[2], b[2]) - max(a[0], b[0])) * max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    if inter <= 0:
+        return 0.0
+    smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+    return inter / smaller if smaller > 0 else 0.0
+
+
+def suppress_duplicates(detections, threshold=0.6):
+    """Keep the most confident of same-class boxes found in several overlapping tiles"""
+    kept = []
+    for detection in sorted(detections, key=lambda d: d['confidence'], reverse=True):
+        if all(other['class_id'] != detection['class_id']
+               or box_overlap(other['box'], detection['box']) < threshold for other in kept):
+            kept.append(detection)
+    return kept
+
+
+class RegionOfInterest:
+    """
+    The part of a camera's view worth running detection on.
+    Points are normalized (0-1) so one ROI fits both streams of a
+    dual-stream camera: two points are a rectangle, three or more a polygon.
+    The detector only gets the bounding box of the region, with pixels
+    outside a polygon greyed out, split into overlapping tiles when it is
+    larger than tile_size. merge() maps boxes back to full-frame coordinates.
+    """
+
+    def __init__(self, points, tile_size=None, overlap=0.2, mask=True):
+        if len(points) < 2:
+            raise ValueError("An ROI needs at least two points")
+        self.points = [(min(max(float(x), 0.0), 1.0), min(max(float(y), 0.0), 1.0))
+                       for x, y in points]
+        if tile_size is not None and (int(tile_size) != tile_size or tile_size < MIN_TILE_SIZE):
+            raise ValueError(f"Tile size must be at least {MIN_TILE_SIZE} pixels")
+        self.tile_size = int(tile_size) if tile_size is not None else None
+        self.overlap = min(max(float(overlap), 0.0), 0.9)
+        self.mask = mask
+        # Per frame shape, dual-stream cameras crop display and main stream frames
+        self.geometries = {}
+
+    @classmethod
+    def from_config(cls, camera_config):
+        """ROI from a camera_config.json entry, None if the camera has none"""
+        roi_config = camera_config.get('roi')
+        if not roi_config or not roi_config.get('points'):
+            return None
+        return cls(roi_config['points'],
+                   tile_size=roi_config.get('tile_size'),
+                   overlap=roi_config.get('overlap', 0.2),
+                   mask=roi_config.get('mask', True))
+
+    def to_config(self):
+        return {
+            'points': [[round(x, 4), round(y, 4)] for x, y in self.points],
+            'tile_size': self.tile_size,
+            'overlap': self.overlap,
+            'mask': self.mask
+        }
+
+    def polygon(self, width, height):
+        """Region in pixels, rectangles expanded to their four corners"""
+        points = self.points
+        if len(points) == 2:
+            (x1, y1), (x2, y2) = points
+            points = [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
+        return np.array([(x * width, y * height) for x, y in points], dtype=np.float32)
+
+    def get_geometry(self, shape):
+        """Crop box, mask and tiles for a frame shape, computed once per shape"""
+        geometry = self.geometries.get(shape)
+        if geometry is None:
+            h, w = shape[:2]
+            polygon = self.polygon(w, h)
+            x1, y1 = [int(v) for v in np.floor(polygon.min(axis=0))]
+            x2, y2 = [int(v) for v in np.ceil(polygon.max(axis=0))]
+            x1, y1, x2, y2 = max(0, x1), max(0, y1), min(w, x2), min(h, y2)
+            if x2 - x1 < 2 or y2 - y1 < 2:
+                x1, y1, x2, y2 = 0, 0, w, h
+            outside = None
+            # A rectangle is its own bounding box, there is nothing to mask
+            if self.mask and len(self.points) > 2:
+                inside = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+                cv2.fillPoly(inside, [np.round(polygon - (x1, y1)).astype(np.int32)], 255)
+                outside = inside == 0
+            tiles = [(tx, ty, min(self.tile_size or w, x2 - x1), min(self.tile_size or h, y2 - y1))
+                     for ty in tile_starts(y2 - y1, self.tile_size, self.overlap)
+                     for tx in tile_starts(x2 - x1, self.tile_size, self.overlap)]
+            geometry = ((x1, y1, x2, y2), outside, tiles)
+            self.geometries[shape] = geometry
+        return geometry
+
+    def tile_count(self, shape):
+        return len(self.get_geometry(shape)[2])
+
+    def crop(self, frame):
+        """Bounding box of the region as a view, unmasked, e.g. for motion detection"""
+        (x1, y1, x2, y2), _, _ = self.get_geometry(frame.shape)
+        return frame[y1:y2, x1:x2]
+
+    def split(self, frame):
+        """Images to run detection on, as (image, (x_offset, y_offset)) in frame pixels"""
+        (x1, y1, x2, y2), outside, tiles = self.get_geometry(frame.shape)
+        crop = frame[y1:y2, x1:x2]
+        if outside is not None:
+            # Frames can be shared between subscribers, never mask in place
+            crop = crop.copy()
+            crop[outside] = MASK_VALUE
+        return [(crop[ty:ty + th, tx:tx + tw], (x1 + tx, y1 + ty)) for tx, ty, tw, th in tiles]
+
+    def merge(self, results, offsets):
+        """Detections of every tile in full-frame coordinates, duplicates across tiles removed"""
+        detections = []
+        for tile_detections, (dx, dy) in zip(results, offsets):
+            for detection in tile_detections:
+                x1, y1, x2, y2 = detection['box']
+                detections.append(dict(detection, box=[x1 + dx, y1 + dy, x2 + dx, y2 + dy]))
+        if len(offsets) > 1:
+            detections = suppress_duplicates(detections)
+        return detections
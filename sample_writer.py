@@ -0,0 +1,104 @@
+import os
+import queue
+import threading
+
+import cv2
+
+DEFAULT_POLICY = {'format': 'jpg', 'quality': 100}
+
+
+def encoding_for(policy):
+    """
+    File extension and cv2.imwrite parameters for an encoding policy, e.g.
+    {'format': 'jpg', 'quality': 95}, {'format': 'webp', 'quality': 90} or
+    {'format': 'png', 'compression': 3}
+    """
+    policy = policy or DEFAULT_POLICY
+    image_format = policy.get('format', 'jpg').lower()
+    if image_format in ('jpg', 'jpeg'):
+        return '.jpg', [cv2.IMWRITE_JPEG_QUALITY, int(policy.get('quality', 95))]
+    if image_format == 'webp':
+        return '.webp', [cv2.IMWRITE_WEBP_QUALITY, int(policy.get('quality', 90))]
+    if image_format == 'png':
+        return '.png', [cv2.IMWRITE_PNG_COMPRESSION, int(policy.get('compression', 3))]
+    raise ValueError(f"Unsupported sample format: {image_format}")
+
+
+def write_sample(image_path, image, params, annotation_path=None, annotation=None):
+    """Encode and write an image atomically, then its annotation"""
+    ok, encoded = cv2.imencode(os.path.splitext(image_path)[1], image, params)
+    if not ok:
+        raise IOError(f"Failed to encode {image_path}")
+    tmp_path = image_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(encoded.tobytes())
+    os.replace(tmp_path, image_path)
+    if annotation_path is not None:
+        with open(annotation_path, 'w') as f:
+            f.write(annotation)
+
+
+class SampleWriterPool:
+    """
+    Background threads that encode and write training samples.
+    submit() never blocks: when the queue is full the sample is dropped and
+    counted, so capture and detection threads don't wait on the disk.
+    """
+
+    def __init__(self, workers=2, max_queue=256):
+        self.tasks = queue.Queue(maxsize=max_queue)
+        self.written_count = 0
+        self.dropped_count = 0
+        self.error_count = 0
+        self.lock = threading.Lock()
+        self.workers = []
+        for _ in range(max(1, workers)):
+            worker = threading.Thread(target=self.worker_loop, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, image_path, image, params, annotation_path=None, annotation=None):
+        try:
+            self.tasks.put_nowait((image_path, image, params, annotation_path, annotation))
+            return True
+        except queue.Full:
+            with self.lock:
+                self.dropped_count += 1
+            return False
+
+    def worker_loop(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                self.tasks.task_done()
+                break
+            try:
+                write_sample(*task)
+                with self.lock:
+                    self.written_count += 1
+            except (IOError, OSError, cv2.error) as e:
+                with self.lock:
+                    self.error_count += 1
+                print(f"Failed to save training sample: {str(e)}")
+            finally:
+                self.tasks.task_done()
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'queued': self.tasks.qsize(),
+                'written': self.written_count,
+                'dropped': self.dropped_count,
+                'errors': self.error_count
+            }
+
+    def flush(self):
+        """Block until every sample submitted so far is on disk"""
+        self.tasks.join()
+
+    def close(self):
+        """Write everything still queued, then stop the workers"""
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            worker.join()
@@ -0,0 +1,121 @@
+import time
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+MAGIC = 0x46524d52494e4731
+PREAMBLE = 8
+SLOT_FIELDS = 6
+# Slot header fields
+SEQ, HEIGHT, WIDTH, CHANNELS, TIMESTAMP = range(5)
+
+
+class FrameRing:
+    """
+    Single-writer ring of BGR frames in a named shared memory block.
+    Every slot is guarded by its sequence number: the writer clears it
+    while copying a frame in, and a reader that sees it change during its
+    copy retries, so readers never hand out a torn frame and never block
+    the writer. Readers only ever want the newest frame.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.preamble = np.ndarray((PREAMBLE,), dtype=np.int64, buffer=shm.buf)
+        self.slots = int(self.preamble[1])
+        self.slot_bytes = int(self.preamble[2])
+        header_offset = PREAMBLE * 8
+        self.headers = np.ndarray((self.slots, SLOT_FIELDS), dtype=np.int64,
+                                  buffer=shm.buf, offset=header_offset)
+        data_offset = header_offset + self.slots * SLOT_FIELDS * 8
+        self.data = np.ndarray((self.slots, self.slot_bytes), dtype=np.uint8,
+                               buffer=shm.buf, offset=data_offset)
+
+    @classmethod
+    def create(cls, name, max_width=1920, max_height=1080, slots=3):
+        slot_bytes = max_width * max_height * 3
+        size = PREAMBLE * 8 + slots * SLOT_FIELDS * 8 + slots * slot_bytes
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a server that was killed, take it over
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        preamble = np.ndarray((PREAMBLE,), dtype=np.int64, buffer=shm.buf)
+        preamble[:] = 0
+        preamble[0], preamble[1], preamble[2] = MAGIC, slots, slot_bytes
+        ring = cls(shm, owner=True)
+        ring.headers[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        shm = shared_memory.SharedMemory(name=name)
+        # Only the creating server may unlink the block; stop the resource
+        # tracker from removing it when this process exits
+        try:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except (AttributeError, KeyError):
+            pass
+        if int(np.ndarray((1,), dtype=np.int64, buffer=shm.buf)[0]) != MAGIC:
+            shm.close()
+            raise ValueError(f"{name} is not a frame ring")
+        return cls(shm, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def latest_sequence(self):
+        return int(self.preamble[3])
+
+    def write(self, frame):
+        """Copy a frame into the next slot and publish it, returns its sequence"""
+        if frame.ndim == 2:
+            frame = frame[:, :, None]
+        h, w, c = frame.shape
+        size = h * w * c
+        if size > self.slot_bytes:
+            raise ValueError(f"Frame {w}x{h} does not fit a {self.slot_bytes} byte slot")
+        sequence = self.latest_sequence() + 1
+        slot = sequence % self.slots
+        header = self.headers[slot]
+        header[SEQ] = -1
+        self.data[slot, :size] = frame.reshape(-1)
+        header[HEIGHT], header[WIDTH], header[CHANNELS] = h, w, c
+        header[TIMESTAMP] = time.time_ns()
+        header[SEQ] = sequence
+        self.preamble[3] = sequence
+        return sequence
+
+    def read_latest(self, after_sequence=0, retries=3):
+        """
+        Copy of the newest frame if it is newer than after_sequence.
+        Returns (sequence, timestamp, frame) or None.
+        """
+        for _ in range(retries):
+            sequence = self.latest_sequence()
+            if sequence <= after_sequence:
+                return None
+            header = self.headers[sequence % self.slots]
+            if header[SEQ] != sequence:
+                continue
+            h, w, c = int(header[HEIGHT]), int(header[WIDTH]), int(header[CHANNELS])
+            timestamp = int(header[TIMESTAMP]) / 1e9
+            frame = self.data[sequence % self.slots, :h * w * c].reshape(h, w, c).copy()
+            if header[SEQ] == sequence:
+                return sequence, timestamp, frame
+        return None
+
+    def close(self):
+        # Drop the numpy views first, SharedMemory refuses to close with exports
+        self.preamble = self.headers = self.data = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,121 @@
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import statistics
+import subprocess
+from datetime import datetime
+
+RESULT_MARKER = "STARTUP_RESULT "
+
+
+def measure_startup(config_path='config.json', models=True):
+    """
+    Runs in a fresh interpreter. Times what app.py does before the window
+    appears, then the work the background warm-up does afterwards.
+    """
+    timings = {}
+
+    def step(name, action):
+        start = time.perf_counter()
+        result = action()
+        timings[name] = (time.perf_counter() - start) * 1000.0
+        return result
+
+    step('import_qt', lambda: importlib.import_module('PyQt5.QtWidgets'))
+    step('import_cv2', lambda: importlib.import_module('cv2'))
+    ui_main = step('import_ui_main', lambda: importlib.import_module('ui_main'))
+    from PyQt5.QtWidgets import QApplication
+    app = step('create_app', lambda: QApplication(['startup_benchmark']))
+    window = step('create_main_ui', ui_main.MainUI)
+
+    def show():
+        window.show()
+        app.processEvents()
+    step('show_window', show)
+    window_shown = time.time()
+
+    if models:
+        import numpy as np
+        from config import ConfigManager
+        config = ConfigManager(config_path).config
+        step('import_ultralytics', lambda: importlib.import_module('ultralytics'))
+        detection = importlib.import_module('detection')
+        detector = step('load_model', lambda: detection.DetectionThread.from_config(config))
+        imgsz = config.get('detector', {}).get('imgsz', 640)
+        frame = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+        step('first_inference', lambda: detector.detect_batch([frame]))
+        step('second_inference', lambda: detector.detect_batch([frame]))
+
+        ocr = step('import_ocr', lambda: importlib.import_module('ocr'))
+        processor = step('create_ocr', lambda: ocr.OCRProcessor.from_config(config))
+        step('first_ocr', processor.warmup)
+        step('second_ocr', processor.warmup)
+        processor.close()
+
+    window.close()
+    return {'timings_ms': timings, 'window_shown': window_shown}
+
+
+def run_child(config_path, models):
+    """One cold start in a new process, returns its timings plus the wall time to the window"""
+    command = [sys.executable, os.path.abspath(__file__), '--child', '--config', config_path]
+    if not models:
+        command.append('--no-models')
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    launched = time.time()
+    output = subprocess.run(command, capture_output=True, text=True, env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    for line in reversed(output.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            result = json.loads(line[len(RESULT_MARKER):])
+            break
+    else:
+        raise RuntimeError(f"Startup run failed:\n{output.stderr[-2000:]}")
+    result['timings_ms']['cold_start_to_window'] = (result.pop('window_shown') - launched) * 1000.0
+    return result['timings_ms']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start, import and first-inference latency")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--no-models', action='store_true',
+                        help="Only measure the time until the window is shown")
+    parser.add_argument('--budget-ms', type=float, default=1000.0,
+                        help="Fail if the median cold start to window exceeds this")
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = measure_startup(args.config, models=not args.no_models)
+        print(RESULT_MARKER + json.dumps(result))
+        return 0
+
+    runs = [run_child(args.config, not args.no_models) for _ in range(args.runs)]
+    summary = {}
+    for name in runs[0]:
+        values = [run[name] for run in runs if name in run]
+        summary[name] = {'median_ms': statistics.median(values), 'max_ms': max(values)}
+        print(f"{name:<24}{summary[name]['median_ms']:10.1f} ms  (max {summary[name]['max_ms']:.1f})")
+
+    output = args.output or os.path.join(
+        "output", "bench", f"startup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'timestamp': datetime.now().isoformat(timespec='seconds'),
+                   'runs': runs, 'summary': summary}, f, indent=4)
+    print(f"Results written to {output}")
+
+    cold_start = summary['cold_start_to_window']['median_ms']
+    if cold_start > args.budget_ms:
+        print(f"Cold start {cold_start:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+import random
+import threading
+import time
+
+import cv2
+from frame_buffer import LatestFrameBuffer
+from metrics import METRICS
+
+
+class SharedSource(threading.Thread):
+    """
+    One decoder for one URL, fanning every frame out to all subscribers.
+    A failed open or read doesn't end the source: it reconnects with
+    jittered exponential backoff and subscribers stay attached, they just
+    see no frames until the stream is back. Frames are shared between
+    subscribers and must be treated as read-only.
+    """
+
+    def __init__(self, url, backoff_initial=1.0, backoff_max=30.0):
+        super().__init__(daemon=True)
+        self.url = url
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.lock = threading.Lock()
+        self.buffers = {}
+        self.running = True
+        self.wakeup = threading.Event()
+        self.status = 'connecting'
+        self.last_error = None
+        self.frame_count = 0
+        self.reconnect_count = 0
+
+    def add(self, key, buffer):
+        with self.lock:
+            self.buffers[key] = buffer
+
+    def remove(self, key):
+        """Returns the number of subscribers left"""
+        with self.lock:
+            self.buffers.pop(key, None)
+            return len(self.buffers)
+
+    def run(self):
+        attempt = 0
+        while self.running:
+            cap = cv2.VideoCapture(self.url)
+            try:
+                if cap.isOpened():
+                    # Keep the backend queue short so subscribers see live frames
+                    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+                    if self.read_frames(cap):
+                        attempt = 0
+                else:
+                    self.last_error = "Failed to open camera stream"
+            except Exception as e:
+                self.last_error = f"Stream error: {str(e)}"
+            finally:
+                cap.release()
+            if not self.running:
+                break
+            self.status = 'reconnecting'
+            self.reconnect_count += 1
+            # Full jitter so cameras behind one failed switch don't retry in lockstep
+            delay = min(self.backoff_max, self.backoff_initial * (2 ** attempt))
+            attempt += 1
+            self.wakeup.wait(random.uniform(delay / 2, delay))
+        with self.lock:
+            buffers = list(self.buffers.values())
+        for buffer in buffers:
+            buffer.close()
+
+    def read_frames(self, cap):
+        """Read until the stream fails, returns True if any frame arrived"""
+        received = False
+        while self.running:
+            start = METRICS.start()
+            ret, frame = cap.read()
+            METRICS.observe_since('capture', start)
+            if not ret:
+                self.last_error = "Failed to read frame"
+                break
+            if not received:
+                received = True
+                self.status = 'live'
+                self.last_error = None
+            self.frame_count += 1
+            with self.lock:
+                buffers = list(self.buffers.values())
+            for buffer in buffers:
+                buffer.put(frame)
+        return received
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+
+    def get_stats(self):
+        with self.lock:
+            subscribers = len(self.buffers)
+        return {
+            'status': self.status,
+            'subscribers': subscribers,
+            'frames': self.frame_count,
+            'reconnects': self.reconnect_count,
+            'last_error': self.last_error
+        }
+
+
+class Subscription:
+    """A subscriber's view of a shared source"""
+
+    def __init__(self, manager, source, buffer):
+        self.manager = manager
+        self.source = source
+        self.buffer = buffer
+        self.closed = False
+
+    def get_latest(self, after_sequence=0, timeout=1.0):
+        return self.buffer.get_latest(after_sequence, timeout)
+
+    def status(self):
+        return self.source.status
+
+    def last_error(self):
+        return self.source.last_error
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.manager.release(self)
+
+
+class StreamManager:
+    """
+    Opens every distinct source URL once, however many cameras use it.
+    The decoder starts with the first subscriber and stops with the last.
+    """
+
+    def __init__(self, backoff_initial=1.0, backoff_max=30.0):
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.lock = threading.Lock()
+        self.sources = {}
+
+    def subscribe(self, url, capacity=2, max_age=0.5):
+        buffer = LatestFrameBuffer(capacity, max_age)
+        with self.lock:
+            source = self.sources.get(url)
+            if source is None or not source.running:
+                source = SharedSource(url, self.backoff_initial, self.backoff_max)
+                self.sources[url] = source
+                source.add(id(buffer), buffer)
+                source.start()
+            else:
+                source.add(id(buffer), buffer)
+        return Subscription(self, source, buffer)
+
+    def release(self, subscription):
+        source = subscription.source
+        subscription.buffer.close()
+        with self.lock:
+            if source.remove(id(subscription.buffer)) == 0:
+                source.stop()
+                if self.sources.get(source.url) is source:
+                    del self.sources[source.url]
+
+    def get_stats(self):
+        with self.lock:
+            sources = list(self.sources.values())
+        return {source.url: source.get_stats() for source in sources}
+
+    def collect_metrics(self):
+        gauges = []
+        for index, stats in enumerate(self.get_stats().values()):
+            # Index rather than URL, URLs carry camera credentials
+            labels = {'source': str(index)}
+            gauges.append(('source_subscribers', labels, stats['subscribers']))
+            gauges.append(('source_live', labels, int(stats['status'] == 'live')))
+            gauges.append(('source_reconnects', labels, stats['reconnects']))
+        return gauges
+
+
+STREAM_MANAGER = StreamManager()
+METRICS.register_collector('streams', STREAM_MANAGER.collect_metrics)
+
+
+class OnDemandStream:
+    """
+    Secondary stream that is only decoded while someone keeps asking for it.
+    Used for the full-resolution recognition stream of dual-stream cameras:
+    request() subscribes to the shared source, which opens in the
+    background so the caller never waits on RTSP negotiation, and
+    close_if_idle() lets go once no request came in for idle_timeout
+    seconds. A freshly opened RTSP session starts at a keyframe, so the
+    first frame is usable right away.
+    """
+
+    def __init__(self, url, camera_name="", idle_timeout=5.0, manager=None):
+        self.url = url
+        self.camera_name = camera_name
+        self.idle_timeout = idle_timeout
+        self.manager = manager or STREAM_MANAGER
+        self.lock = threading.Lock()
+        self.subscription = None
+        self.last_sequence = 0
+        self.last_request = 0.0
+        self.opened_at = None
+        self.open_count = 0
+        self.open_seconds = 0.0
+
+    def request(self):
+        with self.lock:
+            self.last_request = time.monotonic()
+            if self.subscription is not None:
+                return
+            self.subscription = self.manager.subscribe(self.url)
+            self.last_sequence = 0
+            self.opened_at = time.monotonic()
+            self.open_count += 1
+
+    def next_frame(self):
+        """Newest frame not handed out yet, or None without waiting"""
+        with self.lock:
+            subscription = self.subscription
+        if subscription is None:
+            return None
+        item = subscription.get_latest(self.last_sequence, timeout=0)
+        if item is None:
+            return None
+        self.last_sequence, frame = item
+        return frame
+
+    def is_open(self):
+        with self.lock:
+            return self.subscription is not None
+
+    def close_if_idle(self):
+        with self.lock:
+            idle = time.monotonic() - self.last_request >= self.idle_timeout
+            if self.subscription is None or not idle:
+                return
+        self.close()
+
+    def close(self):
+        with self.lock:
+            subscription, self.subscription = self.subscription, None
+            if self.opened_at is not None:
+                self.open_seconds += time.monotonic() - self.opened_at
+                self.opened_at = None
+        if subscription is not None:
+            subscription.close()
+
+    def get_stats(self):
+        with self.lock:
+            open_seconds = self.open_seconds
+            if self.opened_at is not None:
+                open_seconds += time.monotonic() - self.opened_at
+            return {
+                'open': self.subscription is not None,
+                'opens': self.open_count,
+                'open_seconds': open_seconds
+            }
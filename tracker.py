@@ -0,0 +1,205 @@
+import re
+import heapq
+import itertools
+import threading
+import time
+from collections import defaultdict
+
+import cv2
+
+
+def box_iou(a, b):
+    x1 = max(a[0], b[0])
+    y1 = max(a[1], b[1])
+    x2 = min(a[2], b[2])
+    y2 = min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    if inter <= 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+def box_center(box):
+    return (box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0
+
+
+def crop_box(frame, box):
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = [int(round(v)) for v in box]
+    x1, y1 = max(0, x1), max(0, y1)
+    x2, y2 = min(w, x2), min(h, y2)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return frame[y1:y2, x1:x2].copy()
+
+
+def sharpness(image):
+    """Variance of the Laplacian, higher means a sharper crop"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    return cv2.Laplacian(gray, cv2.CV_64F).var()
+
+
+def clean_reading(text):
+    return re.sub(r'[^A-Z0-9]', '', text.upper())
+
+
+def vote_readings(readings):
+    """
+    Combine several OCR readings of the same code character by character.
+    Args:
+        readings: list of (text, weight) tuples
+    Returns:
+        (text, agreement) where agreement is the weakest per-character vote share
+    """
+    cleaned = [(clean_reading(text), weight) for text, weight in readings]
+    cleaned = [(text, weight) for text, weight in cleaned if text]
+    if not cleaned:
+        return '', 0.0
+
+    # Readings with a dropped or extra character can't be aligned, so vote
+    # only among readings of the most supported length
+    length_votes = defaultdict(float)
+    for text, weight in cleaned:
+        length_votes[len(text)] += weight
+    length = max(length_votes, key=length_votes.get)
+    candidates = [(text, weight) for text, weight in cleaned if len(text) == length]
+
+    chars = []
+    agreement = 1.0
+    for i in range(length):
+        votes = defaultdict(float)
+        for text, weight in candidates:
+            votes[text[i]] += weight
+        char = max(votes, key=votes.get)
+        total = sum(votes.values())
+        chars.append(char)
+        if total > 0:
+            agreement = min(agreement, votes[char] / total)
+    return ''.join(chars), agreement
+
+
+class Track:
+    def __init__(self, track_id, detection, now):
+        self.track_id = track_id
+        self.class_id = detection['class_id']
+        self.label = detection['label']
+        self.box = detection['box']
+        self.confidence = detection['confidence']
+        self.first_seen = now
+        self.last_seen = now
+        self.hits = 1
+        # Min-heap of (score, counter, crop, confidence) holding the sharpest crops
+        self.crops = []
+
+    def update(self, detection, now):
+        self.box = detection['box']
+        self.confidence = max(self.confidence, detection['confidence'])
+        self.last_seen = now
+        self.hits += 1
+
+    def add_crop(self, crop, confidence, max_crops, counter):
+        entry = (sharpness(crop), counter, crop, confidence)
+        if len(self.crops) < max_crops:
+            heapq.heappush(self.crops, entry)
+        elif entry[0] > self.crops[0][0]:
+            heapq.heapreplace(self.crops, entry)
+
+    def best_crops(self):
+        """Crops sorted sharpest first as (crop, confidence)"""
+        ordered = sorted(self.crops, key=lambda e: (e[0], e[1]), reverse=True)
+        return [(crop, confidence) for _, _, crop, confidence in ordered]
+
+
+class ContainerTracker:
+    """
+    Lightweight IoU/centroid tracker linking detections of the same
+    container code across frames. Keeps the sharpest few crops per track so
+    OCR can run once per container instead of once per frame.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_center_distance=0.1, max_age=2.0,
+                 max_crops=3, min_hits=2):
+        self.iou_threshold = iou_threshold
+        # Fallback match by center distance, as a fraction of the frame diagonal
+        self.max_center_distance = max_center_distance
+        self.max_age = max_age
+        self.max_crops = max_crops
+        self.min_hits = min_hits
+        self.tracks = {}
+        self.next_id = itertools.count(1)
+        self.crop_counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def update(self, detections, frame, now=None):
+        """
+        Match detections to tracks and store their crops.
+        Returns tracks that ended and are ready to be read.
+        """
+        if now is None:
+            now = time.monotonic()
+        h, w = frame.shape[:2]
+        diagonal = (w * w + h * h) ** 0.5
+
+        with self.lock:
+            unmatched = set(self.tracks)
+            for detection in sorted(detections, key=lambda d: -d['confidence']):
+                track = self.match(detection, unmatched, diagonal)
+                if track is None:
+                    track = Track(next(self.next_id), detection, now)
+                    self.tracks[track.track_id] = track
+                else:
+                    unmatched.discard(track.track_id)
+                    track.update(detection, now)
+                crop = crop_box(frame, detection['box'])
+                if crop is not None:
+                    track.add_crop(crop, detection['confidence'], self.max_crops,
+                                   next(self.crop_counter))
+            return self.expire(now)
+
+    def match(self, detection, candidates, diagonal):
+        best_track = None
+        best_iou = self.iou_threshold
+        for track_id in candidates:
+            track = self.tracks[track_id]
+            if track.class_id != detection['class_id']:
+                continue
+            iou = box_iou(track.box, detection['box'])
+            if iou >= best_iou:
+                best_track, best_iou = track, iou
+        if best_track is not None:
+            return best_track
+
+        cx, cy = box_center(detection['box'])
+        best_distance = self.max_center_distance * diagonal
+        for track_id in candidates:
+            track = self.tracks[track_id]
+            if track.class_id != detection['class_id']:
+                continue
+            tx, ty = box_center(track.box)
+            distance = ((cx - tx) ** 2 + (cy - ty) ** 2) ** 0.5
+            if distance <= best_distance:
+                best_track, best_distance = track, distance
+        return best_track
+
+    def expire(self, now):
+        finished = []
+        for track_id in list(self.tracks):
+            track = self.tracks[track_id]
+            if now - track.last_seen > self.max_age:
+                del self.tracks[track_id]
+                if track.hits >= self.min_hits and track.crops:
+                    finished.append(track)
+        return finished
+
+    def flush(self):
+        """End all live tracks, e.g. when detection is switched off"""
+        with self.lock:
+            finished = [t for t in self.tracks.values() if t.hits >= self.min_hits and t.crops]
+            self.tracks.clear()
+            return finished
+
+    def active_count(self):
+        with self.lock:
+            return len(self.tracks)
@@ -1,13 +1,73 @@
 import os
+import sys
+import json
 import cv2
+import uuid
+import subprocess
+import threading
+import time
+from collections import deque
 from datetime import datetime
+from ocr_cache import dhash, hamming_distance
+from sample_writer import SampleWriterPool, encoding_for, write_sample
+
+DEFAULT_MODEL_PATH = "models/bestold.pt"
+
+
+def latest_model():
+    """Path of the newest model written by retrain_job.py, the default model if there is none"""
+    latest_path = os.path.join("models", "versions", "latest.json")
+    if os.path.exists(latest_path):
+        with open(latest_path, 'r') as f:
+            return json.load(f)['model_path']
+    return DEFAULT_MODEL_PATH
 
 class TrainingManager:
-    def __init__(self):
+    def __init__(self, async_write=False, workers=2, max_queue=256, encoding=None,
+                 dedup_distance=4, dedup_history=500, dedup_max_age=60.0):
+        """
+        Args:
+            async_write: encode and write samples on a background pool
+            encoding: per sample type policy, e.g. {'valid': {'format': 'webp', 'quality': 90}}
+            dedup_distance: skip samples whose 256-bit image hash is within this
+                many bits of a recent sample of the same class, None to disable
+            dedup_max_age: seconds a sample counts as recent; crops of different
+                containers can hash close, so only a burst of one container is deduplicated
+        """
         self.training_dir = os.path.join("output", "train")
         os.makedirs(self.training_dir, exist_ok=True)
         self.valid_samples_dir = os.path.join("output", "valid_samples")
         os.makedirs(self.valid_samples_dir, exist_ok=True)
+        self.encoding = encoding or {}
+        self.dedup_distance = dedup_distance
+        self.dedup_history = dedup_history
+        self.dedup_max_age = dedup_max_age
+        self.recent_hashes = {}
+        self.hash_lock = threading.Lock()
+        self.duplicate_count = 0
+        self.writer_pool = SampleWriterPool(workers, max_queue) if async_write else None
+
+    def is_near_duplicate(self, image, class_id):
+        if self.dedup_distance is None:
+            return False
+        image_hash = dhash(image, hash_size=16)
+        now = time.monotonic()
+        with self.hash_lock:
+            recent = self.recent_hashes.setdefault(class_id, deque(maxlen=self.dedup_history))
+            while recent and now - recent[0][1] > self.dedup_max_age:
+                recent.popleft()
+            for previous, _ in recent:
+                if hamming_distance(previous, image_hash) <= self.dedup_distance:
+                    self.duplicate_count += 1
+                    return True
+            recent.append((image_hash, now))
+        return False
+
+    def unique_name(self, prefix, confidence):
+        # Microseconds plus a random suffix, so samples from the same second
+        # (or from several processes) never overwrite each other
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return f"{prefix}_{timestamp}_{uuid.uuid4().hex[:8]}_{confidence:.2f}"
 
     def save_invalid_detection(self, roi, label, timestamp=None):
         if timestamp is None:
@@ -32,6 +92,20 @@ class TrainingManager:
             'timestamp': timestamp
         }
 
+    def save_invalid_sample(self, roi, label, class_id):
+        """Write a resized invalid detection to output/train for later labelling"""
+        sample = self.save_invalid_detection(roi, label)
+        if self.is_near_duplicate(sample['roi'], class_id):
+            return None
+        extension, params = encoding_for(self.encoding.get('invalid'))
+        image_path = os.path.join(self.training_dir, self.unique_name(label, 0) + extension)
+        if self.writer_pool is not None:
+            if not self.writer_pool.submit(image_path, sample['roi'], params):
+                return None
+        else:
+            write_sample(image_path, sample['roi'], params)
+        return image_path
+
     def save_training_sample(self, roi, coords, class_id, confidence):
         """
         Save valid detections for future training
@@ -41,13 +115,13 @@ class TrainingManager:
             class_id: 0 for cn-11, 1 for iso-type
             confidence: Detection confidence
         """
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         class_name = "cn-11" if class_id == 0 else "iso-type"
-        
-        # Save image
-        image_filename = f"{class_name}_{timestamp}_{confidence:.2f}.jpg"
+        if self.is_near_duplicate(roi, class_id):
+            return None
+
+        extension, params = encoding_for(self.encoding.get('valid'))
+        image_filename = self.unique_name(class_name, confidence) + extension
         image_path = os.path.join(self.valid_samples_dir, image_filename)
-        cv2.imwrite(image_path, roi, [cv2.IMWRITE_JPEG_QUALITY, 100])
         
         # Save annotation in YOLO format
         # YOLO format: <class> <x_center> <y_center> <width> <height>
@@ -62,19 +136,38 @@ class TrainingManager:
         anno_filename = image_filename.rsplit('.', 1)[0] + '.txt'
         anno_path = os.path.join(self.valid_samples_dir, anno_filename)
         
-        with open(anno_path, 'w') as f:
-            f.write(f"{class_id} {x_center} {y_center} {width} {height}")
+        annotation = f"{class_id} {x_center} {y_center} {width} {height}"
 
+        if self.writer_pool is not None:
+            if not self.writer_pool.submit(image_path, roi, params, anno_path, annotation):
+                return None
+        else:
+            write_sample(image_path, roi, params, anno_path, annotation)
         return image_path
 
-    def retrain_model(self):
+    def close(self):
+        if self.writer_pool is not None:
+            self.writer_pool.close()
+
+    def retrain_model(self, wait=True, epochs=20, window=None, nice=15, threads=2):
         """
-        Placeholder for model retraining logic.
-        Currently just returns the path to the existing model.
+        Retrain on the collected samples in a separate low-priority process.
+        Args:
+            wait: block until training finishes, otherwise return the Popen
+            window: off-peak window such as "01:00-05:00" to wait for
+        Returns the path of the newly trained model, None if the job failed
+        or skipped training because too few new samples arrived.
+        Queued samples are written first so the job's manifest scan sees them.
         """
-        # In a real implementation, this would:
-        # 1. Collect all training samples
-        # 2. Update dataset configuration
-        # 3. Run training for N epochs
-        # 4. Save and return path to new model
-        return "models/bestold.pt"  # Return existing model for now
+        if self.writer_pool is not None:
+            self.writer_pool.flush()
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'retrain_job.py')
+        cmd = [sys.executable, script, '--epochs', str(epochs),
+               '--nice', str(nice), '--threads', str(threads)]
+        if window:
+            cmd += ['--window', window]
+        process = subprocess.Popen(cmd)
+        if not wait:
+            return process
+        process.wait()
+        return latest_model() if process.returncode == 0 else None
@@ -1,18 +1,112 @@
 from PyQt5.QtWidgets import (
     QMainWindow, QVBoxLayout, QHBoxLayout, QTabWidget, QWidget, 
     QPushButton, QLabel, QSplitter, QTextEdit, QScrollArea, QFrame,
-    QLineEdit, QListWidget, QFileDialog,QListWidgetItem, QSizePolicy
+    QLineEdit, QListWidget, QFileDialog,QListWidgetItem, QSizePolicy,
+    QCheckBox, QTableWidget, QTableWidgetItem, QComboBox
 )
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QPixmap
-from video_stream import VideoStream
+from PyQt5.QtCore import Qt, pyqtSignal, QTimer, QPointF
+from PyQt5.QtGui import QPixmap, QPainter, QPen, QColor, QPolygonF
+from video_stream import VideoStream, ServerEventThread, display_image
+from roi import RegionOfInterest, MIN_TILE_SIZE
+from config import ConfigManager
+from inference_service import InferenceService
+from rate_scheduler import InferenceScheduler
+from detection_logger import DetectionLogger
+from training_manager import TrainingManager, latest_model
+from retrain_job import SKIPPED_EXIT_CODE, samples_since_last_training
+from metrics import METRICS, MetricsServer
+from camera_server import ServerClient, record_track_reading
+from concurrent.futures import ThreadPoolExecutor
 import json
+import os
+import hashlib
+import threading
+import time
+
+COMPONENTS = (('detector', "Detector"), ('ocr', "OCR"))
+
+class RoiEditor(QLabel):
+    """Camera snapshot where left clicks add ROI corners and right clicks remove the last one"""
+
+    def __init__(self):
+        super().__init__()
+        self.points = []
+        self.setMinimumSize(480, 270)
+        self.setAlignment(Qt.AlignCenter)
+        self.setStyleSheet("background-color: black;")
+
+    def set_frame(self, frame):
+        self.setPixmap(QPixmap.fromImage(display_image(frame, (self.width(), self.height()))))
+
+    def set_points(self, points):
+        self.points = [tuple(point) for point in points]
+        self.update()
+
+    def image_rect(self):
+        """Where the centered snapshot is drawn, (x, y, width, height)"""
+        pixmap = self.pixmap()
+        if pixmap is None or pixmap.isNull():
+            return 0, 0, self.width(), self.height()
+        return ((self.width() - pixmap.width()) / 2, (self.height() - pixmap.height()) / 2,
+                pixmap.width(), pixmap.height())
+
+    def mousePressEvent(self, event):
+        x, y, w, h = self.image_rect()
+        if event.button() == Qt.LeftButton:
+            self.points.append((min(max((event.x() - x) / w, 0.0), 1.0),
+                                min(max((event.y() - y) / h, 0.0), 1.0)))
+        elif event.button() == Qt.RightButton and self.points:
+            self.points.pop()
+        self.update()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.points:
+            return
+        x, y, w, h = self.image_rect()
+        points = self.points
+        if len(points) == 2:
+            (x1, y1), (x2, y2) = points
+            points = [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
+        painter = QPainter(self)
+        painter.setPen(QPen(QColor(0, 255, 0), 2))
+        polygon = QPolygonF([QPointF(x + px * w, y + py * h) for px, py in points])
+        painter.drawPolygon(polygon)
+        painter.end()
+
 
 class MainUI(QMainWindow):
+    model_status = pyqtSignal(str)
+    # component, state ('idle', 'loading', 'ready', 'failed' or 'server'), detail
+    component_status = pyqtSignal(str, str, str)
+
     def __init__(self):
         super().__init__()
         self.load_camera_config()
+        self.config_manager = ConfigManager('config.json')
         self.camera_info = {}
+        self.inference_service = None
+        self.ocr_processor = None
+        self.ocr_executor = None
+        self.component_state = {name: 'idle' for name, _ in COMPONENTS}
+        self.component_locks = {name: threading.Lock() for name, _ in COMPONENTS}
+        logging_config = dict(self.config_manager.config.get('logging', {}))
+        store = None
+        if logging_config.pop('store', False):
+            from detection_store import DetectionStore
+            store = DetectionStore()
+        self.detection_logger = DetectionLogger(store=store, **logging_config)
+        self.training_manager = TrainingManager(
+            **self.config_manager.config.get('training_samples', {}))
+        self.scheduler = InferenceScheduler.from_config(self.config_manager.config)
+        if self.scheduler is not None:
+            self.scheduler.start()
+        self.metrics_server = None
+        self.init_metrics()
+        self.server_client = None
+        self.server_cameras = {}
+        self.server_events = None
+        self.connect_server()
         
         # Create central widget
         self.central_widget = QWidget()
@@ -44,12 +138,23 @@ class MainUI(QMainWindow):
         self.batch_tab = self.create_batch_tab()
         self.tab_widget.addTab(self.batch_tab, "Batch OCR")
         
+        # Create stats tab
+        self.stats_tab = self.create_stats_tab()
+        self.tab_widget.addTab(self.stats_tab, "Stats")
+        
         main_layout.addLayout(header_layout)
         main_layout.addWidget(self.tab_widget)
         
         self.central_widget.setLayout(main_layout)
         self.setWindowTitle("Container Recognition System")
         self.resize(1200, 800)
+        
+        # Tile sizes and visibility change with resizes, scrolling and tab
+        # switches, polling keeps the stream threads up to date cheaply
+        self.display_timer = QTimer(self)
+        self.display_timer.timeout.connect(self.update_display_targets)
+        self.display_timer.start(250)
+        self.tab_widget.currentChanged.connect(lambda index: self.update_display_targets())
 
     def create_header(self):
         header_layout = QHBoxLayout()
@@ -68,8 +173,66 @@ class MainUI(QMainWindow):
         header_layout.addWidget(logo_label)
         header_layout.addWidget(title_label)
         header_layout.addStretch()
+        
+        # Readiness of the components loaded in the background
+        self.component_labels = {}
+        for name, title in COMPONENTS:
+            label = QLabel()
+            self.component_labels[name] = label
+            header_layout.addWidget(label)
+        self.component_status.connect(self.show_component_status)
+        for name, _ in COMPONENTS:
+            self.show_component_status(name, self.component_state[name], "")
         return header_layout
 
+    def show_component_status(self, name, state, detail):
+        self.component_state[name] = state
+        colors = {'ready': 'green', 'server': 'green', 'loading': 'orange', 'failed': 'red'}
+        label = self.component_labels[name]
+        label.setText(f"{dict(COMPONENTS)[name]}: {state}")
+        label.setStyleSheet(f"color: {colors.get(state, 'gray')};")
+        label.setToolTip(detail)
+        if state == 'failed':
+            self.detection_log.append(f"{dict(COMPONENTS)[name]} failed to load: {detail}")
+
+    def start_warmup(self):
+        """
+        Load and warm up the detector and OCR after the window is shown, so
+        startup never waits on torch, the model file or tesseract
+        """
+        if self.server_client is not None:
+            # Models live in the camera server
+            for name, _ in COMPONENTS:
+                self.component_status.emit(name, 'server', "")
+            return
+        if not self.config_manager.config.get('startup', {}).get('warmup', True):
+            return
+        for name, _ in COMPONENTS:
+            self.component_status.emit(name, 'loading', "")
+        threading.Thread(target=self.warmup_components, daemon=True).start()
+
+    def warmup_components(self):
+        steps = (
+            ('detector', lambda: self.get_inference_service().detector.warmup()),
+            ('ocr', lambda: self.get_ocr_processor().warmup())
+        )
+        for name, step in steps:
+            self.component_status.emit(name, 'loading', "")
+            start = time.monotonic()
+            try:
+                step()
+            except Exception as e:
+                self.component_status.emit(name, 'failed', str(e))
+                continue
+            self.component_status.emit(name, 'ready', f"{time.monotonic() - start:.1f}s")
+
+    def component_loading(self, name):
+        """True (and tells the operator) while a component is still warming up"""
+        if self.component_state[name] != 'loading':
+            return False
+        self.detection_log.append(f"{dict(COMPONENTS)[name]} is still loading, try again shortly")
+        return True
+
     def create_main_tab(self):
         main_tab = QWidget()
         layout = QVBoxLayout()
@@ -98,7 +261,7 @@ class MainUI(QMainWindow):
         
         # Setup cameras
         for camera in self.camera_config['cameras']:
-            self.create_camera_ui(camera['name'], camera['rtsp_url'])
+            self.create_camera_ui(camera['name'], camera['rtsp_url'], camera)
             
         return main_tab
 
@@ -135,13 +298,32 @@ class MainUI(QMainWindow):
         
         self.camera_list = QListWidget()
         
+        # Region of interest per camera
+        self.roi_camera_select = QComboBox()
+        self.roi_camera_select.addItems([camera['name'] for camera in self.camera_config['cameras']])
+        self.roi_camera_select.currentTextChanged.connect(self.load_roi)
+        self.roi_editor = RoiEditor()
+        self.roi_tile_input = QLineEdit()
+        self.roi_tile_input.setPlaceholderText(
+            f"Tile size in pixels (at least {MIN_TILE_SIZE}), empty for no tiling")
+        roi_buttons = QHBoxLayout()
+        for label, action in (("Grab Frame", self.grab_roi_frame),
+                              ("Clear", lambda: self.roi_editor.set_points([])),
+                              ("Save ROI", self.save_roi)):
+            button = QPushButton(label)
+            button.clicked.connect(action)
+            roi_buttons.addWidget(button)
+        self.load_roi(self.roi_camera_select.currentText())
+        
         # Tesseract settings
         self.psm_list = QListWidget()
+        selected_psm = self.config_manager.config.get('ocr', {}).get('psm_modes', [7, 6])
         for psm in ["0", "1", "3", "6", "7"]:
             item = QListWidgetItem(psm)
             item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
-            item.setCheckState(Qt.Unchecked)
+            item.setCheckState(Qt.Checked if int(psm) in selected_psm else Qt.Unchecked)
             self.psm_list.addItem(item)
+        self.psm_list.itemChanged.connect(self.update_psm_modes)
         
         layout.addWidget(QLabel("Add New Camera"))
         layout.addWidget(self.camera_name_input)
@@ -149,12 +331,187 @@ class MainUI(QMainWindow):
         layout.addWidget(self.add_camera_button)
         layout.addWidget(QLabel("Cameras"))
         layout.addWidget(self.camera_list)
+        layout.addWidget(QLabel("Region of Interest (left click adds a corner, right click "
+                                "removes one, two corners make a rectangle)"))
+        layout.addWidget(self.roi_camera_select)
+        layout.addWidget(self.roi_editor)
+        layout.addWidget(self.roi_tile_input)
+        layout.addLayout(roi_buttons)
         layout.addWidget(QLabel("Tesseract PSM Modes"))
         layout.addWidget(self.psm_list)
+        layout.addWidget(QLabel("Detection Model"))
+        layout.addLayout(self.create_model_controls())
         
         settings_tab.setLayout(layout)
         return settings_tab
 
+    def create_model_controls(self):
+        model_layout = QVBoxLayout()
+        self.model_path_input = QLineEdit(self.config_manager.config['yolo_model_path'])
+        buttons = QHBoxLayout()
+        swap_btn = QPushButton("Swap Model")
+        shadow_btn = QPushButton("Start Shadow")
+        promote_btn = QPushButton("Promote Shadow")
+        rollback_btn = QPushButton("Rollback")
+        self.retrain_btn = QPushButton("Retrain")
+        swap_btn.clicked.connect(self.swap_model)
+        shadow_btn.clicked.connect(self.start_shadow_model)
+        promote_btn.clicked.connect(self.promote_shadow_model)
+        rollback_btn.clicked.connect(self.rollback_model)
+        self.retrain_btn.clicked.connect(self.retrain_model)
+        for btn in (swap_btn, shadow_btn, promote_btn, rollback_btn, self.retrain_btn):
+            buttons.addWidget(btn)
+        self.model_status_label = QLabel(f"Active: {self.config_manager.config['yolo_model_path']}")
+        self.model_status.connect(self.model_status_label.setText)
+        model_layout.addWidget(self.model_path_input)
+        model_layout.addLayout(buttons)
+        model_layout.addWidget(self.model_status_label)
+        return model_layout
+
+    def connect_server(self):
+        """Attach to a running headless camera server when configured as a viewer"""
+        config = self.config_manager.config
+        if not config.get('server', {}).get('viewer', False):
+            return
+        try:
+            self.server_client = ServerClient.from_config(config)
+            cameras = self.server_client.request('cameras')['cameras']
+        except (OSError, EOFError, RuntimeError) as e:
+            print(f"Camera server unavailable, running cameras locally: {str(e)}")
+            self.server_client = None
+            return
+        self.server_cameras = {camera['name']: camera for camera in cameras}
+        self.server_events = ServerEventThread(self.server_client)
+        self.server_events.event_received.connect(self.handle_server_event)
+        self.server_events.start()
+
+    def handle_server_event(self, kind, camera_name, text):
+        if kind == 'extraction':
+            self.extraction_log.append(f"{camera_name}: {text}")
+        else:
+            self.detection_log.append(f"Camera {camera_name} {kind}: {text}")
+
+    def init_metrics(self):
+        """Turn on instrumentation and the Prometheus endpoint if configured"""
+        metrics_config = self.config_manager.config.get('metrics', {})
+        METRICS.enabled = metrics_config.get('enabled', False)
+        METRICS.register_collector('main_ui', self.collect_metrics)
+        if METRICS.enabled and metrics_config.get('port'):
+            try:
+                self.metrics_server = MetricsServer(
+                    metrics_config.get('host', '127.0.0.1'), metrics_config['port']).start()
+            except OSError as e:
+                print(f"Metrics endpoint unavailable: {str(e)}")
+
+    def collect_metrics(self):
+        """Per-camera and queue gauges, read on demand by the endpoint and stats panel"""
+        gauges = []
+        for name, info in list(self.camera_info.items()):
+            stream = info['stream']
+            if stream is None or stream.thread is None:
+                continue
+            stats = stream.thread.get_stream_stats()
+            labels = {'camera': name}
+            gauges.append(('camera_fps', labels, stats['fps']))
+            gauges.append(('camera_frames', labels, stats['frames']))
+            gauges.append(('camera_dropped_frames', labels, stats['dropped']))
+            gauges.append(('camera_buffered_frames', labels, stats['buffered']))
+            gauges.append(('camera_detection_fps', labels, stats['detection_fps']))
+            gauges.append(('camera_detection_rate', labels, stats['detection_rate']))
+            gauges.append(('camera_busy_skips', labels, stats['busy_skips']))
+            gauges.append(('camera_motion_skip_rate', labels, stats['motion_skip_rate']))
+        if self.inference_service is not None:
+            stats = self.inference_service.get_stats()
+            gauges.append(('queue_depth', {'queue': 'inference'}, stats['pending']))
+            gauges.append(('inference_avg_batch_size', {}, stats['avg_batch_size']))
+        if self.ocr_processor is not None and self.ocr_processor.pool is not None:
+            gauges.append(('queue_depth', {'queue': 'ocr'}, self.ocr_processor.pool.queue_depth()))
+        gauges.append(('queue_depth', {'queue': 'log'}, self.detection_logger.queue_depth()))
+        gauges.append(('log_dropped_rows', {}, self.detection_logger.dropped_rows))
+        gauges.append(('log_failed_rows', {}, self.detection_logger.failed_rows))
+        writer_pool = self.training_manager.writer_pool
+        if writer_pool is not None:
+            stats = writer_pool.get_stats()
+            gauges.append(('queue_depth', {'queue': 'samples'}, stats['queued']))
+            gauges.append(('samples_dropped', {}, stats['dropped']))
+        return gauges
+
+    def create_stats_tab(self):
+        stats_tab = QWidget()
+        layout = QVBoxLayout()
+
+        self.metrics_toggle = QCheckBox("Enable stage timing")
+        self.metrics_toggle.setChecked(METRICS.enabled)
+        self.metrics_toggle.toggled.connect(self.toggle_metrics)
+        endpoint = "off"
+        if self.metrics_server is not None:
+            host, port = self.metrics_server.server.server_address[:2]
+            endpoint = f"http://{host}:{port}/metrics"
+        controls = QHBoxLayout()
+        controls.addWidget(self.metrics_toggle)
+        controls.addWidget(QLabel(f"Metrics endpoint: {endpoint}"))
+        controls.addStretch()
+
+        self.camera_stats_table = QTableWidget(0, 8)
+        self.camera_stats_table.setHorizontalHeaderLabels(
+            ["Camera", "FPS", "Det. FPS", "Det. Rate", "Frames", "Dropped", "Busy Skips",
+             "Motion Skip %"])
+        self.stage_stats_table = QTableWidget(0, 6)
+        self.stage_stats_table.setHorizontalHeaderLabels(
+            ["Stage", "Camera", "Count", "Mean ms", "p95 ms", "Last ms"])
+        self.queue_stats_label = QLabel()
+
+        layout.addLayout(controls)
+        layout.addWidget(QLabel("Cameras"))
+        layout.addWidget(self.camera_stats_table)
+        layout.addWidget(QLabel("Stages"))
+        layout.addWidget(self.stage_stats_table)
+        layout.addWidget(self.queue_stats_label)
+        stats_tab.setLayout(layout)
+
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.refresh_stats)
+        self.stats_timer.start(1000)
+        return stats_tab
+
+    def toggle_metrics(self, enabled):
+        METRICS.enabled = enabled
+        if not enabled:
+            METRICS.reset()
+
+    def fill_table(self, table, rows):
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                table.setItem(row, column, QTableWidgetItem(str(value)))
+
+    def refresh_stats(self):
+        # Only pay for the refresh while someone is looking at it
+        if self.tab_widget.currentWidget() is not self.stats_tab:
+            return
+        snapshot = METRICS.snapshot()
+        cameras = {}
+        queues = []
+        for metric, labels, value in snapshot['gauges']:
+            if 'camera' in labels:
+                cameras.setdefault(labels['camera'], {})[metric] = value
+            elif metric == 'queue_depth':
+                queues.append(f"{labels['queue']}: {value}")
+        self.fill_table(self.camera_stats_table, [
+            (name, f"{stats['camera_fps']:.1f}", f"{stats['camera_detection_fps']:.1f}",
+             f"{stats['camera_detection_rate']:.1f}" if stats['camera_detection_rate'] else "-",
+             stats['camera_frames'],
+             stats['camera_dropped_frames'], stats['camera_busy_skips'],
+             f"{stats['camera_motion_skip_rate'] * 100:.0f}")
+            for name, stats in sorted(cameras.items())
+        ])
+        self.fill_table(self.stage_stats_table, [
+            (stage, camera or "-", stats['count'], f"{stats['mean_ms']:.1f}",
+             f"{stats['p95_ms']:.1f}", f"{stats['last_ms']:.1f}")
+            for (stage, camera), stats in sorted(snapshot['stages'].items())
+        ])
+        self.queue_stats_label.setText("Queue depths - " + (", ".join(queues) or "idle"))
+
     def create_batch_tab(self):
         batch_tab = QWidget()
         layout = QVBoxLayout()
@@ -178,7 +535,11 @@ class MainUI(QMainWindow):
         control_layout = QHBoxLayout()
         self.start_batch_btn = QPushButton("Start Processing")
         self.stop_batch_btn = QPushButton("Stop Processing")
+        self.stop_batch_btn.setEnabled(False)
         self.progress_label = QLabel("0/0 images processed")
+        self.start_batch_btn.clicked.connect(self.start_batch)
+        self.stop_batch_btn.clicked.connect(self.stop_batch)
+        self.batch_thread = None
         
         control_layout.addWidget(self.start_batch_btn)
         control_layout.addWidget(self.stop_batch_btn)
@@ -201,19 +562,139 @@ class MainUI(QMainWindow):
         folder = QFileDialog.getExistingDirectory(self, "Select Images Folder")
         if folder:
             self.folder_path_label.setText(folder)
-            # ... implement folder processing logic ...
+
+    def start_batch(self):
+        folder = self.folder_path_label.text()
+        if not os.path.isdir(folder) or self.batch_thread is not None:
+            return
+        from batch_processor import BatchThread
+        from batch_engine import BatchEngine
+        config = self.config_manager.config
+        engine = BatchEngine(
+            config['yolo_model_path'],
+            config['tesseract_path'],
+            psm_modes=config.get('ocr', {}).get('psm_modes', [7, 6]),
+            detector_config=config.get('detector'),
+            ocr_config=config.get('ocr')
+        )
+        # Never write into the archive being processed. The path hash keeps
+        # two folders with the same name from sharing a checkpoint
+        folder = os.path.abspath(folder)
+        name = os.path.basename(folder) or 'batch'
+        digest = hashlib.sha1(folder.encode('utf-8')).hexdigest()[:8]
+        output_path = os.path.join('output', 'batch', f'{name}_{digest}_results.jsonl')
+        self.batch_thread = BatchThread(engine, folder, output_path)
+        self.batch_thread.progress_update.connect(self.update_batch_progress)
+        self.batch_thread.result_ready.connect(self.show_batch_result)
+        self.batch_thread.finished_signal.connect(self.batch_finished)
+        self.batch_thread.error_signal.connect(self.batch_results.append)
+        self.batch_thread.finished.connect(self.reset_batch_controls)
+        self.start_batch_btn.setEnabled(False)
+        self.stop_batch_btn.setEnabled(True)
+        self.batch_results.append(f"Processing {folder}, results in {output_path}")
+        self.batch_thread.start()
+
+    def stop_batch(self):
+        if self.batch_thread is not None:
+            self.batch_thread.stop()
+            self.stop_batch_btn.setEnabled(False)
+
+    def update_batch_progress(self, stats):
+        total = stats['total'] if stats['total'] is not None else '?'
+        done = stats['processed'] + stats['skipped']
+        self.progress_label.setText(
+            f"{done}/{total} images processed ({stats['images_per_second']:.1f} img/s)")
+
+    def show_batch_result(self, result):
+        if result['error']:
+            self.batch_results.append(f"{result['path']}: {result['error']}")
+            return
+        for detection in result['detections']:
+            if detection['text']:
+                status = "valid" if detection['valid'] else "invalid"
+                self.batch_results.append(
+                    f"{os.path.basename(result['path'])}: {detection['label']} "
+                    f"{detection['text']} ({status})")
+
+    def batch_finished(self, stats):
+        self.batch_results.append(
+            f"Finished: {stats['processed']} processed, {stats['skipped']} skipped, "
+            f"{stats['errors']} errors in {stats['elapsed']:.1f}s")
+
+    def reset_batch_controls(self):
+        self.batch_thread = None
+        self.start_batch_btn.setEnabled(True)
+        self.stop_batch_btn.setEnabled(False)
+
+    def save_camera_config(self):
+        with open('camera_config.json', 'w') as f:
+            json.dump(self.camera_config, f, indent=4)
 
     def add_camera(self):
         name = self.camera_name_input.text()
         rtsp_url = self.rtsp_url_input.text()
         if name and rtsp_url:
+            camera = {'name': name, 'rtsp_url': rtsp_url, 'capture_mode': 'latest'}
+            self.camera_config['cameras'].append(camera)
             self.camera_list.addItem(f"{name} ({rtsp_url})")
-            self.create_camera_ui(name, rtsp_url)
-            self.save_config()
+            self.create_camera_ui(name, rtsp_url, camera)
+            self.roi_camera_select.addItem(name)
+            self.save_camera_config()
             self.camera_name_input.clear()
             self.rtsp_url_input.clear()
 
-    def create_camera_ui(self, name, rtsp_url):
+    def load_roi(self, name):
+        info = self.camera_info.get(name)
+        roi_config = (info['config'].get('roi') or {}) if info else {}
+        self.roi_editor.set_points(roi_config.get('points', []))
+        tile_size = roi_config.get('tile_size')
+        self.roi_tile_input.setText(str(tile_size) if tile_size else "")
+        self.grab_roi_frame()
+
+    def grab_roi_frame(self):
+        """Show the selected camera's newest frame, it has to be streaming"""
+        info = self.camera_info.get(self.roi_camera_select.currentText())
+        frame = None
+        if info and info['stream'] is not None:
+            frame = info['stream'].thread.get_latest_frame()
+        if frame is None:
+            self.roi_editor.clear()
+            return
+        self.roi_editor.set_frame(frame)
+
+    def save_roi(self):
+        name = self.roi_camera_select.currentText()
+        info = self.camera_info.get(name)
+        if not info:
+            return
+        points = self.roi_editor.points
+        tile_text = self.roi_tile_input.text().strip()
+        # Keep settings the editor doesn't show
+        previous = info['config'].get('roi') or {}
+        try:
+            tile_size = int(tile_text) if tile_text else None
+            roi = None
+            if points:
+                roi = RegionOfInterest(points, tile_size=tile_size,
+                                       overlap=previous.get('overlap', 0.2),
+                                       mask=previous.get('mask', True))
+        except ValueError as e:
+            self.detection_log.append(f"Invalid ROI for {name}: {str(e)}")
+            return
+        if roi is None:
+            info['config'].pop('roi', None)
+        else:
+            info['config']['roi'] = roi.to_config()
+        self.save_camera_config()
+        stream = info['stream']
+        if stream is not None and not stream.remote:
+            stream.thread.set_roi(roi)
+            self.detection_log.append(f"ROI for {name} updated")
+        else:
+            self.detection_log.append(
+                f"ROI for {name} saved, applies the next time the camera or server starts")
+
+    def create_camera_ui(self, name, rtsp_url, camera_config=None):
         container = QFrame()
         container.setFrameStyle(QFrame.Panel | QFrame.Raised)
         container.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
@@ -255,6 +736,7 @@ class MainUI(QMainWindow):
         self.camera_info[name] = {
             'frame': video_label,
             'rtsp_url': rtsp_url,
+            'config': camera_config or {},
             'stream': None,
             'buttons': {
                 'start': start_btn,
@@ -277,15 +759,45 @@ class MainUI(QMainWindow):
         try:
             if info['stream'] is None:
                 # Start stream
-                stream = VideoStream(info['rtsp_url'], name)
+                server_camera = self.server_cameras.get(name)
+                if server_camera is not None:
+                    stream = VideoStream(info['rtsp_url'], name, server=self.server_client,
+                                         ring_name=server_camera['ring'],
+                                         display_fps=self.display_fps())
+                else:
+                    stream = VideoStream(
+                        info['rtsp_url'], name,
+                        capture_mode=info['config'].get('capture_mode', 'latest'),
+                        motion_config=info['config'].get('motion'),
+                        display_fps=self.display_fps(),
+                        display_url=info['config'].get('display_url'),
+                        recognition_idle=info['config'].get('recognition_idle', 5.0),
+                        roi=RegionOfInterest.from_config(info['config']))
                 info['stream'] = stream
+                self.update_display_target(name, self.tab_widget.currentWidget() is self.main_tab)
                 stream.thread.frame_update.connect(
                     lambda frame, cam_name: self.update_camera_frame(frame, cam_name))
                 stream.thread.error_signal.connect(
                     lambda cam_name, error: self.handle_camera_error(cam_name, error))
+                if not stream.remote:
+                    stream.thread.status_update.connect(
+                        lambda cam_name, status: self.detection_log.append(
+                            f"Camera {cam_name} stream {status}"))
                 info['buttons']['start'].setText("Stop Stream")
                 info['buttons']['detect'].setEnabled(True)
                 info['buttons']['extract'].setEnabled(True)
+                if server_camera is not None:
+                    # The server logs readings and reports them as events
+                    state = self.server_client.request('cameras')['cameras']
+                    state = next(camera for camera in state if camera['name'] == name)
+                    info['buttons']['detect'].setText(
+                        "Stop Detection" if state['detection'] else "Start Detection")
+                    info['buttons']['extract'].setText(
+                        "Stop Extraction" if state['extraction'] else "Start Extraction")
+                else:
+                    stream.thread.extraction_update.connect(
+                        lambda text, cam_name: self.extraction_log.append(f"{cam_name}: {text}"))
+                    stream.thread.track_reading.connect(self.handle_track_reading)
             else:
                 # Stop stream
                 if info['stream'].thread:
@@ -294,41 +806,39 @@ class MainUI(QMainWindow):
                 info['buttons']['start'].setText("Start Stream")
                 info['buttons']['detect'].setEnabled(False)
                 info['buttons']['extract'].setEnabled(False)
+                info['buttons']['detect'].setText("Start Detection")
+                info['buttons']['extract'].setText("Start Extraction")
                 info['frame'].clear()
                 info['frame'].setStyleSheet("background-color: black;")
         except Exception as e:
             self.handle_camera_error(name, f"Stream toggle error: {str(e)}")
 
     def update_camera_frame(self, frame, camera_name):
-        """Update camera frame display with aspect ratio preservation"""
+        """Show a frame the stream thread already scaled to the tile"""
         info = self.camera_info.get(camera_name)
         if info and info['frame']:
-            label = info['frame']
-            # Get label size
-            label_size = label.size()
-            # Get image size
-            image_size = frame.size()
-            
-            # Calculate scaling factors
-            w_ratio = label_size.width() / image_size.width()
-            h_ratio = label_size.height() / image_size.height()
-            
-            # Use the smaller ratio to fit the image in the label
-            scale_factor = min(w_ratio, h_ratio)
-            
-            # Calculate new size maintaining aspect ratio
-            new_width = int(image_size.width() * scale_factor)
-            new_height = int(image_size.height() * scale_factor)
-            
-            # Scale the image
-            scaled_pixmap = QPixmap.fromImage(frame).scaled(
-                new_width, 
-                new_height,
-                Qt.KeepAspectRatio,
-                Qt.SmoothTransformation
-            )
-            
-            label.setPixmap(scaled_pixmap)
+            start = METRICS.start()
+            info['frame'].setPixmap(QPixmap.fromImage(frame))
+            METRICS.observe_since('display', start, camera_name)
+
+    def display_fps(self):
+        return self.config_manager.config.get('display', {}).get('max_fps', 15)
+
+    def update_display_targets(self):
+        """Tell each stream how big its tile is and whether anyone can see it"""
+        main_visible = (self.tab_widget.currentWidget() is self.main_tab
+                        and not self.isMinimized())
+        for name, info in self.camera_info.items():
+            if info['stream'] is not None:
+                self.update_display_target(name, main_visible)
+
+    def update_display_target(self, name, main_visible=True):
+        info = self.camera_info[name]
+        label = info['frame']
+        # Scrolled out of view tiles have an empty visible region
+        visible = main_visible and label.isVisible() and not label.visibleRegion().isEmpty()
+        size = (label.width(), label.height())
+        info['stream'].thread.set_display_target(visible, size)
 
     def handle_camera_error(self, camera_name, error):
         """Handle camera errors"""
@@ -348,6 +858,135 @@ class MainUI(QMainWindow):
             info['frame'].clear()
             info['frame'].setStyleSheet("background-color: black;")
 
+    def get_inference_service(self):
+        """Create the detector shared by all cameras on first use"""
+        with self.component_locks['detector']:
+            return self.create_inference_service()
+
+    def create_inference_service(self):
+        if self.inference_service is None:
+            from detection import DetectionThread
+            config = self.config_manager.config
+            inference_config = config.get('inference', {})
+            detector = DetectionThread.from_config(config)
+            self.inference_service = InferenceService(
+                detector,
+                max_batch_size=inference_config.get('max_batch_size', 8),
+                max_wait=inference_config.get('max_wait_ms', 20) / 1000.0
+            )
+            self.inference_service.start()
+        return self.inference_service
+
+    def update_psm_modes(self, item=None):
+        """Apply the PSM modes ticked in the Settings tab"""
+        modes = []
+        for i in range(self.psm_list.count()):
+            psm_item = self.psm_list.item(i)
+            if psm_item.checkState() == Qt.Checked:
+                modes.append(int(psm_item.text()))
+        self.config_manager.config.setdefault('ocr', {})['psm_modes'] = modes
+        self.config_manager.save_config()
+        if self.ocr_processor is not None:
+            self.ocr_processor.set_psm_modes(modes)
+
+    def handle_track_reading(self, result, camera_name):
+        record_track_reading(result, camera_name, self.detection_logger, self.training_manager)
+
+    def swap_model(self):
+        """Load, warm up and switch to a new model while streams keep running"""
+        # Warm-up has already read the old path, swap once it is done
+        if self.component_loading('detector'):
+            return
+        model_path = self.model_path_input.text()
+        if self.inference_service is None:
+            # Nothing loaded yet, the next detection start picks it up
+            self.config_manager.config['yolo_model_path'] = model_path
+            self.model_status.emit(f"Active: {model_path}")
+            return
+        self.model_status.emit(f"Loading {model_path}...")
+
+        def done(path, error):
+            if error is not None:
+                self.model_status.emit(f"Swap failed: {str(error)}")
+            else:
+                self.model_status.emit(f"Active: {path}")
+        self.inference_service.detector.swap_model_async(model_path, callback=done)
+
+    def retrain_model(self):
+        """Start the retraining job in the background, the result can then be run as a shadow"""
+        self.retrain_process = self.training_manager.retrain_model(wait=False)
+        self.retrain_btn.setEnabled(False)
+        self.model_status.emit("Retraining...")
+        self.retrain_timer = QTimer(self)
+        self.retrain_timer.timeout.connect(self.check_retrain)
+        self.retrain_timer.start(5000)
+
+    def check_retrain(self):
+        if self.retrain_process.poll() is None:
+            return
+        self.retrain_timer.stop()
+        self.retrain_btn.setEnabled(True)
+        if self.retrain_process.returncode == SKIPPED_EXIT_CODE:
+            from dataset_manifest import DatasetManifest
+            new_samples = samples_since_last_training(DatasetManifest().summary())
+            self.model_status.emit(f"Retraining skipped: only {new_samples} new samples")
+            return
+        if self.retrain_process.returncode != 0:
+            self.model_status.emit(f"Retraining failed (exit code {self.retrain_process.returncode})")
+            return
+        model_path = latest_model()
+        self.model_path_input.setText(model_path)
+        self.model_status.emit(f"Retrained: {model_path}, start a shadow to compare")
+
+    def start_shadow_model(self):
+        if self.inference_service is None:
+            self.model_status.emit("Start detection before running a shadow model")
+            return
+        model_path = self.model_path_input.text()
+        detector = self.inference_service.detector
+        sample_rate = self.config_manager.config.get('detector', {}).get('shadow_sample_rate', 0.1)
+        self.model_status.emit(f"Loading shadow {model_path}...")
+
+        def worker():
+            try:
+                detector.start_shadow(model_path, sample_rate=sample_rate)
+                self.model_status.emit(f"Shadow running: {model_path}")
+            except Exception as e:
+                self.model_status.emit(f"Shadow failed: {str(e)}")
+        threading.Thread(target=worker, daemon=True).start()
+
+    def promote_shadow_model(self):
+        if self.inference_service is None:
+            return
+        detector = self.inference_service.detector
+        report = detector.get_shadow_report()
+        path = detector.promote_shadow()
+        if path is None:
+            self.model_status.emit("No shadow model running")
+            return
+        self.detection_log.append(f"Shadow report before promotion: {report}")
+        self.model_status.emit(f"Active: {path}")
+
+    def rollback_model(self):
+        if self.inference_service is None:
+            return
+        path = self.inference_service.detector.rollback()
+        if path is None:
+            self.model_status.emit("No previous model to roll back to")
+        else:
+            self.model_status.emit(f"Rolled back to {path}")
+
+    def get_ocr_processor(self):
+        with self.component_locks['ocr']:
+            return self.create_ocr_processor()
+
+    def create_ocr_processor(self):
+        if self.ocr_processor is None:
+            from ocr import OCRProcessor
+            self.ocr_processor = OCRProcessor.from_config(self.config_manager.config)
+            self.ocr_executor = ThreadPoolExecutor(max_workers=2)
+        return self.ocr_processor
+
     def toggle_detection(self, name):
         """Toggle detection processing for camera stream"""
         info = self.camera_info.get(name)
@@ -357,9 +996,16 @@ class MainUI(QMainWindow):
         try:
             btn = info['buttons']['detect']
             if btn.text() == "Start Detection":
+                if self.component_loading('detector'):
+                    return
+                if not info['stream'].remote:
+                    info['stream'].thread.set_inference_service(self.get_inference_service())
+                    info['stream'].thread.set_scheduler(self.scheduler)
                 info['stream'].thread.toggle_detection(True)
                 btn.setText("Stop Detection")
-                self.detection_log.append(f"Started detection for {name}")
+                rate = info['stream'].thread.get_stream_stats()['detection_rate']
+                paced = f" at {rate:.1f}/s, adapting to activity" if rate else ""
+                self.detection_log.append(f"Started detection for {name}{paced}")
             else:
                 info['stream'].thread.toggle_detection(False)
                 btn.setText("Start Detection")
@@ -376,6 +1022,10 @@ class MainUI(QMainWindow):
         try:
             btn = info['buttons']['extract']
             if btn.text() == "Start Extraction":
+                if self.component_loading('ocr'):
+                    return
+                if not info['stream'].remote:
+                    info['stream'].thread.set_ocr(self.get_ocr_processor(), self.ocr_executor)
                 info['stream'].thread.toggle_extraction(True)
                 btn.setText("Stop Extraction")
                 self.extraction_log.append(f"Started extraction for {name}")
@@ -385,3 +1035,27 @@ class MainUI(QMainWindow):
                 self.extraction_log.append(f"Stopped extraction for {name}")
         except Exception as e:
             self.extraction_log.append(f"Extraction toggle error for {name}: {str(e)}")
+
+    def closeEvent(self, event):
+        for info in self.camera_info.values():
+            if info['stream'] and info['stream'].thread:
+                info['stream'].thread.stop()
+        if self.batch_thread is not None:
+            self.batch_thread.stop()
+            self.batch_thread.wait()
+        if self.inference_service is not None:
+            self.inference_service.stop()
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        if self.ocr_executor is not None:
+            self.ocr_executor.shutdown(wait=False)
+            self.ocr_processor.close()
+        self.detection_logger.close()
+        self.training_manager.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.server_events is not None:
+            self.server_events.stop()
+        if self.server_client is not None:
+            self.server_client.close()
+        super().closeEvent(event)
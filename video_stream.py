@@ -1,13 +1,85 @@
 import cv2
+import time
+import uuid
+from functools import partial
 from PyQt5.QtCore import QThread, pyqtSignal, QMutex
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel
 from PyQt5.QtGui import QImage, QPixmap
+from stream_manager import STREAM_MANAGER, OnDemandStream
+from motion_gate import MotionGate
+from tracker import ContainerTracker, vote_readings
+from iso6346 import find_container_code
+from metrics import METRICS
+from shm_ring import FrameRing
+
+
+def display_image(frame, size=None):
+    """
+    RGB QImage of a BGR frame, shrunk to fit size (width, height) keeping
+    the aspect ratio. Runs on the stream thread so the GUI thread only has
+    to paint it.
+    """
+    if size is not None:
+        h, w = frame.shape[:2]
+        scale = min(size[0] / w, size[1] / h)
+        if scale < 1.0:
+            start = METRICS.start()
+            frame = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))),
+                               interpolation=cv2.INTER_AREA)
+            METRICS.observe_since('display_scale', start)
+    start = METRICS.start()
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    h, w, ch = rgb_frame.shape
+    # Copy so the image owns its pixels once rgb_frame goes away
+    qt_frame = QImage(rgb_frame.data, w, h, ch * w, QImage.Format_RGB888).copy()
+    METRICS.observe_since('color_convert', start)
+    return qt_frame
+
+
+class DisplayThrottle:
+    """Decides which frames get turned into display images for a camera tile"""
+
+    def __init__(self, max_fps=15):
+        self.visible = True
+        # None keeps full resolution
+        self.size = None
+        self.set_max_fps(max_fps)
+        self.last_display = 0.0
+
+    def set_max_fps(self, max_fps):
+        self.interval = 1.0 / max_fps if max_fps else 0.0
+
+    def set_target(self, visible, size=None):
+        self.visible = visible
+        self.size = size
+
+    def due(self):
+        if not self.visible:
+            return False
+        now = time.monotonic()
+        if now - self.last_display < self.interval:
+            return False
+        self.last_display = now
+        return True
 
 class VideoStream(QWidget):
-    def __init__(self, rtsp_url, camera_name):
+    def __init__(self, rtsp_url, camera_name, capture_mode='sequential', motion_config=None,
+                 server=None, ring_name=None, display_fps=15, display_url=None,
+                 recognition_idle=5.0, roi=None):
         super().__init__()
+        self.roi = roi
+        self.display_fps = display_fps
+        self.display_url = display_url
+        self.recognition_idle = recognition_idle
         self.rtsp_url = rtsp_url
         self.camera_name = camera_name
+        self.capture_mode = capture_mode
+        self.motion_config = motion_config
+        # With a ServerClient the camera runs in the headless server and
+        # this widget only views its shared memory ring
+        self.server = server
+        self.ring_name = ring_name
+        self.remote = server is not None
         self.init_ui()
         self.init_stream()
 
@@ -18,7 +90,13 @@ class VideoStream(QWidget):
         self.setLayout(self.layout)
 
     def init_stream(self):
-        self.thread = StreamThread(self.rtsp_url, self.camera_name)
+        if self.remote:
+            self.thread = RemoteStreamThread(self.server, self.camera_name, self.ring_name)
+        else:
+            self.thread = StreamThread(self.rtsp_url, self.camera_name, self.capture_mode,
+                                       self.motion_config, display_url=self.display_url,
+                                       recognition_idle=self.recognition_idle, roi=self.roi)
+        self.thread.display.set_max_fps(self.display_fps)
         self.thread.frame_update.connect(self.update_frame)
         self.thread.error_signal.connect(self.handle_error)
         self.thread.start()
@@ -33,53 +111,495 @@ class StreamThread(QThread):
     frame_update = pyqtSignal(QImage, str)
     detection_update = pyqtSignal(QImage, str, str)
     extraction_update = pyqtSignal(str, str)
+    # Source status changes: 'connecting', 'live' or 'reconnecting'
+    status_update = pyqtSignal(str, str)
+    detections_ready = pyqtSignal(object, str)
+    track_reading = pyqtSignal(object, str)
     error_signal = pyqtSignal(str, str)
 
-    def __init__(self, rtsp_url, camera_name):
+    def __init__(self, rtsp_url, camera_name, capture_mode='sequential', motion_config=None,
+                 frame_sink=None, display_url=None, recognition_idle=5.0, roi=None):
         super().__init__()
         self.rtsp_url = rtsp_url
         self.camera_name = camera_name
+        # RegionOfInterest, motion and detection only look inside it
+        self.roi = roi
+        # Dual-stream cameras: the low-res display_url is decoded all the time
+        # for display and motion, rtsp_url (the main stream) only while
+        # something moves or a track is still open
+        self.capture_url = display_url or rtsp_url
+        self.recognition = None
+        if display_url:
+            self.recognition = OnDemandStream(rtsp_url, camera_name, recognition_idle)
+        # Headless mode: frames go to frame_sink(frame) instead of frame_update
+        self.frame_sink = frame_sink
+        self.display = DisplayThrottle(max_fps=0)
+        # 'sequential' processes every frame in order, 'latest' lets a
+        # decoder drain the stream and always works on the newest frame
+        self.capture_mode = capture_mode
         self.running = True
         self.mutex = QMutex()
         self.detection_active = False
         self.extraction_active = False
         self.original_frame = None
         self.cap = None
+        self.frame_buffer = None
+        self.subscription = None
+        self.inference_service = None
+        self.scheduler = None
+        self.pending_detection = None
+        self.last_detections = []
+        # A keepalive detection on the display stream found something
+        self.keepalive_found = False
+        # Motion gate in front of the detector, disabled with {'enabled': False}
+        motion_config = dict(motion_config or {})
+        self.motion_gate = None
+        if motion_config.pop('enabled', True):
+            self.motion_gate = MotionGate(**motion_config)
+        self.tracker = ContainerTracker()
+        # Track ids restart with every stream, the session keeps them apart
+        self.session = uuid.uuid4().hex
+        self.ocr_processor = None
+        self.ocr_executor = None
+        # Always counted, these are cheap and feed the stats panel
+        self.frame_count = 0
+        self.busy_skips = 0
+        self.rate_skips = 0
+        self.fps = 0.0
+        self.detection_fps = 0.0
+        self.fps_window_start = time.monotonic()
+        self.fps_window_frames = 0
+        self.fps_window_detections = 0
 
     def run(self):
         try:
-            self.cap = cv2.VideoCapture(self.rtsp_url)
+            if self.capture_mode == 'latest':
+                self.run_latest()
+                return
+
+            # Sequential mode is for files and tests where every frame counts,
+            # it owns its capture and stops at the end of the source
+            self.cap = cv2.VideoCapture(self.capture_url)
             if not self.cap.isOpened():
                 self.error_signal.emit(self.camera_name, "Failed to open camera stream")
                 return
 
             while self.running:
+                start = METRICS.start()
                 ret, frame = self.cap.read()
+                METRICS.observe_since('capture', start, self.camera_name)
                 if ret:
-                    self.original_frame = frame.copy()
-                    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    h, w, ch = rgb_frame.shape
-                    qt_frame = QImage(rgb_frame.data, w, h, ch * w, QImage.Format_RGB888)
-                    self.frame_update.emit(qt_frame, self.camera_name)
+                    self.process_frame(frame)
                 else:
                     self.error_signal.emit(self.camera_name, "Failed to read frame")
                     break
         except Exception as e:
             self.error_signal.emit(self.camera_name, f"Stream error: {str(e)}")
         finally:
+            if self.subscription is not None:
+                self.subscription.close()
             if self.cap is not None:
                 self.cap.release()
+            if self.recognition is not None:
+                self.recognition.close()
+
+    def run_latest(self):
+        """
+        Consume the newest frame, skipping whatever piled up meanwhile.
+        The decoder is shared with every camera on the same URL and
+        reconnects by itself, so this loop only reports status changes.
+        """
+        self.subscription = STREAM_MANAGER.subscribe(self.capture_url)
+        self.frame_buffer = self.subscription.buffer
+        status = None
+        last_sequence = 0
+        while self.running:
+            item = self.subscription.get_latest(last_sequence, timeout=1.0)
+            if self.subscription.status() != status:
+                status = self.subscription.status()
+                self.status_update.emit(self.camera_name, status)
+            if item is None:
+                continue
+            last_sequence, frame = item
+            self.process_frame(frame)
+
+    def process_frame(self, frame):
+        self.count_frame()
+        self.original_frame = frame.copy()
+        if self.frame_sink is not None:
+            self.frame_sink(frame)
+        elif self.display.due():
+            self.frame_update.emit(display_image(frame, self.display.size), self.camera_name)
+
+        if self.detection_active:
+            roi = self.roi
+            gate = self.motion_gate
+            forward = gate is None or gate.check(frame if roi is None else roi.crop(frame))
+            # A keepalive forward is a periodic look at a static scene, not motion
+            keepalive = forward and gate is not None and gate.keepalive_forward
+            motion = forward and not keepalive
+            tracks = self.tracker.active_count()
+            if self.scheduler is not None:
+                self.scheduler.report(self.camera_name, motion, tracks)
+            if self.recognition is None:
+                if forward and self.detection_due():
+                    self.submit_detection(frame)
+            elif keepalive and tracks == 0:
+                # Checked on the display stream, the main stream only opens if it finds something
+                if self.detection_due():
+                    self.submit_detection(frame, keepalive=True)
+                self.recognition.close_if_idle()
+            else:
+                self.submit_recognition(motion or tracks > 0 or self.keepalive_found)
+
+    def submit_recognition(self, needed):
+        """Detect on the main stream, keeping it open only while it is needed"""
+        if needed:
+            self.recognition.request()
+            frame = self.recognition.next_frame()
+            if frame is not None and self.detection_due():
+                self.submit_detection(frame)
+        else:
+            self.recognition.close_if_idle()
+
+    def set_scheduler(self, scheduler):
+        """Shared InferenceScheduler pacing this camera, None for the native frame rate"""
+        if self.scheduler is not None:
+            self.scheduler.unregister(self.camera_name)
+        self.scheduler = scheduler
+        if scheduler is not None and self.detection_active:
+            scheduler.register(self.camera_name)
+
+    def set_roi(self, roi):
+        """Swap the region of interest on a running stream, None for the full frame"""
+        self.roi = roi
+
+    def detection_due(self):
+        if self.scheduler is None or self.scheduler.allow(self.camera_name):
+            return True
+        self.rate_skips += 1
+        return False
+
+    def get_detection_rate(self):
+        """Detections per second the scheduler currently allows, None when unpaced"""
+        if self.scheduler is None or not self.detection_active:
+            return None
+        return self.scheduler.rate(self.camera_name)
+
+    def count_frame(self):
+        self.frame_count += 1
+        self.fps_window_frames += 1
+        now = time.monotonic()
+        elapsed = now - self.fps_window_start
+        if elapsed >= 1.0:
+            self.fps = self.fps_window_frames / elapsed
+            self.detection_fps = self.fps_window_detections / elapsed
+            self.fps_window_start = now
+            self.fps_window_frames = 0
+            self.fps_window_detections = 0
+
+    def set_display_target(self, visible, size=None):
+        """Tile visibility and size in pixels, hidden tiles get no frames at all"""
+        self.display.set_target(visible, size)
+
+    def set_inference_service(self, service):
+        self.inference_service = service
+
+    def submit_detection(self, frame, keepalive=False):
+        """
+        Hand the frame to the shared inference service unless one is still in flight.
+        Keepalive detections on the display stream of a dual-stream camera only
+        decide whether to open the main stream, they never reach the tracker.
+        """
+        if self.inference_service is None:
+            return
+        if self.pending_detection is not None and not self.pending_detection.done():
+            self.busy_skips += 1
+            return
+        start = METRICS.start()
+        future = self.inference_service.submit(self.camera_name, frame, self.roi)
+        future.add_done_callback(partial(self.on_detection_done, frame, start, keepalive))
+        self.pending_detection = future
+        self.fps_window_detections += 1
+
+    def on_detection_done(self, frame, start, keepalive, future):
+        # Runs on the inference service thread
+        if future.cancelled() or future.exception() is not None:
+            return
+        # Queue wait plus the batched forward pass
+        METRICS.observe_since('detection', start, self.camera_name)
+        if keepalive and self.recognition is not None:
+            self.keepalive_found = bool(future.result())
+            return
+        self.keepalive_found = False
+        self.last_detections = future.result()
+        self.detections_ready.emit(self.last_detections, self.camera_name)
+        for track in self.tracker.update(self.last_detections, frame):
+            self.read_track(track)
+
+    def set_ocr(self, ocr_processor, executor):
+        self.ocr_processor = ocr_processor
+        self.ocr_executor = executor
+
+    def read_track(self, track):
+        """OCR a finished track once, off the capture and inference threads"""
+        if not self.extraction_active or self.ocr_processor is None:
+            return
+        future = self.ocr_executor.submit(self.finalize_track, track)
+        future.add_done_callback(lambda done: self.report_ocr_failure(done, track))
+
+    def report_ocr_failure(self, future, track):
+        """
+        Nobody waits on OCR futures, without this an exception in finalize_track
+        is lost. Not sent to error_signal, the UI treats that as a dead stream.
+        """
+        if future.cancelled() or future.exception() is None:
+            return
+        error = future.exception()
+        message = f"OCR failed for {track.label} #{track.track_id}: {type(error).__name__}: {str(error)}"
+        print(f"Error from {self.camera_name}: {message}")
+        self.extraction_update.emit(message, self.camera_name)
+
+    def finalize_track(self, track):
+        start = METRICS.start()
+        crops = track.best_crops()
+        if track.class_id == 0:
+            text, agreement, readings, valid = self.read_container_track(crops)
+        else:
+            texts = self.ocr_processor.extract_batch([crop for crop, _ in crops])
+            readings = [(text, confidence) for text, (_, confidence) in zip(texts, crops)]
+            text, agreement = vote_readings(readings)
+            # ISO size/type codes are 4 characters, e.g. 22G1
+            valid = len(text) == 4
+        METRICS.observe_since('ocr', start, self.camera_name)
+        if not text:
+            return
+        result = {
+            'track_id': track.track_id,
+            'session': self.session,
+            'label': track.label,
+            'class_id': track.class_id,
+            'text': text,
+            'valid': valid,
+            'agreement': agreement,
+            'readings': [reading for reading, _ in readings],
+            'confidence': track.confidence,
+            'crop': crops[0][0]
+        }
+        self.track_reading.emit(result, self.camera_name)
+        status = "" if valid else " (invalid)"
+        self.extraction_update.emit(
+            f"{track.label} #{track.track_id}: {text}{status}", self.camera_name)
+
+    def read_container_track(self, crops):
+        """
+        Read a cn-11 track sharpest crop first, stopping at the first check
+        digit valid code. Falls back to voting over all raw readings.
+        """
+        readings = []
+        if self.ocr_processor.batched:
+            # One forward pass over every crop of the track
+            attempts = self.ocr_processor.read_container_codes([crop for crop, _ in crops])
+        else:
+            # Lazy, so Tesseract stops at the first valid crop
+            attempts = (self.ocr_processor.read_container_code(crop) for crop, _ in crops)
+        for (crop, confidence), attempt in zip(crops, attempts):
+            if attempt['valid']:
+                return attempt['code'], 1.0, [(attempt['code'], confidence)], True
+            readings.extend((raw, confidence) for raw in attempt['raw'])
+        text, agreement = vote_readings(readings)
+        code = find_container_code(text)
+        if code:
+            return code, agreement, readings, True
+        return text, agreement, readings, False
+
+    def get_latest_frame(self):
+        """Newest raw BGR frame for detection/OCR consumers"""
+        return self.original_frame
+
+    def set_motion_sensitivity(self, sensitivity):
+        if self.motion_gate is not None:
+            self.motion_gate.set_sensitivity(sensitivity)
+
+    def get_motion_stats(self):
+        if self.motion_gate is None:
+            return None
+        return self.motion_gate.get_stats()
+
+    def get_capture_stats(self):
+        if self.frame_buffer is None:
+            return {'grabbed': 0, 'dropped': 0, 'stale': 0, 'buffered': 0}
+        return self.frame_buffer.get_stats()
+
+    def get_stream_stats(self):
+        capture = self.get_capture_stats()
+        motion = self.get_motion_stats()
+        # No frames for a while means the stream stalled
+        stalled = time.monotonic() - self.fps_window_start > 2.0
+        return {
+            'fps': 0.0 if stalled else self.fps,
+            'frames': self.frame_count,
+            # Detections actually submitted and what the scheduler allows, 0 when unpaced
+            'detection_fps': 0.0 if stalled else self.detection_fps,
+            'detection_rate': self.get_detection_rate() or 0.0,
+            'dropped': capture['dropped'] + capture['stale'],
+            'buffered': capture['buffered'],
+            'busy_skips': self.busy_skips,
+            'rate_skips': self.rate_skips,
+            'motion_skip_rate': motion['skip_rate'] if motion else 0.0,
+            'recognition_open': int(self.recognition is not None and self.recognition.is_open())
+        }
 
     def stop(self):
         self.mutex.lock()
         self.running = False
         self.mutex.unlock()
-        if self.cap is not None:
+        if self.subscription is not None:
+            # Wakes run_latest, run() releases the subscription itself
+            self.frame_buffer.close()
+        elif self.cap is not None:
             self.cap.release()
         self.wait()
+        if self.scheduler is not None:
+            self.scheduler.unregister(self.camera_name)
 
     def toggle_detection(self, active):
+        if active and not self.detection_active and self.motion_gate is not None:
+            self.motion_gate.reset()
         self.detection_active = active
+        if self.scheduler is not None:
+            # Only lanes with detection on share the budget
+            if active:
+                self.scheduler.register(self.camera_name)
+            else:
+                self.scheduler.unregister(self.camera_name)
+        if not active:
+            if self.recognition is not None:
+                self.recognition.close()
+            for track in self.tracker.flush():
+                self.read_track(track)
 
     def toggle_extraction(self, active):
         self.extraction_active = active
+
+class RemoteStreamThread(QThread):
+    """
+    Viewer for a camera running in the headless camera server.
+    Frames are read from the camera's shared memory ring, detection and
+    extraction toggles are forwarded to the server.
+    """
+    frame_update = pyqtSignal(QImage, str)
+    extraction_update = pyqtSignal(str, str)
+    track_reading = pyqtSignal(object, str)
+    error_signal = pyqtSignal(str, str)
+
+    def __init__(self, server, camera_name, ring_name, max_fps=25):
+        super().__init__()
+        self.server = server
+        self.camera_name = camera_name
+        self.ring_name = ring_name
+        self.display = DisplayThrottle(max_fps)
+        self.running = True
+        self.original_frame = None
+
+    def run(self):
+        try:
+            ring = FrameRing.attach(self.ring_name)
+        except (FileNotFoundError, ValueError) as e:
+            self.error_signal.emit(self.camera_name, f"Cannot attach to server frames: {str(e)}")
+            return
+        try:
+            last_sequence = 0
+            while self.running:
+                # Hidden tiles don't even copy frames out of the ring
+                if not self.display.due():
+                    time.sleep(0.02)
+                    continue
+                item = ring.read_latest(last_sequence)
+                if item is None:
+                    # Nothing new yet, try again shortly
+                    self.display.last_display = 0.0
+                    time.sleep(0.01)
+                    continue
+                last_sequence, _, frame = item
+                self.original_frame = frame
+                self.frame_update.emit(display_image(frame, self.display.size), self.camera_name)
+        finally:
+            ring.close()
+
+    def set_display_target(self, visible, size=None):
+        self.display.set_target(visible, size)
+
+    def set_inference_service(self, service):
+        pass
+
+    def set_scheduler(self, scheduler):
+        pass
+
+    def set_ocr(self, ocr_processor, executor):
+        pass
+
+    def toggle_detection(self, active):
+        self.server.request('detection', camera=self.camera_name, active=active)
+
+    def toggle_extraction(self, active):
+        self.server.request('extraction', camera=self.camera_name, active=active)
+
+    def get_latest_frame(self):
+        return self.original_frame
+
+    def get_stream_stats(self):
+        # Fetched by ServerEventThread, the stats panel runs on the GUI thread
+        stats = self.server.cached_stats(self.camera_name)
+        return {
+            'fps': stats.get('fps', 0.0),
+            'frames': stats.get('frames', 0),
+            'dropped': stats.get('dropped', 0),
+            'buffered': stats.get('buffered', 0),
+            'detection_fps': stats.get('detection_fps', 0.0),
+            'detection_rate': stats.get('detection_rate', 0.0),
+            'busy_skips': stats.get('busy_skips', 0),
+            'rate_skips': stats.get('rate_skips', 0),
+            'motion_skip_rate': stats.get('motion_skip_rate', 0.0)
+        }
+
+    def stop(self):
+        """Detach from the ring, the camera keeps running in the server"""
+        self.running = False
+        self.wait()
+
+
+class ServerEventThread(QThread):
+    """
+    Polls the camera server for extraction results and camera errors, and
+    refreshes the client's stats cache so the stats panel never blocks on it
+    """
+    event_received = pyqtSignal(str, str, str)
+
+    def __init__(self, server, interval=0.5, stats_interval=1.0):
+        super().__init__()
+        self.server = server
+        self.interval = interval
+        self.stats_interval = stats_interval
+        self.running = True
+
+    def run(self):
+        last_id = 0
+        last_stats = 0.0
+        while self.running:
+            try:
+                events = self.server.request('events', after=last_id)['events']
+                if time.monotonic() - last_stats >= self.stats_interval:
+                    self.server.refresh_stats()
+                    last_stats = time.monotonic()
+            except (OSError, EOFError, RuntimeError) as e:
+                self.event_received.emit('error', 'server', f"Lost connection: {str(e)}")
+                break
+            for event in events:
+                last_id = event['id']
+                self.event_received.emit(event['kind'], event['camera'], str(event['text']))
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
+        self.wait()